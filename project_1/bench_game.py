@@ -0,0 +1,167 @@
+"""
+--------------------------------------------------------------------------
+Candy Game Benchmark
+--------------------------------------------------------------------------
+License:
+Copyright 2021 <Jessica Kies>
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors
+may be used to endorse or promote products derived from this software without
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+Candy Game Benchmark
+    Overview: Runs full candy games headless on the simulated backend and
+    reports, for every game state:
+      - CPU time spent running the state (time.process_time)
+      - hardware calls made (each is at least one system call on the board)
+      - latency: the time the state takes on the cabinet (virtual clock)
+
+    The pattern display is SHOW_PATTERN, input capture is READ_INPUT and
+    the dispense is DISPENSE.
+
+    Usage:
+        python3 bench_game.py [--games N] [--seed N] [--recall P] [--display]
+                              [--trace]
+
+--------------------------------------------------------------------------
+"""
+import argparse
+import collections
+import os
+import random
+import sys
+import time
+
+import candy_game as game
+import hal
+import session_trace
+import soak_game
+
+
+# ------------------------------------------------------------------------
+# Functions
+# ------------------------------------------------------------------------
+
+def percentile(values, fraction):
+    """Return the value at fraction (0 - 1) of the sorted values."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+# End def
+
+
+def run(games, seed, recall, display=False, trace=False):
+    """Play games games and return the per state measurements.
+
+    :param display: also drive the (simulated) display
+    :param trace:   record a session trace (in memory)
+    """
+    random.seed(seed)
+    backend = hal.SimBackend(soak_game.make_player(random.Random(seed), recall))
+    writer  = session_trace.TraceWriter() if trace else None
+    game.setup_game(backend, trace=writer)
+    if display:
+        game.display_setup()
+
+    cpu     = collections.defaultdict(float)
+    calls   = collections.defaultdict(collections.Counter)
+    latency = collections.defaultdict(list)
+    played  = 0
+
+    stdout     = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    start      = time.perf_counter()
+    try:
+        while played < games:
+            state   = game.station.state
+            before  = backend.calls.copy()
+            sim     = backend.now()
+            cpu_now = time.process_time()
+
+            if game.step_game() == game.SHOW_PATTERN:
+                played += 1
+
+            cpu[state] += time.process_time() - cpu_now
+            latency[state].append(backend.now() - sim)
+            calls[state].update(backend.calls - before)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    return time.perf_counter() - start, cpu, calls, latency
+
+# End def
+
+
+# ------------------------------------------------------------------------
+# Main script
+# ------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Headless candy game benchmark")
+    parser.add_argument("--games", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=301)
+    parser.add_argument("--recall", type=float, default=0.97,
+                        help="chance the player gets each step right")
+    parser.add_argument("--display", action="store_true",
+                        help="include the display (the lockout countdown "
+                             "redraws once a second)")
+    parser.add_argument("--trace", action="store_true",
+                        help="record a session trace while playing")
+    args = parser.parse_args()
+
+    elapsed, cpu, calls, latency = run(args.games, args.seed, args.recall,
+                                       args.display, args.trace)
+
+    print("{0} games in {1:.2f} s ({2:.0f} games/s)".format(
+          args.games, elapsed, args.games / elapsed))
+    print("")
+    print("{0:<14} {1:>8} {2:>12} {3:>12} {4:>12} {5:>12}".format(
+          "state", "runs", "CPU us/run", "hw calls/run", "latency p50", "latency p99"))
+
+    for state in [game.IDLE, game.SHOW_PATTERN, game.READ_INPUT,
+                  game.DISPENSE, game.COOLDOWN, game.LOCKED]:
+        runs = len(latency[state])
+        if runs == 0:
+            continue
+
+        hw_calls = sum(count for name, count in calls[state].items()
+                       if name not in ("sleep", "button_wait"))
+
+        print("{0:<14} {1:>8} {2:>12.1f} {3:>12.1f} {4:>11.2f}s {5:>11.2f}s".format(
+              state, runs, cpu[state] / runs * 1e6, hw_calls / runs,
+              percentile(latency[state], 0.5), percentile(latency[state], 0.99)))
+
+    print("")
+    print("hardware calls by type:")
+    total = collections.Counter()
+    for counter in calls.values():
+        total.update(counter)
+    for name, count in sorted(total.items()):
+        print("    {0:<14} {1:>10}".format(name, count))
+    print("    {0:<14} {1:>10}".format("i2c transfers", game.backend.i2c_transfers()))
+
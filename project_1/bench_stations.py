@@ -0,0 +1,278 @@
+"""
+--------------------------------------------------------------------------
+Candy Game Station Benchmark
+--------------------------------------------------------------------------
+License:
+Copyright 2021 <Jessica Kies>
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors
+may be used to endorse or promote products derived from this software without
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+Candy Game Station Benchmark
+    Overview: Runs a number of candy game stations in one game loop on the
+    real clock (with simulated pins) and measures the input latency of each
+    station: the time from a button event to its station handling it.
+
+    A feeder thread plays every station at once, --rate button events a
+    second each. It starts games, enters the patterns (getting each step
+    right with probability --recall, so some stations lock out) and mashes
+    the buttons of the stations that are showing a pattern or are locked,
+    so every station is kept busy while the others are being played.
+
+    The run is repeated for each station count in --stations, so the table
+    shows how the latency grows with the number of stations. Patterns are
+    played faster than in the game (--step-time) so that every state comes
+    up in a short run.
+
+    Usage:
+        python3 bench_stations.py [--stations 1,2,4,...] [--seconds S]
+                                  [--rate N] [--recall P] [--step-time S]
+
+--------------------------------------------------------------------------
+"""
+import argparse
+import collections
+import queue
+import random
+import threading
+import time
+
+import button_input
+import candy_game as game
+import hal
+
+
+# ------------------------------------------------------------------------
+# Global Constants
+# ------------------------------------------------------------------------
+BUTTON_COUNT                 = 4                 # buttons per station
+
+
+# ------------------------------------------------------------------------
+# Simulated hardware on the real clock
+# ------------------------------------------------------------------------
+
+class QueueButtons(object):
+    """Button input fed by another thread."""
+
+    def __init__(self):
+        self.events = queue.Queue()
+
+    # End def
+
+    def put(self, button, pressed):
+        """Queue an event, timestamped now."""
+        self.events.put(button_input.ButtonEvent(button, pressed, time.monotonic()))
+
+    # End def
+
+    def get(self, timeout=None):
+        """Return the next ButtonEvent, or None if timeout seconds pass first."""
+        try:
+            return self.events.get(True, timeout)
+        except queue.Empty:
+            return None
+
+    # End def
+
+    def clear(self):
+        pass
+
+    def close(self):
+        pass
+
+# End class
+
+
+class RealtimeBackend(hal.SimBackend):
+    """Simulated pins, PWM and displays on the real clock."""
+
+    def __init__(self):
+        hal.SimBackend.__init__(self)
+        self.buttons = QueueButtons()
+
+    # End def
+
+    def button_input(self, gpios):
+        return self.buttons
+
+    def now(self):
+        return time.monotonic()
+
+    def sleep(self, duration):
+        time.sleep(duration)
+
+# End class
+
+
+def make_pins(count):
+    """Return StationPins for count stations."""
+    stations = []
+    for index in range(count):
+        prefix = "S{0}_".format(index)
+        first  = index * BUTTON_COUNT
+        stations.append(game.StationPins(
+            [prefix + "BUTTON{0}".format(i) for i in range(BUTTON_COUNT)],
+            list(range(first, first + BUTTON_COUNT)),
+            [prefix + "LED{0}".format(i) for i in range(BUTTON_COUNT)],
+            list(range(first, first + BUTTON_COUNT)),
+            prefix + "BUZZER", prefix + "SERVO", 0x70 + index % 8))
+    return stations
+
+# End def
+
+
+# ------------------------------------------------------------------------
+# Players
+# ------------------------------------------------------------------------
+
+def choose(station, rng, recall):
+    """Return the button a player would press on station now."""
+    state = station.state
+
+    if state in (game.IDLE, game.COOLDOWN):
+        return game.START_BUTTON
+
+    if state == game.READ_INPUT:
+        index   = len(station.user_input)
+        pattern = station.pattern
+        if index < len(pattern):
+            step = pattern[index]
+            if rng.random() >= recall:
+                step = (step + 1) % BUTTON_COUNT
+            return step
+
+    # Showing a pattern or locked: the press is thrown away
+    return rng.randint(0, BUTTON_COUNT - 1)
+
+# End def
+
+
+def feed(stations, buttons, rate, recall, seed, stop):
+    """Press and release buttons of every station in turn, rate events a
+    second per station, until stop is set."""
+    rng  = random.Random(seed)
+    gap  = 1.0 / (rate * len(stations))
+    held = [None] * len(stations)
+    due  = time.monotonic()
+
+    while not stop.is_set():
+        for index, station in enumerate(stations):
+            due += gap
+            wait = due - time.monotonic()
+            if wait < -0.1:
+                due  = time.monotonic()         # fell behind, do not catch up
+            # Always sleep, even for 0 s, so the game loop gets the GIL
+            time.sleep(max(0.0, wait))
+
+            first = index * BUTTON_COUNT
+            if held[index] is None:
+                held[index] = choose(station, rng, recall)
+                buttons.put(first + held[index], True)
+            else:
+                buttons.put(first + held[index], False)
+                held[index] = None
+
+# End def
+
+
+# ------------------------------------------------------------------------
+# Benchmark
+# ------------------------------------------------------------------------
+
+def run(count, seconds, rate, recall, seed):
+    """Run count stations for seconds.
+
+    Returns (list of (samples, p50, p99, max) per station, Counter of the
+    states at the end, CPU time of the process / seconds).
+    """
+    backend = RealtimeBackend()
+    loop    = game.GameLoop(backend, make_pins(count), seed)
+    for station in loop.stations:
+        station.display_setup()
+        station.reset()
+
+    stop    = threading.Event()
+    feeder  = threading.Thread(target=feed, args=(loop.stations, backend.buttons, rate,
+                                                  recall, seed, stop))
+    feeder.start()
+
+    cpu     = time.process_time()
+    end     = time.monotonic() + seconds
+    try:
+        while time.monotonic() < end:
+            loop.run_once()
+    finally:
+        stop.set()
+        feeder.join()
+        loop.close()
+    cpu     = (time.process_time() - cpu) / seconds
+
+    states  = collections.Counter(station.state for station in loop.stations)
+    return [station.latency_stats() for station in loop.stations], states, cpu
+
+# End def
+
+
+# ------------------------------------------------------------------------
+# Main script
+# ------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Candy game input latency per station")
+    parser.add_argument("--stations", default="1,2,4,8,16,32",
+                        help="station counts to run, comma separated")
+    parser.add_argument("--seconds", type=float, default=5.0,
+                        help="how long to run each station count")
+    parser.add_argument("--rate", type=float, default=20.0,
+                        help="button events a second per station")
+    parser.add_argument("--recall", type=float, default=0.97,
+                        help="chance the player gets each step right")
+    parser.add_argument("--step-time", type=float, default=0.1,
+                        help="seconds per pattern step (the game uses {0})".format(
+                             game.PATTERN_STEP_TIME))
+    parser.add_argument("--seed", type=int, default=301)
+    args = parser.parse_args()
+
+    game.PATTERN_STEP_TIME = args.step_time
+
+    print("{0:>8} {1:>8} {2:>10} {3:>10} {4:>12} {5:>10} {6:>8}  {7}".format(
+          "stations", "events", "p50 us", "p99 us", "worst p99", "max us", "CPU",
+          "states at the end"))
+
+    for count in [int(count) for count in args.stations.split(",")]:
+        stats, states, cpu = run(count, args.seconds, args.rate, args.recall, args.seed)
+
+        # Median over the stations of each station's p50 and p99
+        p50s   = sorted(p50 for samples, p50, p99, worst in stats)
+        p99s   = sorted(p99 for samples, p50, p99, worst in stats)
+        events = sum(samples for samples, p50, p99, worst in stats)
+        worst  = max(worst for samples, p50, p99, worst in stats)
+
+        print("{0:>8} {1:>8} {2:>10.1f} {3:>10.1f} {4:>12.1f} {5:>10.1f} {6:>7.0f}%  {7}".format(
+              count, events, p50s[len(p50s) // 2] * 1e6, p99s[len(p99s) // 2] * 1e6,
+              p99s[-1] * 1e6, worst * 1e6, cpu * 100,
+              " ".join("{0}={1}".format(state, number) for state, number in sorted(states.items()))))
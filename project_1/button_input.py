@@ -0,0 +1,251 @@
+"""
+--------------------------------------------------------------------------
+Button Input
+--------------------------------------------------------------------------
+License:
+Copyright 2021 <Jessica Kies>
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors
+may be used to endorse or promote products derived from this software without
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+Button Input
+    Overview: Edge triggered button input for the candy game. The sysfs
+    value file of every button is opened once with its edge set to "both"
+    and registered with epoll, so waiting for a press uses no CPU.
+
+    A press is reported as soon as the first edge arrives. Edges within the
+    debounce time after that are ignored, and the pin is read again once the
+    debounce time is over so the reported state always matches the pin.
+
+    Events are timestamped with time.monotonic() and kept in a bounded
+    queue. If the game falls behind, the oldest events are dropped.
+
+--------------------------------------------------------------------------
+"""
+import collections
+import os
+import select
+import time
+
+
+# ------------------------------------------------------------------------
+# Global Constants
+# ------------------------------------------------------------------------
+GPIO_BASE_PATH               = "/sys/class/gpio"
+
+DEBOUNCE_TIME                = 0.02              # seconds
+QUEUE_SIZE                   = 32
+
+ButtonEvent = collections.namedtuple("ButtonEvent", ["button", "pressed", "timestamp"])
+
+
+# ------------------------------------------------------------------------
+# Button Input
+# ------------------------------------------------------------------------
+
+class ButtonInput(object):
+    """Edge triggered, debounced input for a list of buttons.
+
+    Buttons are referred to by their index in the gpio list, which is the
+    same number used in the game pattern.
+    """
+    epoll = None
+
+    def __init__(self, gpios, active_low=True, debounce=DEBOUNCE_TIME,
+                 queue_size=QUEUE_SIZE, base_path=GPIO_BASE_PATH):
+        """Open the value file of each gpio and register it with epoll.
+
+        :param gpios:      list of gpio numbers, e.g. [46, 44, 47, 64]
+        :param active_low: True if the pin reads 0 while the button is pressed
+        :param debounce:   time in seconds to ignore edges after a change
+        :param queue_size: maximum number of events kept before the oldest
+                           are dropped
+        """
+        self.gpios      = list(gpios)
+        self.active_low = active_low
+        self.debounce   = debounce
+        self.events     = collections.deque(maxlen=queue_size)
+        self.dropped    = 0
+
+        self.fds        = []
+        self.buttons    = {}                            # fd -> button
+        self.state      = [False] * len(self.gpios)     # debounced state
+        self.changed    = [0.0] * len(self.gpios)       # time of last change
+        self.pending    = {}                            # button -> deadline
+
+        self.epoll      = select.epoll()
+
+        try:
+            for button, gpio in enumerate(self.gpios):
+                path = "{0}/gpio{1}".format(base_path, gpio)
+
+                with open(path + "/edge", "w") as edge_file:
+                    edge_file.write("both")
+
+                fd = os.open(path + "/value", os.O_RDONLY | os.O_NONBLOCK)
+                self.fds.append(fd)
+                self.buttons[fd] = button
+
+                # Reading clears any edge that is already pending
+                self.state[button] = self._read(fd)
+                self.epoll.register(fd, select.EPOLLPRI | select.EPOLLERR)
+        except:
+            self.close()
+            raise
+
+    # End def
+
+    def _read(self, fd):
+        """Read the pin behind fd and return True if the button is pressed."""
+        os.lseek(fd, 0, os.SEEK_SET)
+        value = os.read(fd, 2)[:1] == b"1"
+        return value != self.active_low
+
+    # End def
+
+    def _update(self, button, now):
+        """Read button and queue an event if its debounced state changed."""
+        pressed = self._read(self.fds[button])
+
+        if pressed == self.state[button]:
+            self.pending.pop(button, None)
+            return
+
+        if (now - self.changed[button]) < self.debounce:
+            # Still bouncing, look at the pin again once it has settled
+            self.pending[button] = self.changed[button] + self.debounce
+            return
+
+        self.state[button]   = pressed
+        self.changed[button] = now
+        self.pending.pop(button, None)
+
+        if len(self.events) == self.events.maxlen:
+            self.dropped += 1
+        self.events.append(ButtonEvent(button, pressed, now))
+
+    # End def
+
+    def poll(self, timeout=None):
+        """Wait up to timeout seconds for edges and queue the new events.
+
+        A timeout of None waits forever. Returns the number of queued events.
+        """
+        if self.pending:
+            deadline = min(self.pending.values())
+            wait     = max(0.0, deadline - time.monotonic())
+            if (timeout is None) or (wait < timeout):
+                timeout = wait
+
+        ready = self.epoll.poll(-1 if timeout is None else timeout)
+        now   = time.monotonic()
+
+        for fd, _ in ready:
+            self._update(self.buttons[fd], now)
+
+        for button, deadline in list(self.pending.items()):
+            if deadline <= now:
+                del self.pending[button]
+                self._update(button, now)
+
+        return len(self.events)
+
+    # End def
+
+    def get(self, timeout=None):
+        """Return the next ButtonEvent, or None if timeout seconds pass first.
+
+        A timeout of None waits forever.
+        """
+        if timeout is not None:
+            end = time.monotonic() + timeout
+
+        while not self.events:
+            if timeout is None:
+                self.poll()
+            else:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.poll(remaining)
+
+        return self.events.popleft()
+
+    # End def
+
+    def wait_for_press(self, button, timeout=None):
+        """Wait for button to be pressed, ignoring every other event.
+
+        Returns the ButtonEvent, or None if timeout seconds pass first.
+        """
+        if timeout is not None:
+            end = time.monotonic() + timeout
+
+        while True:
+            if timeout is None:
+                event = self.get()
+            else:
+                event = self.get(max(0.0, end - time.monotonic()))
+
+            if event is None:
+                return None
+
+            if event.pressed and (event.button == button):
+                return event
+
+    # End def
+
+    def is_pressed(self, button):
+        """Return the debounced state of button."""
+        return self.state[button]
+
+    # End def
+
+    def clear(self):
+        """Throw away queued events."""
+        self.events.clear()
+
+    # End def
+
+    def fileno(self):
+        """File descriptor that becomes readable when a button changes."""
+        return self.epoll.fileno()
+
+    # End def
+
+    def close(self):
+        """Close the value files and the epoll object."""
+        for fd in self.fds:
+            os.close(fd)
+        self.fds = []
+
+        if self.epoll is not None:
+            self.epoll.close()
+            self.epoll = None
+
+    # End def
+
+# End class
@@ -48,19 +48,43 @@ Candy Game
     Please use run_candy_game.sh for instructions to auto-run the game at 
     boot
 
+    Several stations (each a whole game with its own buttons, LEDs, buzzer,
+    servo and display) can be run from one PocketBeagle by listing their
+    pins in STATIONS. They run in one loop, and no state ever blocks, so a
+    pattern or a lockout on one station does not hold up the buttons of
+    another ("python3 bench_stations.py" measures this).
+
+    The lockout and difficulty timers of every station are kept in a state
+    file (state_file.py), and supervisor.py restarts the game right away if
+    it dies, so neither a crash nor a power cycle gets around a lockout.
+
 --------------------------------------------------------------------------
 The base of this code came from Franck Montano Ostrander's PocketBeagle 
 Arcade Machine which is accessible on Hackster.io.
 https://www.hackster.io/fdm3/pocketbeagle-arcade-machine-ee661e
 
 """
+import collections
 import os
 import random
 import time
 import sys
 
-import Adafruit_BBIO.PWM as PWM
-import Adafruit_BBIO.GPIO as GPIO
+import startup
+
+import difficulty
+import ht16k33
+import hal
+import metrics
+import pwm_channels
+import renderer as display_renderer
+import scheduler as game_scheduler
+import sequencer as game_sequencer
+import session_trace
+import state_file
+import telemetry
+
+startup.PROFILER.mark("imports")
 
 
 # ------------------------------------------------------------------------
@@ -70,7 +94,12 @@ import Adafruit_BBIO.GPIO as GPIO
 # HT16K33 values
 DISPLAY_I2C_BUS              = 1                 # I2C 1  
 DISPLAY_I2C_ADDR             = 0x70
-DISPLAY_CMD                  = "/usr/sbin/i2cset -y 1 0x70"         
+
+# Event log (relative to project_1, see run_candy_game.sh)
+LOG_PATH                     = "logs/candy_game.log"
+TRACE_PATH                   = "logs/candy_game.trace"
+METRICS_PATH                 = "logs/candy_game.prom"
+STATE_PATH                   = "logs/candy_game.state"
 
 # Peripheral path
 GPIO_BASE_PATH               = "/sys/class/gpio"
@@ -90,6 +119,8 @@ BUTTON1                      = "P2_24"           # gpio44
 BUTTON2                      = "P2_18"           # gpio47
 BUTTON3                      = "P2_20"           # gpio64
 BUTTONS                      = [BUTTON0, BUTTON1, BUTTON2, BUTTON3]
+BUTTON_GPIOS                 = [46, 44, 47, 64]
+START_BUTTON                 = 2                 # BUTTON2 starts the game
 
 # LED GPIO values
 LED0                         = "P2_2"          # gpio59
@@ -97,6 +128,11 @@ LED1                         = "P2_4"          # gpio58
 LED2                         = "P2_6"          # gpio57
 LED3                         = "P2_8"          # gpio60
 LEDS                         = [LED0, LED1, LED2, LED3]
+LED_GPIOS                    = [59, 58, 57, 60]
+
+# How the GPIO pins are read and written: "sysfs" or "mmap" (GPIO 
+# registers, needs root, falls back to sysfs). Set CANDY_GPIO to change it.
+GPIO_ACCESS                  = os.environ.get("CANDY_GPIO", hal.SYSFS)
   
 # Buzzer GPIO value
 BUZZER                       = "P2_1"          # gpio50
@@ -105,84 +141,114 @@ SERVO                        = "P1_36"
 
 NOTES                        =  [262, 329, 392, 529]
 
+# The pins of a station: its buttons (and their gpio numbers), LEDs (and 
+# theirs), the buzzer and servo PWM pins and the I2C address of its display
+StationPins = collections.namedtuple("StationPins", ["buttons", "button_gpios", "leds", 
+                                                     "led_gpios", "buzzer", "servo", 
+                                                     "display_address"])
+
+STATION                      = StationPins(BUTTONS, BUTTON_GPIOS, LEDS, LED_GPIOS, 
+                                           BUZZER, SERVO, DISPLAY_I2C_ADDR)
+
+# The stations run by this PocketBeagle. Each one is a separate game; they
+# share the I2C bus of the displays (with a different address each).
+STATIONS                     = [STATION]
+
+# Game timing (seconds)
+PATTERN_STEP_TIME            = 1.0             # LED on 0.5 s, off 0.5 s per step
+LOCK_TIME                    = difficulty.LOCK_TIME        # Lockout after a loss
+LEVEL_TIMES                  = difficulty.LEVEL_TIMES      # End of LVL5..LVL1 after a win
+END_TIME                     = 0.5             # after the last press of a pattern
+
+LATENCY_SAMPLES              = 1024
+
+# ------------------------------------------------------------------------
+# Metrics
+# ------------------------------------------------------------------------
+"""Recording a metric costs well under a microsecond, so they are always on.
+They are written to METRICS_PATH once a minute (see metrics.py). All the 
+stations record to the same metrics."""
+METRICS                      = metrics.Registry()
+
+REACTION_TIME  = METRICS.histogram("candy_game_reaction_seconds",
+                                   "Time to each press, from the end of the pattern or the last press.",
+                                   [0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10])
+PATTERN_LENGTH = METRICS.histogram("candy_game_pattern_length",
+                                   "Length of each pattern.",
+                                   sorted(set(difficulty.PATTERN_LENGTHS)))
+LED_ON_TIME    = METRICS.histogram("candy_game_pattern_led_on_seconds",
+                                   "How long each LED of a pattern was on (0.5 s nominal).",
+                                   [0.49, 0.499, 0.5, 0.501, 0.505, 0.51, 0.55, 0.6])
+ROUND_TIME     = METRICS.histogram("candy_game_round_seconds",
+                                   "Time from the start button to the end of the input.",
+                                   [10, 15, 20, 25, 30, 40, 60, 120])
+DISPENSE_TIME  = METRICS.histogram("candy_game_dispense_seconds",
+                                   "Length of the servo pulse of each dispense (0.09 s nominal).",
+                                   [0.089, 0.09, 0.091, 0.095, 0.1, 0.11, 0.125, 0.15])
+INPUT_LATENCY  = METRICS.histogram("candy_game_input_latency_seconds",
+                                   "Time from a button edge to its station handling it.",
+                                   [0.0001, 0.0002, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.05])
+ROUNDS         = METRICS.counter("candy_game_rounds_total", "Rounds played.")
+PRESSES        = METRICS.counter("candy_game_presses_total", "Buttons pressed during input.")
+DISPENSES      = METRICS.counter("candy_game_dispenses_total", "Candy dispensed.")
+LOCKOUTS       = METRICS.counter("candy_game_lockouts_total", "Lockouts after a loss.")
+
+metrics_exporter             = None
+
+
 # ------------------------------------------------------------------------
 # Display Code
 # ------------------------------------------------------------------------
-"The display is setup to be programmed later."
-HEX_DIGITS                  = [0x3f, 0x06, 0x5b, 0x4f,    # 0, 1, 2, 3
-                               0x66, 0x6d, 0x7d, 0x07,    # 4, 5, 6, 7
-                               0x7f, 0x6f, 0x77, 0x7c,    # 8, 9, A, b
-                               0x39, 0x5e, 0x79, 0x71]    # C, d, E, F
-
-CLEAR_DIGIT                 = 0x7F
-POINT_VALUE                 = 0x80
-
-DIGIT_ADDR                  = [0x00, 0x02, 0x06, 0x08]
-COLON_ADDR                  = 0x04
-                      
-HT16K33_BLINK_CMD           = 0x80
-HT16K33_BLINK_DISPLAYON     = 0x01
-HT16K33_BLINK_OFF           = 0x00
-HT16K33_BLINK_2HZ           = 0x02
-HT16K33_BLINK_1HZ           = 0x04
-HT16K33_BLINK_HALFHZ        = 0x06
-
-HT16K33_SYSTEM_SETUP        = 0x20
-HT16K33_OSCILLATOR          = 0x01
-
-HT16K33_BRIGHTNESS_CMD      = 0xE0
-HT16K33_BRIGHTNESS_HIGHEST  = 0x0F
-HT16K33_BRIGHTNESS_DARKEST  = 0x00
+"""The display is setup to be programmed later. Every station has its own
+display (see Station.display_setup()); the functions below use the display
+of the first station."""
+display                     = None
+renderer                    = None
 
 def display_setup():
-    """Setup display"""
-    # i2cset -y 0 0x70 0x21
-    os.system("{0} {1}".format(DISPLAY_CMD, (HT16K33_SYSTEM_SETUP | HT16K33_OSCILLATOR)))
-    # i2cset -y 0 0x70 0x81
-    os.system("{0} {1}".format(DISPLAY_CMD, (HT16K33_BLINK_CMD | HT16K33_BLINK_OFF | HT16K33_BLINK_DISPLAYON)))
-    # i2cset -y 0 0x70 0xEF
-    os.system("{0} {1}".format(DISPLAY_CMD, (HT16K33_BRIGHTNESS_CMD | HT16K33_BRIGHTNESS_HIGHEST)))
+    """Setup the displays of all the stations.
+    
+    The I2C bus is opened once per display here and kept open for the rest
+    of the game. The game shows things on the display through the renderer.
+    """
+    global display
+    global renderer
+    
+    for each in game_loop.stations:
+        each.display_setup()
+    
+    display  = station.display
+    renderer = station.renderer
+
+# End def
+
+
+def display_show(what, rate=None):
+    """Show a frame or a source (see renderer.py) if there is a display."""
+    if renderer is not None:
+        renderer.show(what, rate)
 
 # End def
 
 
 def display_clear():
     """Clear the display to read '0000'"""
-    # i2cset -y 0 0x70 0x00 0x3F
-    os.system("{0} {1} {2}".format(DISPLAY_CMD, DIGIT_ADDR[0], HEX_DIGITS[0]))
-    # i2cset -y 0 0x70 0x02 0x3F
-    os.system("{0} {1} {2}".format(DISPLAY_CMD, DIGIT_ADDR[1], HEX_DIGITS[0]))
-    # i2cset -y 0 0x70 0x06 0x3F
-    os.system("{0} {1} {2}".format(DISPLAY_CMD, DIGIT_ADDR[2], HEX_DIGITS[0]))
-    # i2cset -y 0 0x70 0x08 0x3F
-    os.system("{0} {1} {2}".format(DISPLAY_CMD, DIGIT_ADDR[3], HEX_DIGITS[0]))
-    
-    os.system("{0} {1} {2}".format(DISPLAY_CMD, COLON_ADDR, 0x0))
+    display.clear()
+    display.flush()
     
 # End def
 
 
 def display_encode(data, double_point=False):
-    """Encode data to TM1637 format.
+    """Encode data to HT16K33 format.
     
-    This function will convert the data from decimal to the TM1637 data fromt
+    This function will convert the data from decimal to the HT16K33 data format
     
     :param value: Value must be between 0 and 15
     
     Will throw a ValueError if number is not between 0 and 15.
     """
-    ret_val = 0
-    
-    try:
-        if (data != CLEAR_DIGIT):
-            if double_point:
-                ret_val = HEX_DIGITS[data] + POINT_VALUE
-            else:
-                ret_val = HEX_DIGITS[data]
-    except:
-        raise ValueError("Digit value must be between 0 and 15.")
-
-    return ret_val
+    return display.encode(data, double_point)
 
 # End def
 
@@ -192,15 +258,17 @@ def display_set(data):
     
     data is a list containing 4 values
     """
-    for i in range(0,3):
-        display_set_digit(i, data[i])
+    for i in range(0,4):
+        display.set_digit(i, data[i])
+    display.flush()
     
 # End def
 
 
 def display_set_digit(digit_number, data, double_point=False):
     """Update the given digit of the display."""
-    os.system("{0} {1} {2}".format(DISPLAY_CMD, DIGIT_ADDR[digit_number], display_encode(data, double_point)))    
+    display.set_digit(digit_number, data, double_point)
+    display.flush()
 
 # End def
 
@@ -208,213 +276,754 @@ def display_set_digit(digit_number, data, double_point=False):
 def update_display(value):
     """Update the value on the display.  
     
-    This function will clear the display and then set the appropriate digits
+    The digits are looked up in the renderer's table and only the digits
+    that changed are sent to the display.
     
     :param value: Value must be between 0 and 9999.
     
     Will throw a ValueError if number is not between 0 and 9999.
     """  
-    """
-    if (value < 0) or (value > 9999):
-       raise ValueError("Value is not within 0 and 9999.") 
-    
-    if (value < 10):
-        display_set_digit(3, value)
-        display_set_digit(2, 0)
-        display_set_digit(1, 0)
-        display_set_digit(0, 0)
-    else:
-        if (value < 100):
-            display_set_digit(3, value % 10)
-            display_set_digit(2, value / 10)
-            display_set_digit(1, 0)
-            display_set_digit(0, 0)
+    display_show(display_renderer.number_frame(value, leading_zeros=True))
+
+# End def
+    
+def setup_game(game_backend=None, log_path=None, on_ready=None, seed=None, 
+               trace=None, metrics_path=None, stations=None, state_path=None, saved=None):
+    """This function sets the buttons to read inputs. The LEDs are set to
+    output a value and to be off. The win time and again time are set so the
+    game begins on Level 1, unless the timers of a station are in the state
+    file: then it picks up where it was (e.g. still locked).
+    
+    The buttons are set up first, since they are all that is needed to see
+    the start button. on_ready() is called as soon as they are. Everything
+    else is set up after that (the display is set up by the main script 
+    once the game is waiting).
     
+    The module keeps the game loop and its first station (station) so a
+    single station game can be run with step_game() / run_game().
+    
+    :param game_backend: hal backend to run on (default is the PocketBeagle)
+    :param log_path:     file for the event log (None keeps it in memory)
+    :param on_ready:     function called once button presses are accepted
+    :param seed:         seed for the patterns (default is a random seed)
+    :param trace:        session_trace.TraceWriter to record the session to
+                         (for a single station)
+    :param metrics_path: Prometheus textfile for the metrics (None: no file)
+    :param stations:     list of StationPins (default is STATIONS)
+    :param state_path:   state file keeping the timers across restarts 
+                         (None: start over every time)
+    :param saved:        list of state_file.Saved (or None) to start the 
+                         stations from instead of the state file (used to 
+                         replay a session that was resumed)
     """
-    for i in range(0,4):
-        display_set_digit((3 - i), (value % 10))
-        value = (value / 10)
-    #"""
-    #pass
+    global backend
+    global display
+    global renderer
+    global game_seed
+    global trace_writer
+    if game_backend is None:
+        game_backend = hal.BBIOBackend()
+    
+    # The seed is recorded so the patterns of a session can be made again
+    if seed is None:
+        seed = random.getrandbits(63)
+    game_seed = seed
+    
+    trace_writer = trace
+    if trace is not None:
+        trace.session(seed, game_backend.now)
+        game_backend = session_trace.TraceBackend(game_backend, trace)
+    
+    backend  = game_backend
+    display  = None
+    renderer = None
+    startup.PROFILER.mark("backend")
+    
+    global game_loop
+    global station
+    global scheduler
+    global event_log
+    game_loop = GameLoop(backend, stations or STATIONS, seed, log_path, on_ready, trace,
+                         state_path)
+    station   = game_loop.stations[0]
+    scheduler = game_loop.scheduler
+    event_log = game_loop.event_log
     
+    if trace_writer is not None:
+        trace_writer.start_timer(scheduler)
+    
+    global metrics_exporter
+    metrics_exporter = None
+    if metrics_path is not None:
+        metrics_exporter = metrics.TextfileExporter(METRICS, metrics_path, scheduler)
+    
+    startup.PROFILER.mark("setup done")
+    
+    return reset_game(saved)
 
 # End def
+
+
+def reset_game(saved=None):
+    """Start every station, on Level 1 or from its saved timers. Returns 
+    the win time and again time of the first station.
     
-def setup_game():
-    """This function sets the buttons to read inputs. The LEDs are set to
-    output a value and to be off. The win time and again time are set so the
-    game begins on Level 1."""
-    
-    GPIO.setup(BUTTON0, GPIO.IN)
-    GPIO.setup(BUTTON1, GPIO.IN)
-    GPIO.setup(BUTTON2, GPIO.IN)
-    GPIO.setup(BUTTON3, GPIO.IN)    
-
-    GPIO.setup(LED0, GPIO.OUT, GPIO.LOW) 
-    GPIO.setup(LED1, GPIO.OUT, GPIO.LOW)
-    GPIO.setup(LED2, GPIO.OUT, GPIO.LOW)
-    GPIO.setup(LED3, GPIO.OUT, GPIO.LOW)
-        
-    display_setup
-    
-    global win_time
-    win_time = 0
-    global again_time
-    again_time = 1500
-    
-    return win_time, again_time
-    
-def lock_game():
-    """This function is used when the pattern is incorrectly repeated. The 
-    buzzer sounds letting the user know they lost. A lose count is started, so 
-    the game cannot be played for 20 minutes."""
-    global lose_time
-    PWM.start(BUZZER, 100)
-    time.sleep(1)
-    PWM.stop(BUZZER)
-    while (time.time() - lose_time <= 1200):
-        print ("LOCK")
-    clear_game()
-    
-
-def clear_game():
-    """The LEDS are set to turn off and the game waits for the next start input."""
-    GPIO.output(LED0, GPIO.LOW) 
-    GPIO.output(LED1, GPIO.LOW)
-    GPIO.output(LED2, GPIO.LOW)
-    GPIO.output(LED3, GPIO.LOW)
-    #print("off")
-    while(GPIO.input(BUTTON2) == 1):
-        time.sleep(0.1)
-        if (GPIO.input(BUTTON2) == 0):
-            play_game()
+    :param saved: list of state_file.Saved (or None) of the stations, to 
+                  use instead of the state file
+    """
+    for index, each in enumerate(game_loop.stations):
+        each.reset(game_loop.saved(index) if saved is None else saved[index])
+    
+    return station.win_time, station.again_time
+
+# End def
+
+
+def pin_gpios(stations):
+    """Return {pin: gpio number} of the buttons and LEDs of stations, for 
+    the GPIO register backend."""
+    gpios = {}
+    for pins in stations:
+        gpios.update(zip(pins.buttons + pins.leds, pins.button_gpios + pins.led_gpios))
+    return gpios
+
+# End def
+
+
+def station_profiles(pins):
+    """Return the PWM motion profiles of a station: (duty cycle, seconds) 
+    steps on one pin."""
+    return {
+        "dispense"   : pwm_channels.Profile(pins.servo, hal.PWM_FREQUENCY, [(1, 0.09)]),    # quarter turn
+        "error buzz" : pwm_channels.Profile(pins.buzzer, hal.PWM_FREQUENCY, [(100, 1.0)]),
+    }
+
+# End def
+
     
 # ------------------------------------------------------------------------
 # Game Code
 # ------------------------------------------------------------------------
+r"""Each station is a state machine. Each state does its work and returns 
+the next state. Nothing calls back into the game, so the stack and the 
+pattern lists stay the same size no matter how many rounds are played.
+
+    IDLE -> SHOW_PATTERN -> READ_INPUT -> DISPENSE -> COOLDOWN -> SHOW_PATTERN
+                                      \-> LOCKED -> IDLE          \-> IDLE
+
+A state never blocks. The states are generators: where a state has to 
+wait, it yields and the game loop goes on with the other stations. All the
+stations share one scheduler and one button input, so one loop (and one 
+epoll on the board) runs them all.
+"""
+IDLE                         = "IDLE"
+SHOW_PATTERN                 = "SHOW_PATTERN"
+READ_INPUT                   = "READ_INPUT"
+DISPENSE                     = "DISPENSE"
+COOLDOWN                     = "COOLDOWN"
+LOCKED                       = "LOCKED"
+
+# The number of each state in the state file
+STATE_NAMES                  = [IDLE, SHOW_PATTERN, READ_INPUT, DISPENSE, COOLDOWN, LOCKED]
+STATE_NUMBERS                = dict((state, number) for number, state in enumerate(STATE_NAMES))
+
+# Set by setup_game()
+game_seed                    = None
+trace_writer                 = None
+game_loop                    = None
+station                      = None
 
-def play_game():
-    """The pattern is created. The length is based on the amount of time since
-    the last win. The LEDS ouput the pattern. The user repeats the pattern by 
-    pressing the corresponding button. If the pattern is correct, the servo
-    spins one quarter of a revolution. A count is started so the win time can 
-    be compared with the time when the next game starts. If the pattern is 
-    incorrect, a lose time is started while the lock function is called."""
-    
-    
-    pattern = []
-    user_input = []
-    playing_game = True
-    global win_time
-    global again_time
-    
-    GPIO.output(LED0, GPIO.LOW) 
-    GPIO.output(LED1, GPIO.LOW)
-    GPIO.output(LED2, GPIO.LOW)
-    GPIO.output(LED3, GPIO.LOW)
-
-    #win_time, again_time = setup_game()
-
-    time.sleep(1)
-    
-    if again_time - win_time <= 300:
-        a = 15   
-    elif again_time - win_time <= 600:
-        a = 13
-    elif again_time - win_time <= 900:
-        a = 11
-    elif again_time - win_time <= 1200:
-        a = 9
-    else:
-        a = 7
-        
-    
-    for x in range(a):
-        rand = random.randint(0, 3)
-        pattern.append(rand)
-    print(pattern)
-    
-    for i in range(0, len(pattern)):
-        GPIO.output(LEDS[pattern[i]], GPIO.HIGH)
-        time.sleep(0.5)
-        GPIO.output(LEDS[pattern[i]], GPIO.LOW)
-        time.sleep(0.5)
-        
-    while (len(user_input) < len(pattern)):   # Wait until any button is pressed
-        if (GPIO.input(BUTTON0) == 0):
-            GPIO.output(LED0, GPIO.HIGH)
-            time.sleep(.5)
-            user_input.append(0)
-            GPIO.output(LED0, GPIO.LOW)
-            #print("Button 0 accepts input") # TESTING 
-        elif (GPIO.input(BUTTON1) == 0):
-            GPIO.output(LED1, GPIO.HIGH)
-            time.sleep(.5)
-            user_input.append(1)
-            GPIO.output(LED1, GPIO.LOW)
-            #print("Button 1 accepts input") # TESTING 
-        elif (GPIO.input(BUTTON2) == 0):
-            GPIO.output(LED2, GPIO.HIGH)
-            time.sleep(.5)
-            user_input.append(2)
-            GPIO.output(LED2, GPIO.LOW)
-            #print("Button 2 accepts input") # TESTING 
-        elif (GPIO.input(BUTTON3) == 0):
-            GPIO.output(LED3, GPIO.HIGH)
-            time.sleep(.5)
-            user_input.append(3)
-            GPIO.output(LED3, GPIO.LOW)
-            #print("Button 3 accepts input") # TESTING
-    if (pattern == user_input):
+# What the display shows when a state starts
+STATE_DISPLAY = {
+    IDLE : display_renderer.text_frame("PLAY"),
+}
+
+
+class Station(object):
+    """One candy game: its pins, timers, difficulty and state machine.
+    
+    A state yields None to wait for the next button event of the station,
+    or a time (of the scheduler clock) to wait for an event or that time,
+    whichever is first. It is sent the event, or None if the time came or 
+    the station was woken up (by the end of a pattern, PWM profile or 
+    timer), and checks for itself whether what it waits for has happened.
+    """
+
+    def __init__(self, loop, pins, index=0, name=None, seed=None, trace=None):
+        """Set up the LEDs, buzzer and servo of the station. The buttons 
+        belong to the loop.
+        
+        :param loop:  GameLoop running the station
+        :param pins:  StationPins
+        :param index: number of the station (its slot in the state file)
+        :param name:  name of the station in timer names and the event log
+                      (None for a single station)
+        :param seed:  seed for the patterns
+        :param trace: session_trace.TraceWriter to record the patterns to
+        """
+        self.loop         = loop
+        self.backend      = loop.backend
+        self.scheduler    = loop.scheduler
+        self.pins         = pins
+        self.index        = index
+        self.name         = name
+        self.rng          = random.Random(seed)
+        self.trace_writer = trace
+        self.event_log    = None
+        
+        self.backend.gpio_setup_many(pins.leds, hal.OUT, hal.LOW)
+        
+        # The servo and buzzer PWM channels are claimed once, here
+        self.pwm_manager  = pwm_channels.PWMManager(self.backend, station_profiles(pins))
+        self.sequencer    = game_sequencer.Sequencer(self.backend, self.scheduler, pins.leds, 
+                                                     pins.buzzer, NOTES, on_times=LED_ON_TIME,
+                                                     name=self.timer("sequencer"))
+        self.wait_timer   = self.timer("wait")
+        
+        self.display      = None
+        self.renderer     = None
+        
+        # Reused every round
+        self.pattern      = []
+        self.user_input   = []
+        
+        self.state        = IDLE
+        self.steps        = 0                 # state changes so far
+        self.task         = None
+        self.pulse        = None
+        self.win_time     = 0.0
+        self.again_time   = 0.0
+        self.lose_time    = 0.0
+        self.resuming     = False
+        self.latency      = collections.deque(maxlen=LATENCY_SAMPLES)
+    
+    # End def
+    
+    def timer(self, name):
+        """Return the name of timer name of this station on the scheduler."""
+        if self.name is None:
+            return name
+        return "{0}:{1}".format(self.name, name)
+    
+    # End def
+    
+    def log(self, kind, **fields):
+        """Add an event to the event log, with the name of the station."""
+        if self.name is not None:
+            fields["station"] = self.name
+        self.event_log.log(kind, **fields)
+    
+    # End def
+    
+    def reset(self, saved=None):
+        """Set the win time and again time so the next game is on Level 1,
+        and start the state machine in IDLE.
+        
+        :param saved: state_file.Saved timers of the station to pick up 
+                      from instead. A lockout or cooldown that is not over
+                      goes on; a round that was being played is lost, but
+                      its difficulty is kept.
+        """
+        now             = self.scheduler.now()
+        self.again_time = now
+        self.win_time   = now - 1500
+        self.state      = IDLE
+        self.resuming   = False
+        
+        if saved is not None:
+            # A replay of the session has to start from the same timers
+            if self.trace_writer is not None:
+                self.trace_writer.restore(saved)
+            
+            state           = STATE_NAMES[saved.state]
+            self.win_time   = saved.win_time
+            self.again_time = saved.again_time
+            self.lose_time  = saved.lose_time
+            if (state == LOCKED) and (saved.lose_time + LOCK_TIME > now):
+                self.state    = LOCKED
+                self.resuming = True
+            elif (state == COOLDOWN) and (saved.win_time + LEVEL_TIMES[-1] > now):
+                self.state    = COOLDOWN
+            self.log("restore", state=self.state, saved=state,
+                     win_age=round(now - self.win_time), lose_age=round(now - self.lose_time))
+        
+        self.task       = self._run()
+        self.resume()
+        
+        return self.win_time, self.again_time
+    
+    # End def
+    
+    def resume(self, event=None):
+        """Run the current state until it waits again."""
+        deadline = self.task.send(event)
+        if deadline is None:
+            self.scheduler.cancel(self.wait_timer)
+        else:
+            self.scheduler.call_at(deadline, self.resume, name=self.wait_timer)
+    
+    # End def
+    
+    def deliver(self, event):
+        """Hand a button event (with the button number of this station) to
+        the current state."""
+        latency = self.scheduler.now() - event.timestamp
+        INPUT_LATENCY.observe(latency)
+        self.latency.append(latency)
+        self.resume(event)
+    
+    # End def
+    
+    def latency_stats(self):
+        """Return (samples, p50, p99, max) of the input latency in seconds."""
+        samples = sorted(self.latency)
+        count   = len(samples)
+        if count == 0:
+            return (0, 0.0, 0.0, 0.0)
+        
+        return (count, samples[count // 2], samples[min(count - 1, int(count * 0.99))], 
+                samples[-1])
+    
+    # End def
+    
+    def _run(self):
+        """Run the current state and move to the state it returns, forever."""
+        while True:
+            state = yield from STATES[self.state](self)
+            if state != self.state:
+                self.log("state", state=state)
+            self.state  = state
+            self.steps += 1
+            self.save()
+    
+    # End def
+    
+    def save(self, sync=False):
+        """Save the state and timers of the station to the state file, if
+        there is one. It is written to the card on a timer unless sync."""
+        state_file = self.loop.state_file
+        if state_file is not None:
+            state_file.save(self.index, STATE_NUMBERS[self.state], self.win_time, 
+                            self.again_time, self.lose_time, sync)
+    
+    # End def
+    
+    def sleep(self, seconds):
+        """Wait for seconds (use with yield from). Button presses are 
+        thrown away."""
+        end = self.scheduler.now() + seconds
+        while self.scheduler.now() < end:
+            yield end
+    
+    # End def
+    
+    def play(self, name):
+        """Play PWM profile name (use with yield from). Returns the length 
+        of the pulse. Button presses are thrown away."""
+        self.pulse = None
+        self.pwm_manager.play(name, self.scheduler, self._pulse_done, timer=self.timer("pwm"))
+        while self.pulse is None:
+            yield None
+        
+        return self.pulse
+    
+    # End def
+    
+    def _pulse_done(self, elapsed):
+        self.pulse = elapsed
+        self.resume()
+    
+    # End def
+    
+    def display_setup(self):
+        """Setup the display of the station."""
+        if self.display is None:
+            transport    = self.backend.i2c_open(DISPLAY_I2C_BUS, self.pins.display_address)
+            self.display = ht16k33.HT16K33(transport=transport)
+        
+        self.display.setup()
+        self.display.flush()
+        
+        self.renderer = display_renderer.Renderer(self.display, self.scheduler, 
+                                                  name=self.timer("display"))
+        self.display_show(STATE_DISPLAY.get(self.state, display_renderer.BLANK_FRAME))
+    
+    # End def
+    
+    def display_show(self, what, rate=None):
+        """Show a frame or a source (see renderer.py) if there is a display."""
+        if self.renderer is not None:
+            self.renderer.show(what, rate)
+    
+    # End def
+    
+    def leds_off(self):
+        """Turn all of the LEDs off (one register store with the mmap backend)."""
+        leds = self.pins.leds
+        self.backend.gpio_output_many(leds, [hal.LOW] * len(leds))
+    
+    # End def
+    
+    def lockout_remaining(self):
+        """Return the number of seconds left in the lockout (0 if not locked)."""
+        return self.scheduler.remaining(self.timer("lockout"))
+    
+    # End def
+    
+    def show_level(self, index):
+        """Show the level for the level window index after a win and schedule 
+        the next window. After the last window, cooldown() is woken up."""
+        if (index < len(LEVEL_TIMES)):
+            level = difficulty.LEVELS[index]
+            self.log("level", level=level)
+            self.display_show(display_renderer.text_frame("LVL{0}".format(level)))
+            self.scheduler.call_at(self.win_time + LEVEL_TIMES[index], 
+                                   lambda: self.show_level(index + 1), 
+                                   name=self.timer("level"))
+        else:
+            self.resume()
+    
+    # End def
+    
+    def pattern_length(self):
+        """The length of the pattern is based on the time between the last win
+        and the start of this game (see difficulty.py)."""
+        return difficulty.pattern_length(self.again_time - self.win_time)
+    
+    # End def
+    
+    def idle(self):
+        """The LEDS are set to turn off and the game waits for the next start input."""
+        self.leds_off()
+        #print("off")
+        self.display_show(STATE_DISPLAY[IDLE])
+        while True:
+            event = yield None
+            if event and event.pressed and (event.button == START_BUTTON):
+                break
+        self.again_time = self.scheduler.now()
+        
+        return SHOW_PATTERN
+    
+    # End def
+    
+    def show_pattern(self):
+        """The pattern is created. The length is based on the amount of time since
+        the last win. The LEDS ouput the pattern."""
+        self.leds_off()
+        yield from self.sleep(1)
+        
+        pattern = self.pattern
+        del pattern[:]
+        for x in range(self.pattern_length()):
+            pattern.append(self.rng.randint(0, 3))
+        self.log("pattern", length=len(pattern), 
+                 pattern="".join(str(step) for step in pattern))
+        if self.trace_writer is not None:
+            self.trace_writer.pattern(pattern)
+        ROUNDS.inc()
+        PATTERN_LENGTH.observe(len(pattern))
+        self.display_show(display_renderer.number_frame(len(pattern)))
+        
+        # The pattern plays in the background. Button presses are still read
+        # while it plays, but they do not count.
+        self.sequencer.play(pattern, PATTERN_STEP_TIME, on_done=self.resume)
+        while self.sequencer.playing:
+            yield None
+        
+        return READ_INPUT
+    
+    # End def
+    
+    def read_input(self):
+        """The user repeats the pattern by pressing the corresponding button. The 
+        LED and tone of a button play while the button is held down."""
+        pattern    = self.pattern
+        user_input = self.user_input
+        del user_input[:]
+        
+        # Presses made while the pattern was playing were thrown away by 
+        # show_pattern()
+        last_press = self.scheduler.now()
+        
+        while (len(user_input) < len(pattern)):   # Wait until any button is pressed
+            event = yield None
+            if event is None:
+                continue
+            if event.pressed:
+                now = self.scheduler.now()
+                REACTION_TIME.observe(now - last_press)
+                PRESSES.inc()
+                last_press = now
+                self.sequencer.note_on(event.button)
+                user_input.append(event.button)
+                self.display_show(display_renderer.number_frame(len(pattern) - len(user_input)))
+                #print("Button {0} accepts input".format(event.button)) # TESTING 
+            else:
+                self.sequencer.note_off(event.button)
+        
+        # Give the last press time to be seen before moving on
+        yield from self.sleep(END_TIME)
+        self.sequencer.note_off(user_input[-1])
+        ROUND_TIME.observe(self.scheduler.now() - self.again_time)
+        
+        if (pattern == user_input):
+            self.log("win", length=len(pattern))
+            return DISPENSE
+        else:
+            self.log("loss", length=len(pattern), 
+                     entered="".join(str(step) for step in user_input))
+            return LOCKED
+    
+    # End def
+    
+    def dispense(self):
+        """The servo spins one quarter of a revolution. A count is started so the 
+        win time can be compared with the time when the next game starts."""
         #print("win")
-        PWM.start(SERVO, 1)
-        time.sleep(0.09)
-        PWM.stop(SERVO)
-        win_time = time.time()
+        pulse = yield from self.play("dispense")
+        DISPENSES.inc()
+        DISPENSE_TIME.observe(pulse)
+        self.win_time = self.scheduler.now()
         #print(win_time)
-        while(GPIO.input(BUTTON2) == 1):
-            time.sleep(0.1)
-            if (time.time() - win_time <= 300):
-                print("LVL5")
-            elif (time.time() - win_time <= 600):
-                print ('LVL4')
-            elif (time.time() - win_time <= 900):
-                print ('LVL3')
-            elif (time.time() - win_time <= 1200):
-                print ('LVL2')
-            elif (time.time() - win_time <= 1300):
-                print ('LVL1')
-            else:
-                clear_game()
-        if (GPIO.input(BUTTON2) == 0):
-            again_time = time.time()
-            #print(again_time)
-            play_game()
-        #print(button_press_time)
-    elif (pattern != user_input):
-        global lose_time
-        lose_time = time.time()
-        #print("lose")
-        lock_game()
+        self.log("dispense", pulse_ms=round(pulse * 1000, 1))
+        
+        return COOLDOWN
+    
+    # End def
+    
+    def cooldown(self):
+        """The level goes down over the next 20 minutes. If the start button is 
+        pressed before then, the next game starts right away."""
+        level = self.timer("level")
+        
+        # After a restart the cooldown picks up in the window it was in
+        index = difficulty.window(self.scheduler.now() - self.win_time)
+        if index >= len(LEVEL_TIMES):
+            return IDLE
+        
+        self.show_level(index)
+        while self.scheduler.pending(level):
+            event = yield None
+            if event and event.pressed and (event.button == START_BUTTON):
+                self.scheduler.cancel(level)
+                self.again_time = self.scheduler.now()
+                #print(again_time)
+                return SHOW_PATTERN
+        
+        return IDLE
+    
+    # End def
+    
+    def locked(self):
+        """The buzzer sounds letting the user know they lost. A lose count is 
+        started, so the game cannot be played for 20 minutes."""
+        lockout = self.timer("lockout")
+        
+        if self.resuming:
+            # Restarted during the lockout: it goes on from lose_time
+            self.resuming  = False
+        else:
+            self.lose_time = self.scheduler.now()
+            #print("lose")
+            LOCKOUTS.inc()
+            # Written to the card right away, so a power cycle does not
+            # end the lockout
+            self.save(sync=True)
+            yield from self.play("error buzz")
+        
+        end = self.lose_time + LOCK_TIME
+        self.scheduler.call_at(end, self.resume, name=lockout)
+        self.display_show(display_renderer.alternate_source(
+            [(display_renderer.text_frame("LOCK"), 1), 
+             (display_renderer.countdown_source(end), 3)], self.lose_time), 
+            rate=1)
+        self.log("lockout", seconds=LOCK_TIME)
+        # Wait until the lockout is over. Button presses are thrown away.
+        while self.scheduler.pending(lockout):
+            yield None
+        
+        return IDLE
+    
+    # End def
+    
+    def close(self):
+        """Turn the PWM outputs off and release them."""
+        self.sequencer.stop()
+        self.pwm_manager.close()
+    
+    # End def
 
-# End def
+# End class
 
 
+STATES = {
+    IDLE         : Station.idle,
+    SHOW_PATTERN : Station.show_pattern,
+    READ_INPUT   : Station.read_input,
+    DISPENSE     : Station.dispense,
+    COOLDOWN     : Station.cooldown,
+    LOCKED       : Station.locked
+}
+
+
+class GameLoop(object):
+    """Runs stations on one scheduler. The buttons of all of them are read 
+    through one button input, and each event is handed to its station."""
+
+    def __init__(self, backend, stations, seed=None, log_path=None, on_ready=None, 
+                 trace=None, state_path=None):
+        """Set up the buttons, then the stations.
+        
+        :param stations: list of StationPins
+        :param seed:     seed for the patterns (station i uses seed + i)
+        :param log_path: file for the event log (None keeps it in memory)
+        :param on_ready: function called once button presses are accepted
+        :param trace:    session_trace.TraceWriter (for a single station)
+        :param state_path: state file for the timers of the stations (None:
+                           the timers are not kept)
+        """
+        self.backend   = backend
+        self.scheduler = game_scheduler.Scheduler(backend.now, backend.sleep)
+        
+        gpios = []
+        for pins in stations:
+            backend.gpio_setup_many(pins.buttons, hal.IN)
+            gpios.extend(pins.button_gpios)
+        self.buttons   = backend.button_input(gpios)
+        
+        startup.PROFILER.mark("buttons ready")
+        if on_ready is not None:
+            on_ready()
+        
+        if seed is None:
+            seed = random.getrandbits(63)
+        
+        # Button of the button input -> (station, button of the station)
+        self.routes    = []
+        self.stations  = []
+        for index, pins in enumerate(stations):
+            name = None if len(stations) == 1 else "station{0}".format(index)
+            each = Station(self, pins, index, name, seed + index, trace)
+            self.stations.append(each)
+            self.routes.extend((each, button) for button in range(len(pins.buttons)))
+        
+        self.event_log = telemetry.EventLog(log_path, self.scheduler)
+        for each in self.stations:
+            each.event_log = self.event_log
+        
+        self.state_file = None
+        if state_path is not None:
+            self.state_file = state_file.StateFile(state_path, len(stations), 
+                                                   self.scheduler.now, 
+                                                   scheduler=self.scheduler)
+        
+        # The table of number frames takes about 20 ms to build. Build it
+        # now, not in the first round, where it would hold up every station.
+        display_renderer.number_frame(0)
+    
+    # End def
+    
+    def saved(self, index):
+        """Return the saved timers of station index, or None."""
+        if self.state_file is None:
+            return None
+        return self.state_file.load(index)
+    
+    # End def
+    
+    def run_once(self):
+        """Wait for the next button event or timer and handle it."""
+        event = self.scheduler.wait(self.buttons.get)
+        if event is not None:
+            each, button = self.routes[event.button]
+            if button != event.button:
+                event = event._replace(button=button)
+            each.deliver(event)
+    
+    # End def
+    
+    def run(self):
+        """Run the stations forever. Errors are logged before they stop the game."""
+        try:
+            while True:
+                self.run_once()
+        except Exception as error:
+            self.event_log.log("error", state=",".join(each.state for each in self.stations), 
+                               message=repr(error))
+            raise
+        finally:
+            self.close()
+    
+    # End def
     
+    def close(self):
+        """Turn the stations off, close the event log and release the 
+        backend (the stations need it to turn off, so it goes last)."""
+        for each in self.stations:
+            each.close()
+        self.event_log.close()
+        if self.state_file is not None:
+            self.state_file.close()
+        self.backend.close()
+    
+    # End def
+
+# End class
+
+
+def step_game():
+    """Run the game loop until the first station moves to another state. 
+    Returns the new state."""
+    steps = station.steps
+    while station.steps == steps:
+        game_loop.run_once()
+    
+    return station.state
+
+# End def
+
+
+def run_game():
+    """Run the game forever. Errors are logged before they stop the game."""
+    try:
+        game_loop.run()
+    finally:
+        if metrics_exporter is not None:
+            metrics_exporter.write()
+        if trace_writer is not None:
+            trace_writer.close()
+
+# End def
+
 
 # ------------------------------------------------------------------------
 # Main script
 # ------------------------------------------------------------------------
-        
-if __name__ == '__main__':
-    display_setup()
-    #display_clear()
+
+def main():
+    """Run the game on the PocketBeagle."""
+    game_backend = hal.make_backend(GPIO_ACCESS, pin_gpios(STATIONS))
+    
+    # A trace is one game; it is only recorded when there is one station
+    trace = None
+    if len(STATIONS) == 1:
+        trace = session_trace.TraceWriter(TRACE_PATH)
     
-    setup_game()
+    setup_game(game_backend, log_path=LOG_PATH, on_ready=startup.notify_ready, 
+               trace=trace, metrics_path=METRICS_PATH, state_path=STATE_PATH)
+    event_log.log("startup", seed=game_seed, backend=type(game_backend).__name__, 
+                  stations=len(STATIONS), **startup.PROFILER.as_dict())
     
-    playing = True
+    # The display is not needed to start a game. It is set up once the 
+    # game is waiting for the start button.
+    scheduler.call_later(0, display_setup)
+    #display_clear()
     
-    while(GPIO.input(BUTTON2) == 1):
-        time.sleep(0.1)
-        if (GPIO.input(BUTTON2) == 0):
-            play_game()
+    run_game()
+
+# End def
+
+        
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+--------------------------------------------------------------------------
+Difficulty
+--------------------------------------------------------------------------
+License:
+Copyright 2021 <Jessica Kies>
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors
+may be used to endorse or promote products derived from this software without
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+Difficulty
+    Overview: The difficulty curve of the candy game. After a win the game
+    gets easier the longer nobody plays: the pattern gets shorter and the
+    level shown on the display goes down, one step per window.
+
+        seconds since the last win    level    pattern length
+                    0 -  300            5            15
+                  300 -  600            4            13
+                  600 -  900            3            11
+                  900 - 1200            2             9
+                 1200 - 1300            1             7
+                 after 1300            (none)         7
+
+    The game (candy_game.py) and the difficulty simulator
+    (difficulty_sim.py) both read this table, so a change here is what
+    the simulator reports on.
+
+--------------------------------------------------------------------------
+"""
+import bisect
+
+
+# ------------------------------------------------------------------------
+# Global Constants
+# ------------------------------------------------------------------------
+
+# (end of the window in seconds after a win, level, pattern length)
+DIFFICULTY = [
+    (300,  5, 15),
+    (600,  4, 13),
+    (900,  3, 11),
+    (1200, 2,  9),
+    (1300, 1,  7),
+]
+EASIEST_LENGTH               = 7                 # after the last window
+
+LEVEL_TIMES                  = [end for end, level, length in DIFFICULTY]
+LEVELS                       = [level for end, level, length in DIFFICULTY]
+PATTERN_LENGTHS              = [length for end, level, length in DIFFICULTY] + [EASIEST_LENGTH]
+
+LOCK_TIME                    = 1200            # Lockout after a loss
+
+
+# ------------------------------------------------------------------------
+# Functions
+# ------------------------------------------------------------------------
+
+def window(elapsed):
+    """Return the index of the window elapsed seconds after a win is in
+    (len(DIFFICULTY) after the last window). A time on the end of a window
+    is in that window."""
+    return bisect.bisect_left(LEVEL_TIMES, elapsed)
+
+# End def
+
+
+def pattern_length(elapsed):
+    """Return the pattern length for a game started elapsed seconds after
+    the last win."""
+    return PATTERN_LENGTHS[window(elapsed)]
+
+# End def
+
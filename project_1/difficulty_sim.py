@@ -0,0 +1,213 @@
+"""
+--------------------------------------------------------------------------
+Difficulty Simulator
+--------------------------------------------------------------------------
+License:
+Copyright 2021 <Jessica Kies>
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors
+may be used to endorse or promote products derived from this software without
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+Difficulty Simulator
+    Overview: Monte Carlo model of the candy game, for tuning the
+    difficulty curve (difficulty.py) without watching the cabinet for a
+    day. Many cabinets are simulated side by side with NumPy: every pass
+    of the loop plays one round on every cabinet at once.
+
+    Player model:
+      - Players walk up at random (a Poisson process, --arrivals per hour).
+        Anyone who walks up while a round is being played or the cabinet is
+        locked walks away.
+      - A player gets each step of the pattern right with probability
+        --recall, so a pattern of length L is won with recall ** L.
+      - After a win the same player plays again with probability --replay,
+        on average --replay-delay seconds later.
+
+    A round takes 1 s before the pattern, the pattern itself, the presses
+    (--press-time per step) and 0.5 s after the last press. A win adds the
+    dispense, a loss the buzzer and the lockout (difficulty.LOCK_TIME).
+
+    Reports dispenses per hour, the fraction of the time the cabinet is
+    locked, and how long a load of --inventory candies lasts.
+
+    Usage:
+        python3 difficulty_sim.py [--rounds N] [--cabinets N] [--recall P]
+                                  [--arrivals N] [--replay P] [--inventory N]
+
+--------------------------------------------------------------------------
+"""
+import argparse
+import time
+
+import numpy as np
+
+import difficulty
+
+
+# ------------------------------------------------------------------------
+# Global Constants
+# ------------------------------------------------------------------------
+START_DELAY                  = 1.0               # before the pattern is shown
+STEP_TIME                    = 1.0               # candy_game.PATTERN_STEP_TIME
+END_DELAY                    = 0.5               # after the last press
+DISPENSE_TIME                = 0.09
+BUZZER_TIME                  = 1.0
+
+CABINETS                     = 100000
+
+
+# ------------------------------------------------------------------------
+# Simulator
+# ------------------------------------------------------------------------
+
+def simulate(rounds, cabinets=CABINETS, recall=0.95, arrivals=6.0, replay=0.5,
+             replay_delay=20.0, press_time=0.5, seed=301):
+    """Play about rounds rounds spread over cabinets cabinets.
+
+    :param arrivals:     players walking up per hour
+    :param replay:       chance a winner plays again
+    :param replay_delay: mean seconds before a winner plays again
+    :param press_time:   seconds per button press
+
+    Returns a dict of totals over all cabinets.
+    """
+    rng      = np.random.default_rng(seed)
+    passes   = max(1, -(-rounds // cabinets))
+
+    ends     = np.array(difficulty.LEVEL_TIMES, dtype=np.float64)
+    lengths  = np.array(difficulty.PATTERN_LENGTHS, dtype=np.int64)
+    win_odds = float(recall) ** lengths          # chance of winning each window
+
+    # Every cabinet starts idle on level 1 (like reset_game())
+    now      = np.zeros(cabinets)
+    win_time = np.full(cabinets, -2.0 * ends[-1])
+    won      = np.zeros(cabinets, dtype=bool)
+    mean_gap = 3600.0 / arrivals
+
+    totals = {
+        "rounds"    : 0,
+        "dispenses" : 0,
+        "lockouts"  : 0,
+        "locked"    : 0.0,
+        "playing"   : 0.0,
+        "windows"   : np.zeros(len(lengths), dtype=np.int64),
+        "wins"      : np.zeros(len(lengths), dtype=np.int64),
+    }
+
+    for i in range(passes):
+        # Time until the next round starts
+        gap = rng.exponential(mean_gap, cabinets)
+        if replay > 0:
+            again = won & (rng.random(cabinets) < replay)
+            gap[again] = rng.exponential(replay_delay, int(again.sum()))
+        start = now + gap
+
+        index  = np.searchsorted(ends, start - win_time, side="left")
+        length = lengths[index]
+        won    = rng.random(cabinets) < win_odds[index]
+
+        playing = START_DELAY + length * (STEP_TIME + press_time) + END_DELAY
+        locked  = np.where(won, 0.0, BUZZER_TIME + difficulty.LOCK_TIME)
+        now     = start + playing + np.where(won, DISPENSE_TIME, locked)
+        win_time = np.where(won, now, win_time)
+
+        totals["rounds"]    += cabinets
+        totals["dispenses"] += int(won.sum())
+        totals["lockouts"]  += cabinets - int(won.sum())
+        totals["locked"]    += float(locked.sum())
+        totals["playing"]   += float(playing.sum())
+        totals["windows"]   += np.bincount(index, minlength=len(lengths))
+        totals["wins"]      += np.bincount(index[won], minlength=len(lengths))
+
+    totals["seconds"] = float(now.sum())
+    # Players that walked up while the cabinet was busy or locked
+    totals["turned"]  = (totals["locked"] + totals["playing"]) / mean_gap
+
+    return totals
+
+# End def
+
+
+# ------------------------------------------------------------------------
+# Main script
+# ------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Candy game difficulty simulator")
+    parser.add_argument("--rounds", type=int, default=10000000)
+    parser.add_argument("--cabinets", type=int, default=CABINETS,
+                        help="cabinets simulated side by side")
+    parser.add_argument("--recall", type=float, default=0.95,
+                        help="chance the player gets each step right")
+    parser.add_argument("--arrivals", type=float, default=6.0,
+                        help="players walking up per hour")
+    parser.add_argument("--replay", type=float, default=0.5,
+                        help="chance a winner plays again")
+    parser.add_argument("--replay-delay", type=float, default=20.0,
+                        help="mean seconds before a winner plays again")
+    parser.add_argument("--press-time", type=float, default=0.5,
+                        help="seconds per button press")
+    parser.add_argument("--inventory", type=int, default=200,
+                        help="candies in a full cabinet")
+    parser.add_argument("--seed", type=int, default=301)
+    args = parser.parse_args()
+
+    start  = time.perf_counter()
+    totals = simulate(args.rounds, args.cabinets, args.recall, args.arrivals,
+                      args.replay, args.replay_delay, args.press_time, args.seed)
+    elapsed = time.perf_counter() - start
+
+    hours    = totals["seconds"] / 3600.0
+    per_hour = totals["dispenses"] / hours
+
+    print("{0} rounds in {1:.2f} s ({2:.1f} M rounds/s), {3:.0f} cabinet days".format(
+          totals["rounds"], elapsed, totals["rounds"] / elapsed / 1e6, hours / 24))
+    print("")
+    print("{0:<8} {1:>7} {2:>10} {3:>10} {4:>9}".format(
+          "window", "length", "rounds", "share", "win rate"))
+    for i, length in enumerate(difficulty.PATTERN_LENGTHS):
+        if i < len(difficulty.LEVELS):
+            name = "LVL{0}".format(difficulty.LEVELS[i])
+        else:
+            name = "idle"
+        rounds = totals["windows"][i]
+        print("{0:<8} {1:>7} {2:>10} {3:>9.1f}% {4:>8.1f}%".format(
+              name, length, rounds, 100.0 * rounds / totals["rounds"],
+              100.0 * totals["wins"][i] / max(1, rounds)))
+    print("")
+    print("dispenses per hour:   {0:.2f}".format(per_hour))
+    print("win rate:             {0:.1f}%".format(
+          100.0 * totals["dispenses"] / totals["rounds"]))
+    print("lockouts per hour:    {0:.2f}".format(totals["lockouts"] / hours))
+    print("lockout fraction:     {0:.1f}% of the time".format(
+          100.0 * totals["locked"] / totals["seconds"]))
+    print("players turned away:  {0:.1f}%".format(
+          100.0 * totals["turned"] / (totals["turned"] + totals["rounds"])))
+    print("candy per day:        {0:.1f}".format(per_hour * 24))
+    if per_hour > 0:
+        print("{0} candies last:    {1:.1f} days".format(
+              args.inventory, args.inventory / per_hour / 24))
+
@@ -0,0 +1,300 @@
+"""
+--------------------------------------------------------------------------
+GPIO Registers
+--------------------------------------------------------------------------
+License:
+Copyright 2021 <Jessica Kies>
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors
+may be used to endorse or promote products derived from this software without
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+GPIO Registers
+    Overview: Direct access to the AM335x GPIO bank registers through
+    /dev/mem. A read of a bank's DATAIN register samples all 32 of its pins
+    at once, and a store to SETDATAOUT or CLEARDATAOUT changes any of its
+    outputs at once, where the sysfs interface takes one file read or write
+    per pin.
+
+    A pin gpioNN is bit NN % 32 of bank NN // 32. The candy game's buttons
+    (gpio46, 44, 47, 64) are on banks 1 and 2, so all four are read with
+    two register reads. Its LEDs (gpio59, 58, 57, 60) are all on bank 1,
+    so they are all set with one store.
+
+    The pins still have to be exported and set up (direction, pin mux)
+    through sysfs / Adafruit_BBIO first; only the reads and writes go
+    straight to the registers. The registers can be mapped from a regular
+    file instead of /dev/mem (with bank bases that are 4 KiB apart) to try
+    the code without a board.
+
+    Running this file directly compares the scan rate of the buttons and
+    the update rate of the LEDs through sysfs and through the registers. It
+    uses regular files unless --board is given (which needs root):
+        python3 gpio_mmap.py [--scans N] [--board]
+
+--------------------------------------------------------------------------
+"""
+import argparse
+import mmap
+import os
+import time
+
+
+# ------------------------------------------------------------------------
+# Global Constants
+# ------------------------------------------------------------------------
+DEV_MEM                      = "/dev/mem"
+
+BANK_BASES                   = [0x44E07000, 0x4804C000, 0x481AC000, 0x481AE000]
+BANK_SIZE                    = 0x1000
+
+# Register offsets within a bank
+GPIO_OE                      = 0x134
+GPIO_DATAIN                  = 0x138
+GPIO_DATAOUT                 = 0x13C
+GPIO_CLEARDATAOUT            = 0x190
+GPIO_SETDATAOUT              = 0x194
+
+
+# ------------------------------------------------------------------------
+# Registers
+# ------------------------------------------------------------------------
+
+class GPIORegisters(object):
+    """The GPIO banks, mapped into memory the first time they are used."""
+
+    def __init__(self, path=DEV_MEM, bases=BANK_BASES):
+        """Open path (/dev/mem, or a regular file standing in for it).
+
+        :param bases: offset of each bank in path
+
+        Will throw an OSError if path cannot be opened (/dev/mem needs root).
+        """
+        flags = os.O_RDWR
+        if hasattr(os, "O_SYNC"):
+            flags |= os.O_SYNC                   # uncached, for device memory
+
+        self.fd    = os.open(path, flags)
+        self.bases = bases
+        self.maps  = {}
+        self.words = {}
+        self.plans = {}
+
+    # End def
+
+    def bank(self, number):
+        """Return the registers of bank number as 32 bit words."""
+        words = self.words.get(number)
+        if words is None:
+            memory = mmap.mmap(self.fd, BANK_SIZE, mmap.MAP_SHARED,
+                               mmap.PROT_READ | mmap.PROT_WRITE, offset=self.bases[number])
+            # Indexing a memoryview of "I" is a single 32 bit load or store,
+            # which is what the registers need
+            words = memoryview(memory).cast("I")
+            self.maps[number]  = memory
+            self.words[number] = words
+        return words
+
+    # End def
+
+    def read(self, bank, register):
+        """Return the value of register (a byte offset) of bank."""
+        return self.bank(bank)[register >> 2]
+
+    def write(self, bank, register, value):
+        """Store value in register (a byte offset) of bank."""
+        self.bank(bank)[register >> 2] = value
+
+    def input(self, gpio):
+        """Return the level (0 or 1) of gpio."""
+        return (self.bank(gpio >> 5)[GPIO_DATAIN >> 2] >> (gpio & 31)) & 1
+
+    # End def
+
+    def output(self, gpio, value):
+        """Drive gpio high (value true) or low."""
+        register = GPIO_SETDATAOUT if value else GPIO_CLEARDATAOUT
+        self.bank(gpio >> 5)[register >> 2] = 1 << (gpio & 31)
+
+    # End def
+
+    def _plan(self, gpios):
+        """Return [(bank words, [(index in gpios, bit)])] for a list of gpios."""
+        key  = tuple(gpios)
+        plan = self.plans.get(key)
+        if plan is None:
+            banks = {}
+            for index, gpio in enumerate(gpios):
+                banks.setdefault(gpio >> 5, []).append((index, gpio & 31))
+            plan = [(self.bank(bank), bits) for bank, bits in sorted(banks.items())]
+            self.plans[key] = plan
+        return plan
+
+    # End def
+
+    def input_many(self, gpios):
+        """Return the levels of a list of gpios, reading DATAIN once per bank."""
+        levels = [0] * len(gpios)
+        for words, bits in self._plan(gpios):
+            datain = words[GPIO_DATAIN >> 2]
+            for index, bit in bits:
+                levels[index] = (datain >> bit) & 1
+        return levels
+
+    # End def
+
+    def output_many(self, gpios, values):
+        """Drive a list of gpios, with one store to SETDATAOUT and one to
+        CLEARDATAOUT per bank (only the ones needed)."""
+        for words, bits in self._plan(gpios):
+            set_mask   = 0
+            clear_mask = 0
+            for index, bit in bits:
+                if values[index]:
+                    set_mask   |= 1 << bit
+                else:
+                    clear_mask |= 1 << bit
+            if set_mask:
+                words[GPIO_SETDATAOUT >> 2] = set_mask
+            if clear_mask:
+                words[GPIO_CLEARDATAOUT >> 2] = clear_mask
+
+    # End def
+
+    def close(self):
+        """Unmap the banks and close the file."""
+        self.plans.clear()
+        for words in self.words.values():
+            words.release()
+        for memory in self.maps.values():
+            memory.close()
+        self.words.clear()
+        self.maps.clear()
+        os.close(self.fd)
+
+    # End def
+
+# End class
+
+
+# ------------------------------------------------------------------------
+# Benchmark
+# ------------------------------------------------------------------------
+
+def make_fake_registers(path, banks=len(BANK_BASES)):
+    """Make a regular file standing in for /dev/mem. Returns the bank bases
+    to use with it."""
+    with open(path, "wb") as registers:
+        registers.truncate(banks * BANK_SIZE)
+    return [bank * BANK_SIZE for bank in range(banks)]
+
+# End def
+
+
+def make_fake_sysfs(root, gpios):
+    """Make gpioNN/value files under root. Returns root."""
+    for gpio in gpios:
+        directory = os.path.join(root, "gpio{0}".format(gpio))
+        os.makedirs(directory)
+        with open(os.path.join(directory, "value"), "w") as value:
+            value.write("1\n")
+    return root
+
+# End def
+
+
+def rate(count, func):
+    """Return how many times a second func runs."""
+    start = time.perf_counter()
+    for i in range(count):
+        func()
+    return count / (time.perf_counter() - start)
+
+# End def
+
+
+# ------------------------------------------------------------------------
+# Main script
+# ------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="GPIO scan rate: sysfs or registers")
+    parser.add_argument("--scans", type=int, default=100000)
+    parser.add_argument("--board", action="store_true",
+                        help="use /dev/mem and /sys/class/gpio (needs root)")
+    args = parser.parse_args()
+
+    import shutil
+    import tempfile
+
+    buttons = [46, 44, 47, 64]
+    leds    = [59, 58, 57, 60]
+
+    root = None
+    if args.board:
+        registers = GPIORegisters()
+        sysfs     = "/sys/class/gpio"
+    else:
+        root      = tempfile.mkdtemp()
+        bases     = make_fake_registers(os.path.join(root, "mem"))
+        registers = GPIORegisters(os.path.join(root, "mem"), bases)
+        sysfs     = make_fake_sysfs(os.path.join(root, "gpio"), buttons + leds)
+
+    try:
+        inputs  = [os.open(os.path.join(sysfs, "gpio{0}".format(gpio), "value"), os.O_RDONLY)
+                   for gpio in buttons]
+        outputs = [os.open(os.path.join(sysfs, "gpio{0}".format(gpio), "value"), os.O_WRONLY)
+                   for gpio in leds]
+
+        def sysfs_scan():
+            return [int(os.pread(fd, 2, 0)[:1]) for fd in inputs]
+
+        def sysfs_leds_off():
+            for fd in outputs:
+                os.pwrite(fd, b"0", 0)
+
+        def register_scan():
+            return registers.input_many(buttons)
+
+        def register_leds_off():
+            registers.output_many(leds, [0, 0, 0, 0])
+
+        print("{0:<28} {1:>14} {2:>14}".format("", "sysfs", "registers"))
+        sysfs_rate    = rate(args.scans, sysfs_scan)
+        register_rate = rate(args.scans, register_scan)
+        print("{0:<28} {1:>12.0f}/s {2:>12.0f}/s  ({3:.0f}x)".format(
+              "scan 4 buttons", sysfs_rate, register_rate, register_rate / sysfs_rate))
+        sysfs_rate    = rate(args.scans, sysfs_leds_off)
+        register_rate = rate(args.scans, register_leds_off)
+        print("{0:<28} {1:>12.0f}/s {2:>12.0f}/s  ({3:.0f}x)".format(
+              "set 4 LEDs", sysfs_rate, register_rate, register_rate / sysfs_rate))
+
+        for fd in inputs + outputs:
+            os.close(fd)
+    finally:
+        registers.close()
+        if root is not None:
+            shutil.rmtree(root)
+
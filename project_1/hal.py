@@ -0,0 +1,455 @@
+"""
+--------------------------------------------------------------------------
+Hardware Abstraction Layer
+--------------------------------------------------------------------------
+License:
+Copyright 2021 <Jessica Kies>
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors
+may be used to endorse or promote products derived from this software without
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+Hardware Abstraction Layer
+    Overview: Everything the candy game does to the hardware goes through
+    a backend object: GPIO in/out, PWM start/stop/duty, I2C writes, button
+    events and the clock.
+
+    Backends:
+      - BBIOBackend : the PocketBeagle, using Adafruit_BBIO
+      - MmapBackend : the PocketBeagle, with GPIO reads and writes made
+                      straight on the GPIO registers (gpio_mmap.py)
+      - SimBackend  : simulated pins, buttons and a virtual clock, so the
+                      game can be run, profiled and load tested on any
+                      Linux box
+
+    The simulated backend counts every hardware call it receives. On the
+    board each of those calls is at least one system call.
+
+--------------------------------------------------------------------------
+"""
+import collections
+import time
+
+import button_input
+import gpio_mmap
+import ht16k33
+import pwm_channels
+
+
+# ------------------------------------------------------------------------
+# Global Constants
+# ------------------------------------------------------------------------
+IN                           = "in"
+OUT                          = "out"
+
+LOW                          = 0
+HIGH                         = 1
+
+PWM_FREQUENCY                = 2000              # Adafruit_BBIO default
+
+# GPIO access for make_backend()
+SYSFS                        = "sysfs"
+MMAP                         = "mmap"
+
+
+# ------------------------------------------------------------------------
+# Backend interface
+# ------------------------------------------------------------------------
+
+class Backend(object):
+    """Interface every backend provides."""
+
+    def gpio_setup(self, pin, direction, initial=LOW):
+        """Set pin to be an input (IN) or output (OUT)."""
+        raise NotImplementedError
+
+    def gpio_setup_many(self, pins, direction, initial=LOW):
+        """Set up a list of pins the same way."""
+        for pin in pins:
+            self.gpio_setup(pin, direction, initial)
+
+    def gpio_input(self, pin):
+        """Return the level of pin (LOW or HIGH)."""
+        raise NotImplementedError
+
+    def gpio_output(self, pin, value):
+        """Drive pin LOW or HIGH."""
+        raise NotImplementedError
+
+    def gpio_input_many(self, pins):
+        """Return the levels of a list of pins."""
+        return [self.gpio_input(pin) for pin in pins]
+
+    def gpio_output_many(self, pins, values):
+        """Drive a list of pins to a list of values."""
+        for pin, value in zip(pins, values):
+            self.gpio_output(pin, value)
+
+    def pwm_start(self, pin, duty, frequency=PWM_FREQUENCY):
+        """Start PWM on pin with duty cycle duty (0 - 100)."""
+        raise NotImplementedError
+
+    def pwm_set_duty(self, pin, duty):
+        """Change the duty cycle of a running PWM."""
+        raise NotImplementedError
+
+    def pwm_stop(self, pin):
+        """Stop PWM on pin."""
+        raise NotImplementedError
+
+    def pwm_channel(self, pin):
+        """Return a PWM channel for pin (start/set_duty/stop/close) that
+        stays claimed until it is closed. The default one drives
+        pwm_start/pwm_set_duty/pwm_stop."""
+        return pwm_channels.BackendPWMChannel(self, pin)
+
+    def i2c_open(self, bus, address):
+        """Return a transport (write_byte/write_block/close) for a device."""
+        raise NotImplementedError
+
+    def button_input(self, gpios):
+        """Return a button_input.ButtonInput style object for the gpios."""
+        raise NotImplementedError
+
+    def now(self):
+        """Return the monotonic time in seconds."""
+        raise NotImplementedError
+
+    def sleep(self, duration):
+        """Sleep for duration seconds."""
+        raise NotImplementedError
+
+    def close(self):
+        """Release what the backend holds (nothing by default)."""
+        pass
+
+# End class
+
+
+# ------------------------------------------------------------------------
+# PocketBeagle backend
+# ------------------------------------------------------------------------
+
+class BBIOBackend(Backend):
+    """Backend for the PocketBeagle using Adafruit_BBIO."""
+
+    def __init__(self, pwm_base=pwm_channels.SYSFS_PWM):
+        """Import Adafruit_BBIO.GPIO (only available on the board).
+
+        Adafruit_BBIO.PWM is only imported the first time PWM is used, since
+        it is not needed to start the game.
+
+        :param pwm_base: sysfs directory of the PWM chips for pwm_channel()
+        """
+        import Adafruit_BBIO.GPIO as GPIO
+
+        self.GPIO         = GPIO
+        self._pwm         = None
+        self.pwm_base     = pwm_base
+        self.pwm_channels = {}
+
+    # End def
+
+    @property
+    def PWM(self):
+        """Adafruit_BBIO.PWM, imported on first use."""
+        if self._pwm is None:
+            import Adafruit_BBIO.PWM as PWM
+            self._pwm = PWM
+        return self._pwm
+
+    def gpio_setup(self, pin, direction, initial=LOW):
+        if direction == IN:
+            self.GPIO.setup(pin, self.GPIO.IN)
+        else:
+            self.GPIO.setup(pin, self.GPIO.OUT, initial=initial)
+
+    def gpio_input(self, pin):
+        return self.GPIO.input(pin)
+
+    def gpio_output(self, pin, value):
+        self.GPIO.output(pin, value)
+
+    def pwm_start(self, pin, duty, frequency=PWM_FREQUENCY):
+        self.PWM.start(pin, duty, frequency)
+
+    def pwm_set_duty(self, pin, duty):
+        self.PWM.set_duty_cycle(pin, duty)
+
+    def pwm_stop(self, pin):
+        self.PWM.stop(pin)
+
+    def pwm_channel(self, pin):
+        """Claim the sysfs PWM channel of pin once. Falls back to
+        Adafruit_BBIO.PWM when the channel cannot be found."""
+        channel = self.pwm_channels.get(pin)
+        if channel is None:
+            try:
+                channel = pwm_channels.SysfsPWMChannel(pin, self.pwm_base)
+            except (IOError, OSError, ValueError):
+                channel = pwm_channels.BackendPWMChannel(self, pin)
+            self.pwm_channels[pin] = channel
+        return channel
+
+    def i2c_open(self, bus, address):
+        return ht16k33.I2CDevTransport(bus, address)
+
+    def button_input(self, gpios):
+        return button_input.ButtonInput(gpios)
+
+    def now(self):
+        return time.monotonic()
+
+    def sleep(self, duration):
+        time.sleep(duration)
+
+# End class
+
+
+class MmapBackend(BBIOBackend):
+    """PocketBeagle backend that reads and writes GPIO pins through the
+    GPIO registers. Pins are still set up through Adafruit_BBIO, and pins
+    not in gpios go through it too."""
+
+    def __init__(self, gpios, path=gpio_mmap.DEV_MEM, bases=gpio_mmap.BANK_BASES,
+                 pwm_base=pwm_channels.SYSFS_PWM):
+        """Map the GPIO registers.
+
+        :param gpios: {pin: gpio number}, e.g. {"P2_2": 59}
+
+        Will throw an OSError if the registers cannot be mapped.
+        """
+        BBIOBackend.__init__(self, pwm_base)
+        self.gpios     = dict(gpios)
+        self.registers = gpio_mmap.GPIORegisters(path, bases)
+
+    # End def
+
+    def gpio_input(self, pin):
+        gpio = self.gpios.get(pin)
+        if gpio is None:
+            return BBIOBackend.gpio_input(self, pin)
+        return self.registers.input(gpio)
+
+    def gpio_output(self, pin, value):
+        gpio = self.gpios.get(pin)
+        if gpio is None:
+            BBIOBackend.gpio_output(self, pin, value)
+        else:
+            self.registers.output(gpio, value)
+
+    def gpio_input_many(self, pins):
+        if all(pin in self.gpios for pin in pins):
+            return self.registers.input_many([self.gpios[pin] for pin in pins])
+        return Backend.gpio_input_many(self, pins)
+
+    def gpio_output_many(self, pins, values):
+        if all(pin in self.gpios for pin in pins):
+            self.registers.output_many([self.gpios[pin] for pin in pins], values)
+        else:
+            Backend.gpio_output_many(self, pins, values)
+
+    def close(self):
+        """Unmap the GPIO registers. Pins in gpios cannot be used after this."""
+        if self.registers is not None:
+            self.registers.close()
+            self.registers = None
+
+# End class
+
+
+def make_backend(access=SYSFS, gpios=None):
+    """Return the PocketBeagle backend for access (SYSFS or MMAP).
+
+    MMAP falls back to SYSFS when the registers cannot be mapped (e.g. the
+    game is not run as root).
+    """
+    if access == MMAP:
+        try:
+            return MmapBackend(gpios or {})
+        except (IOError, OSError):
+            pass
+    return BBIOBackend()
+
+# End def
+
+
+# ------------------------------------------------------------------------
+# Simulated backend
+# ------------------------------------------------------------------------
+
+class SimButtons(object):
+    """Simulated button_input.ButtonInput running on the virtual clock.
+
+    Presses come from a script: a function called with this object
+    whenever the game waits for an event and none are queued. The script
+    queues the presses it wants with press(). Waiting with nothing queued
+    moves the virtual clock forward by the timeout.
+    """
+
+    def __init__(self, backend, count, script=None):
+        """Create count buttons driven by script(buttons)."""
+        self.backend = backend
+        self.script  = script
+        self.events  = collections.deque()
+        self.state   = [False] * count
+
+    # End def
+
+    def get(self, timeout=None):
+        """Return the next ButtonEvent, or None if timeout seconds pass first."""
+        backend = self.backend
+        backend.calls["button_wait"] += 1
+
+        if (not self.events) and (self.script is not None):
+            self.script(self)
+
+        if self.events:
+            event = self.events[0]
+            if (timeout is None) or (event.timestamp <= backend.time + timeout):
+                self.events.popleft()
+                backend.time = max(backend.time, event.timestamp)
+                self.state[event.button] = event.pressed
+                return event
+
+        if timeout is None:
+            raise RuntimeError("Waiting forever for a button with no presses scripted.")
+
+        backend.time += timeout
+        return None
+
+    # End def
+
+    def wait_for_press(self, button, timeout=None):
+        """Wait for button to be pressed, ignoring every other event."""
+        end = None if timeout is None else self.backend.time + timeout
+
+        while True:
+            if end is None:
+                event = self.get()
+            else:
+                event = self.get(max(0.0, end - self.backend.time))
+
+            if (event is None) or (event.pressed and event.button == button):
+                return event
+
+    # End def
+
+    def press(self, button, delay, hold=0.1):
+        """Queue a press of button delay seconds after the last queued event
+        (or after now), held down for hold seconds."""
+        start = self.backend.time
+        if self.events:
+            start = max(start, self.events[-1].timestamp)
+
+        self.events.append(button_input.ButtonEvent(button, True, start + delay))
+        self.events.append(button_input.ButtonEvent(button, False, start + delay + hold))
+
+    # End def
+
+    def is_pressed(self, button):
+        return self.state[button]
+
+    def clear(self):
+        self.events.clear()
+
+    def close(self):
+        pass
+
+# End class
+
+
+class SimBackend(Backend):
+    """Simulated hardware with a virtual clock.
+
+    Time only moves when the game sleeps or waits for a button, so a game
+    that takes minutes on the cabinet runs in microseconds.
+    """
+
+    def __init__(self, script=None, start_time=0.0):
+        """Create the backend.
+
+        :param script: function queueing button presses, see SimButtons
+        """
+        self.script       = script
+        self.time         = start_time
+        self.pins         = {}
+        self.pwm          = {}
+        self.calls        = collections.Counter()
+        self.buses        = []
+        self.pwm_channels = {}
+
+    # End def
+
+    def gpio_setup(self, pin, direction, initial=LOW):
+        self.calls["gpio_setup"] += 1
+        self.pins[pin] = HIGH if direction == IN else initial
+
+    def gpio_input(self, pin):
+        self.calls["gpio_input"] += 1
+        return self.pins.get(pin, HIGH)
+
+    def gpio_output(self, pin, value):
+        self.calls["gpio_output"] += 1
+        self.pins[pin] = value
+
+    def pwm_start(self, pin, duty, frequency=PWM_FREQUENCY):
+        self.calls["pwm_start"] += 1
+        self.pwm[pin] = (duty, frequency)
+
+    def pwm_set_duty(self, pin, duty):
+        self.calls["pwm_set_duty"] += 1
+        self.pwm[pin] = (duty, self.pwm[pin][1])
+
+    def pwm_stop(self, pin):
+        self.calls["pwm_stop"] += 1
+        self.pwm.pop(pin, None)
+
+    def pwm_channel(self, pin):
+        if pin not in self.pwm_channels:
+            self.pwm_channels[pin] = Backend.pwm_channel(self, pin)
+        return self.pwm_channels[pin]
+
+    def i2c_open(self, bus, address):
+        self.calls["i2c_open"] += 1
+        transport = ht16k33.FakeBus()
+        self.buses.append(transport)
+        return transport
+
+    def button_input(self, gpios):
+        return SimButtons(self, len(gpios), self.script)
+
+    def now(self):
+        return self.time
+
+    def sleep(self, duration):
+        self.calls["sleep"] += 1
+        self.time += duration
+
+    def i2c_transfers(self):
+        """Return the number of I2C transfers made on all buses."""
+        return sum(bus.transfers for bus in self.buses)
+
+# End class
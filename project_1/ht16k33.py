@@ -0,0 +1,437 @@
+"""
+--------------------------------------------------------------------------
+HT16K33 Display Driver
+--------------------------------------------------------------------------
+License:
+Copyright 2021 <Jessica Kies>
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors
+may be used to endorse or promote products derived from this software without
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+HT16K33 Display Driver
+    Overview: Driver for the Adafruit 0.56" 4 digit 7-segment backpack used
+    by the candy game. The I2C bus is opened once and kept open. The display
+    RAM is mirrored in a 16 byte framebuffer, and flush() only sends the
+    bytes that changed since the last flush as a single block write.
+
+    Transports:
+      - I2CDevTransport : /dev/i2c-N opened once (no extra libraries)
+      - I2CSetTransport : the old "i2cset" command per byte (for comparison)
+      - FakeBus         : in-memory bus for running off the PocketBeagle
+
+    Running this file directly benchmarks the transports against each other:
+        python3 ht16k33.py [--count N] [--i2cset-cmd CMD]
+
+--------------------------------------------------------------------------
+"""
+import argparse
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+# ------------------------------------------------------------------------
+# Global Constants
+# ------------------------------------------------------------------------
+HEX_DIGITS                  = [0x3f, 0x06, 0x5b, 0x4f,    # 0, 1, 2, 3
+                               0x66, 0x6d, 0x7d, 0x07,    # 4, 5, 6, 7
+                               0x7f, 0x6f, 0x77, 0x7c,    # 8, 9, A, b
+                               0x39, 0x5e, 0x79, 0x71]    # C, d, E, F
+
+CLEAR_DIGIT                 = 0x7F
+POINT_VALUE                 = 0x80
+
+DIGIT_ADDR                  = [0x00, 0x02, 0x06, 0x08]
+COLON_ADDR                  = 0x04
+COLON_VALUE                 = 0x02
+
+HT16K33_BLINK_CMD           = 0x80
+HT16K33_BLINK_DISPLAYON     = 0x01
+HT16K33_BLINK_OFF           = 0x00
+HT16K33_BLINK_2HZ           = 0x02
+HT16K33_BLINK_1HZ           = 0x04
+HT16K33_BLINK_HALFHZ        = 0x06
+
+HT16K33_SYSTEM_SETUP        = 0x20
+HT16K33_OSCILLATOR          = 0x01
+
+HT16K33_BRIGHTNESS_CMD      = 0xE0
+HT16K33_BRIGHTNESS_HIGHEST  = 0x0F
+HT16K33_BRIGHTNESS_DARKEST  = 0x00
+
+# Size of the HT16K33 display RAM
+FRAMEBUFFER_SIZE            = 16
+
+# ioctl request to set the slave address (from linux/i2c-dev.h)
+I2C_SLAVE                   = 0x0703
+
+I2CSET_CMD                  = "/usr/sbin/i2cset -y"
+
+
+# ------------------------------------------------------------------------
+# Transports
+# ------------------------------------------------------------------------
+
+class I2CDevTransport(object):
+    """I2C transport on top of the Linux /dev/i2c-N character device.
+
+    The device file is opened once and the slave address is set once, so a
+    write is a single write() system call with no fork or exec.
+    """
+    fd = None
+
+    def __init__(self, bus, address):
+        """Open /dev/i2c-<bus> and select the device at <address>."""
+        self.bus     = bus
+        self.address = address
+        self.fd      = os.open("/dev/i2c-{0}".format(bus), os.O_RDWR)
+
+        try:
+            fcntl.ioctl(self.fd, I2C_SLAVE, address)
+        except:
+            self.close()
+            raise
+
+    # End def
+
+    def write_byte(self, value):
+        """Send a single command byte."""
+        os.write(self.fd, bytes(bytearray([value])))
+
+    # End def
+
+    def write_block(self, register, data):
+        """Write data starting at register (the HT16K33 auto-increments)."""
+        os.write(self.fd, bytes(bytearray([register])) + bytes(data))
+
+    # End def
+
+    def close(self):
+        """Close the device file."""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    # End def
+
+# End class
+
+
+class I2CSetTransport(object):
+    """I2C transport that runs the i2cset command for every byte.
+
+    This is how the candy game used to talk to the display. It is kept so
+    the benchmark can compare against it.
+    """
+
+    def __init__(self, bus, address, command=I2CSET_CMD):
+        """Build the i2cset command prefix for <bus> and <address>."""
+        self.prefix = "{0} {1} {2}".format(command, bus, address)
+
+    # End def
+
+    def write_byte(self, value):
+        """Send a single command byte."""
+        os.system("{0} {1}".format(self.prefix, value))
+
+    # End def
+
+    def write_block(self, register, data):
+        """Write data starting at register, one i2cset per byte."""
+        for offset, value in enumerate(data):
+            os.system("{0} {1} {2}".format(self.prefix, register + offset, value))
+
+    # End def
+
+    def close(self):
+        """Nothing to close."""
+        pass
+
+    # End def
+
+# End class
+
+
+class FakeBus(object):
+    """In-memory stand in for an HT16K33 on an I2C bus.
+
+    Keeps a copy of the display RAM and a log of every transfer so the
+    driver can be run and checked without hardware.
+    """
+
+    def __init__(self):
+        """Start with blank display RAM and an empty transfer log."""
+        self.ram       = bytearray(FRAMEBUFFER_SIZE)
+        self.commands  = []
+        self.transfers = 0
+        self.bytes     = 0
+
+    # End def
+
+    def write_byte(self, value):
+        """Record a command byte."""
+        self.commands.append(value)
+        self.transfers += 1
+        self.bytes     += 1
+
+    # End def
+
+    def write_block(self, register, data):
+        """Copy data into the display RAM starting at register."""
+        self.ram[register:register + len(data)] = data
+        self.transfers += 1
+        self.bytes     += len(data) + 1
+
+    # End def
+
+    def close(self):
+        """Nothing to close."""
+        pass
+
+    # End def
+
+# End class
+
+
+# ------------------------------------------------------------------------
+# Display
+# ------------------------------------------------------------------------
+
+class HT16K33(object):
+    """4 digit 7-segment display with a write-back framebuffer.
+
+    set_digit(), set_colon() and update() only change the framebuffer.
+    flush() sends the changed bytes to the device.
+    """
+
+    def __init__(self, bus=1, address=0x70, transport=None):
+        """Open the display.
+
+        :param transport: object with write_byte/write_block/close. When
+                          None, /dev/i2c-<bus> is opened.
+        """
+        if transport is None:
+            transport = I2CDevTransport(bus, address)
+
+        self.transport   = transport
+        self.framebuffer = bytearray(FRAMEBUFFER_SIZE)
+        self.device      = bytearray(FRAMEBUFFER_SIZE)
+        self.dirty       = True
+
+    # End def
+
+    def setup(self, blink=HT16K33_BLINK_OFF, brightness=HT16K33_BRIGHTNESS_HIGHEST):
+        """Turn on the oscillator, set blink rate and brightness."""
+        self.transport.write_byte(HT16K33_SYSTEM_SETUP | HT16K33_OSCILLATOR)
+        self.transport.write_byte(HT16K33_BLINK_CMD | blink | HT16K33_BLINK_DISPLAYON)
+        self.transport.write_byte(HT16K33_BRIGHTNESS_CMD | brightness)
+
+        # Force the whole framebuffer out on the next flush
+        self.device[:] = bytearray([0xFF]) * FRAMEBUFFER_SIZE
+        self.dirty     = True
+
+    # End def
+
+    def encode(self, data, double_point=False):
+        """Encode a value between 0 and 15 (or CLEAR_DIGIT) as segments.
+
+        Will throw a ValueError if data is not between 0 and 15.
+        """
+        if (data == CLEAR_DIGIT):
+            return 0
+
+        try:
+            ret_val = HEX_DIGITS[data]
+        except (IndexError, TypeError):
+            raise ValueError("Digit value must be between 0 and 15.")
+
+        if double_point:
+            ret_val |= POINT_VALUE
+
+        return ret_val
+
+    # End def
+
+    def set_raw(self, digit_number, segments):
+        """Set the raw segment byte of a digit."""
+        self.framebuffer[DIGIT_ADDR[digit_number]] = segments
+        self.dirty = True
+
+    # End def
+
+    def set_digit(self, digit_number, data, double_point=False):
+        """Set one digit of the framebuffer."""
+        self.set_raw(digit_number, self.encode(data, double_point))
+
+    # End def
+
+    def set_colon(self, enable):
+        """Turn the colon on or off."""
+        self.framebuffer[COLON_ADDR] = COLON_VALUE if enable else 0x00
+        self.dirty = True
+
+    # End def
+
+    def clear(self):
+        """Set the framebuffer to read '0000' with the colon off."""
+        for i in range(4):
+            self.set_digit(i, 0)
+        self.set_colon(False)
+
+    # End def
+
+    def update(self, value):
+        """Set the framebuffer to show value.
+
+        Will throw a ValueError if number is not between 0 and 9999.
+        """
+        if (value < 0) or (value > 9999):
+            raise ValueError("Value is not within 0 and 9999.")
+
+        for i in range(4):
+            self.set_digit((3 - i), (value % 10))
+            value = value // 10
+
+    # End def
+
+    def flush(self):
+        """Send the changed part of the framebuffer to the display.
+
+        The bytes from the first to the last changed address are sent as one
+        block write. Returns the number of bytes sent.
+        """
+        if not self.dirty:
+            return 0
+
+        framebuffer = self.framebuffer
+        device      = self.device
+        first       = None
+        last        = None
+
+        for i in range(FRAMEBUFFER_SIZE):
+            if framebuffer[i] != device[i]:
+                if first is None:
+                    first = i
+                last = i
+
+        self.dirty = False
+
+        if first is None:
+            return 0
+
+        data = framebuffer[first:last + 1]
+        self.transport.write_block(first, data)
+        device[first:last + 1] = data
+
+        return len(data)
+
+    # End def
+
+    def close(self):
+        """Release the transport."""
+        self.transport.close()
+
+    # End def
+
+# End class
+
+
+# ------------------------------------------------------------------------
+# Benchmark
+# ------------------------------------------------------------------------
+
+def legacy_update(transport, value):
+    """Old update path: one write per digit, whether it changed or not."""
+    for i in range(4):
+        transport.write_block(DIGIT_ADDR[3 - i], bytearray([HEX_DIGITS[value % 10]]))
+        value = value // 10
+
+# End def
+
+
+def benchmark(name, count, func):
+    """Time func(value) for count values and print the per-update cost."""
+    start = time.perf_counter()
+    for value in range(count):
+        func(value % 10000)
+    elapsed = time.perf_counter() - start
+
+    print("{0:<28} {1:>8} updates  {2:>10.1f} us/update".format(
+          name, count, (elapsed / count) * 1e6))
+
+# End def
+
+
+# ------------------------------------------------------------------------
+# Main script
+# ------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="HT16K33 transport benchmark")
+    parser.add_argument("--count", type=int, default=200,
+                        help="number of display updates per transport")
+    parser.add_argument("--bus", type=int, default=1)
+    parser.add_argument("--address", type=lambda x: int(x, 0), default=0x70)
+    parser.add_argument("--i2cset-cmd", default=I2CSET_CMD,
+                        help="command used for the i2cset path, e.g. 'true' "
+                             "to measure only fork/exec cost off the board")
+    args = parser.parse_args()
+
+    # Old path: one i2cset fork per digit
+    legacy = I2CSetTransport(args.bus, args.address, args.i2cset_cmd)
+    benchmark("i2cset per digit", args.count,
+              lambda value: legacy_update(legacy, value))
+
+    # New path on the fake bus
+    fake    = FakeBus()
+    display = HT16K33(transport=fake)
+    display.setup()
+
+    def fake_update(value):
+        display.update(value)
+        display.flush()
+
+    benchmark("framebuffer (fake bus)", args.count * 100, fake_update)
+    print("    transfers: {0}  bytes: {1}".format(fake.transfers, fake.bytes))
+
+    # New path on the real bus, when there is one
+    if os.path.exists("/dev/i2c-{0}".format(args.bus)):
+        display = HT16K33(args.bus, args.address)
+        display.setup()
+
+        def dev_update(value):
+            display.update(value)
+            display.flush()
+
+        benchmark("framebuffer (/dev/i2c)", args.count, dev_update)
+        display.close()
+    else:
+        print("/dev/i2c-{0} not found, skipping hardware run".format(args.bus))
+
@@ -0,0 +1,234 @@
+"""
+--------------------------------------------------------------------------
+Metrics
+--------------------------------------------------------------------------
+License:
+Copyright 2021 <Jessica Kies>
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors
+may be used to endorse or promote products derived from this software without
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+Metrics
+    Overview: Counters and fixed bucket histograms for the candy game,
+    written to a Prometheus textfile (for node_exporter's textfile
+    collector) on a slow timer.
+
+    Recording is meant to stay on all the time, so it does as little as
+    possible: the buckets of a histogram are fixed when it is made, and an
+    observation is a bisect and three additions on lists and numbers that
+    already exist. Nothing is formatted or written until the export timer
+    runs.
+
+    Running this file directly times inc() and observe() and prints an
+    example of the textfile:
+        python3 metrics.py [--count N]
+
+--------------------------------------------------------------------------
+"""
+import argparse
+import bisect
+import os
+import time
+
+
+# ------------------------------------------------------------------------
+# Global Constants
+# ------------------------------------------------------------------------
+EXPORT_INTERVAL              = 60                # seconds between writes
+
+
+# ------------------------------------------------------------------------
+# Metrics
+# ------------------------------------------------------------------------
+
+class Counter(object):
+    """A count that only goes up."""
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name      = name
+        self.help_text = help_text
+        self.value     = 0
+
+    # End def
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def lines(self):
+        return ["{0} {1}".format(self.name, self.value)]
+
+# End class
+
+
+class Histogram(object):
+    """Counts of observations in fixed buckets, with their sum and count."""
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets):
+        """Create the histogram.
+
+        :param buckets: upper bounds of the buckets, in increasing order. A
+                        +Inf bucket is always added.
+        """
+        self.name      = name
+        self.help_text = help_text
+        self.bounds    = [float(bound) for bound in buckets]
+        self.counts    = [0] * (len(self.bounds) + 1)
+        self.sum       = 0.0
+        self.count     = 0
+
+    # End def
+
+    def observe(self, value):
+        """Record value. A value on a bound goes in that bucket."""
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum   += value
+        self.count += 1
+
+    # End def
+
+    def lines(self):
+        """Return the textfile lines (the buckets are cumulative)."""
+        lines = []
+        total = 0
+        for bound, count in zip(self.bounds, self.counts):
+            total += count
+            lines.append('{0}_bucket{{le="{1!r}"}} {2}'.format(self.name, bound, total))
+        lines.append('{0}_bucket{{le="+Inf"}} {1}'.format(self.name, self.count))
+        lines.append("{0}_sum {1!r}".format(self.name, self.sum))
+        lines.append("{0}_count {1}".format(self.name, self.count))
+        return lines
+
+    # End def
+
+# End class
+
+
+class Registry(object):
+    """The set of metrics written to one textfile."""
+
+    def __init__(self):
+        self.metrics = []
+
+    # End def
+
+    def counter(self, name, help_text):
+        """Make and register a Counter."""
+        metric = Counter(name, help_text)
+        self.metrics.append(metric)
+        return metric
+
+    # End def
+
+    def histogram(self, name, help_text, buckets):
+        """Make and register a Histogram."""
+        metric = Histogram(name, help_text, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    # End def
+
+    def render(self):
+        """Return the metrics in the Prometheus text format."""
+        lines = []
+        for metric in self.metrics:
+            lines.append("# HELP {0} {1}".format(metric.name, metric.help_text))
+            lines.append("# TYPE {0} {1}".format(metric.name, metric.kind))
+            lines.extend(metric.lines())
+        return "\n".join(lines) + "\n"
+
+    # End def
+
+# End class
+
+
+class TextfileExporter(object):
+    """Writes a registry to a textfile on a timer."""
+
+    def __init__(self, registry, path, scheduler=None, interval=EXPORT_INTERVAL):
+        """Create the exporter.
+
+        :param scheduler: scheduler.Scheduler for the timer (None: only
+                          write when asked)
+        """
+        self.registry = registry
+        self.path     = path
+        self.writes   = 0
+
+        if scheduler is not None:
+            scheduler.call_every(interval, self.write, name="metrics")
+
+    # End def
+
+    def write(self):
+        """Write the textfile. It is replaced in one step, so the collector
+        never reads half a file."""
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        with open(self.path + ".tmp", "w") as textfile:
+            textfile.write(self.registry.render())
+        os.replace(self.path + ".tmp", self.path)
+        self.writes += 1
+
+    # End def
+
+# End class
+
+
+# ------------------------------------------------------------------------
+# Main script
+# ------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Metrics recording cost")
+    parser.add_argument("--count", type=int, default=1000000)
+    args = parser.parse_args()
+
+    registry  = Registry()
+    counter   = registry.counter("example_total", "An example counter.")
+    histogram = registry.histogram("example_seconds", "An example histogram.",
+                                   [0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10])
+    values    = [(i % 97) / 10.0 for i in range(1000)]
+
+    start = time.perf_counter()
+    for i in range(args.count):
+        counter.inc()
+    inc_time = (time.perf_counter() - start) / args.count
+
+    start = time.perf_counter()
+    for i in range(args.count // 1000):
+        for value in values:
+            histogram.observe(value)
+    observe_time = (time.perf_counter() - start) / (args.count // 1000 * 1000)
+
+    print("Counter.inc()       {0:.3f} us".format(inc_time * 1e6))
+    print("Histogram.observe() {0:.3f} us".format(observe_time * 1e6))
+    print("")
+    print(registry.render())
+
@@ -0,0 +1,485 @@
+"""
+--------------------------------------------------------------------------
+PWM Channels
+--------------------------------------------------------------------------
+License:
+Copyright 2021 <Jessica Kies>
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors
+may be used to endorse or promote products derived from this software without
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+PWM Channels
+    Overview: Persistent PWM channels for the servo and the buzzer, and
+    named motion profiles played on them.
+
+    Adafruit_BBIO's PWM.start() / PWM.stop() export and unexport the
+    pwmchip channel in sysfs and set the pin mux every time, which takes
+    long enough (and varies enough) that the 90 ms servo pulse of a
+    dispense comes out a different length every time. A SysfsPWMChannel
+    claims its channel once, keeps the period, duty_cycle and enable files
+    open, and after that only writes the duty cycle and enable (and the
+    period when the frequency changes), skipping writes that would not
+    change anything.
+
+    A Profile is a list of (duty cycle, seconds) steps played on one pin
+    at one frequency, e.g. the quarter turn of a dispense or the error
+    buzz. PWMManager claims the channels of its profiles at start up and
+    plays a profile by name, measuring how long each one really took:
+    run() sleeps until the profile is done, play() runs its steps on
+    scheduler timers so a game loop keeps handling input meanwhile.
+
+    Running this file directly times the profiles on the real clock
+    against a fake sysfs tree (regular files), or on the board with
+    --board, where the old PWM.start()/PWM.stop() is timed too:
+        python3 pwm_channels.py [--runs N] [--board]
+
+--------------------------------------------------------------------------
+"""
+import argparse
+import collections
+import glob
+import os
+import time
+
+
+# ------------------------------------------------------------------------
+# Global Constants
+# ------------------------------------------------------------------------
+SYSFS_PWM                    = "/sys/class/pwm"
+EXPORT_TIMEOUT               = 1.0               # seconds for udev to set up a channel
+TIMING_SAMPLES               = 256
+
+# PocketBeagle PWM pins: (PWM device, channel)
+PWM_PINS = {
+    "P1_33" : ("48300200.pwm", 1),               # EHRPWM0B
+    "P1_36" : ("48300200.pwm", 0),               # EHRPWM0A
+    "P2_1"  : ("48302200.pwm", 0),               # EHRPWM1A
+}
+
+Profile = collections.namedtuple("Profile", ["pin", "frequency", "steps"])
+
+
+# ------------------------------------------------------------------------
+# Sysfs channel
+# ------------------------------------------------------------------------
+
+def find_chip(device, base=SYSFS_PWM):
+    """Return the pwmchip directory in base that belongs to device (e.g.
+    "48300200.pwm"), or None."""
+    for chip in sorted(glob.glob(os.path.join(base, "pwmchip*"))):
+        if device in os.path.realpath(chip).split(os.sep):
+            return chip
+    return None
+
+# End def
+
+
+class SysfsPWMChannel(object):
+    """A PWM channel claimed once and driven through open sysfs files."""
+
+    def __init__(self, pin, base=SYSFS_PWM, config_pin=True):
+        """Claim the channel of pin: set the pin mux (with config-pin),
+        export the channel and open its files.
+
+        Will throw a ValueError if pin has no PWM, or an IOError if the
+        channel cannot be found.
+        """
+        if pin not in PWM_PINS:
+            raise ValueError("Pin {0} has no PWM.".format(pin))
+        device, index = PWM_PINS[pin]
+
+        chip = find_chip(device, base)
+        if chip is None:
+            raise IOError("No pwmchip for {0} in {1}.".format(device, base))
+
+        if config_pin:
+            import subprocess
+
+            try:
+                subprocess.call(["config-pin", pin, "pwm"],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            except OSError:
+                pass                   # no config-pin: the pin mux is already set
+
+        self.pin  = pin
+        self.path = self._export(chip, index)
+
+        self.period_fd = os.open(os.path.join(self.path, "period"), os.O_WRONLY)
+        self.duty_fd   = os.open(os.path.join(self.path, "duty_cycle"), os.O_WRONLY)
+        self.enable_fd = os.open(os.path.join(self.path, "enable"), os.O_WRONLY)
+
+        self.period    = None          # ns, None until first written
+        self.duty_ns   = None
+        self.enabled   = None
+        self.writes    = 0
+
+        self.stop()
+
+    # End def
+
+    def _export(self, chip, index):
+        """Return the channel directory, exporting the channel if needed."""
+        number = chip.rsplit("pwmchip", 1)[1]
+        names  = [os.path.join(chip, "pwm{0}".format(index)),
+                  os.path.join(chip, "pwm-{0}:{1}".format(number, index))]
+
+        def exported():
+            for name in names:
+                if os.path.exists(os.path.join(name, "enable")):
+                    return name
+            return None
+
+        path = exported()
+        if path is None:
+            with open(os.path.join(chip, "export"), "w") as export:
+                export.write(str(index))
+            end = time.monotonic() + EXPORT_TIMEOUT
+            while path is None:
+                if time.monotonic() > end:
+                    raise IOError("PWM channel {0} of {1} did not appear.".format(index, chip))
+                time.sleep(0.01)
+                path = exported()
+
+        return path
+
+    # End def
+
+    def _write(self, fd, value):
+        os.pwrite(fd, str(value).encode("ascii"), 0)
+        self.writes += 1
+
+    def start(self, duty, frequency):
+        """Set the duty cycle (0 - 100) and frequency, then enable."""
+        period = int(round(1e9 / frequency))
+        if period != self.period:
+            # The duty cycle can never be longer than the period
+            if self.duty_ns:
+                self._write(self.duty_fd, 0)
+                self.duty_ns = 0
+            self._write(self.period_fd, period)
+            self.period = period
+        self.set_duty(duty)
+
+        if not self.enabled:
+            self._write(self.enable_fd, 1)
+            self.enabled = True
+
+    # End def
+
+    def set_duty(self, duty):
+        """Change the duty cycle (0 - 100)."""
+        duty_ns = int(self.period * duty / 100.0)
+        if duty_ns != self.duty_ns:
+            self._write(self.duty_fd, duty_ns)
+            self.duty_ns = duty_ns
+
+    # End def
+
+    def stop(self):
+        """Disable the output. The channel stays claimed."""
+        if self.enabled is not False:
+            self._write(self.enable_fd, 0)
+            self.enabled = False
+
+    # End def
+
+    def close(self):
+        """Disable the output and close the files (the channel stays
+        exported)."""
+        self.stop()
+        for fd in (self.period_fd, self.duty_fd, self.enable_fd):
+            os.close(fd)
+
+    # End def
+
+# End class
+
+
+class BackendPWMChannel(object):
+    """A PWM channel made from a backend's pwm_start/pwm_set_duty/pwm_stop,
+    for backends without persistent channels."""
+
+    def __init__(self, backend, pin):
+        self.backend   = backend
+        self.pin       = pin
+        self.running   = None
+
+    # End def
+
+    def start(self, duty, frequency):
+        if self.running == frequency:
+            self.backend.pwm_set_duty(self.pin, duty)
+        else:
+            if self.running is not None:
+                self.backend.pwm_stop(self.pin)
+            self.backend.pwm_start(self.pin, duty, frequency)
+            self.running = frequency
+
+    def set_duty(self, duty):
+        self.backend.pwm_set_duty(self.pin, duty)
+
+    def stop(self):
+        if self.running is not None:
+            self.backend.pwm_stop(self.pin)
+            self.running = None
+
+    def close(self):
+        self.stop()
+
+# End class
+
+
+# ------------------------------------------------------------------------
+# Profiles
+# ------------------------------------------------------------------------
+
+class PWMManager(object):
+    """Claims the PWM channels of a set of profiles and plays them."""
+
+    def __init__(self, backend, profiles):
+        """Claim a channel for every pin used by profiles.
+
+        :param backend:  hal backend (channels come from pwm_channel())
+        :param profiles: {name: Profile}
+        """
+        self.backend  = backend
+        self.profiles = profiles
+        self.channels = {}
+        self.timing   = {}
+
+        for name, profile in profiles.items():
+            if profile.pin not in self.channels:
+                self.channels[profile.pin] = backend.pwm_channel(profile.pin)
+            self.timing[name] = collections.deque(maxlen=TIMING_SAMPLES)
+
+    # End def
+
+    def run(self, name):
+        """Play profile name. Returns when it is done.
+
+        The end of every step is worked out from when the profile started,
+        so the steps do not add up late sleeps. Returns the time from the
+        output being enabled to it being disabled, in seconds.
+        """
+        profile = self.profiles[name]
+        channel = self.channels[profile.pin]
+        now     = self.backend.now
+
+        channel.start(profile.steps[0][0], profile.frequency)
+        start = now()
+        end   = start
+
+        for duty, seconds in profile.steps:
+            if end != start:
+                channel.set_duty(duty)
+            end += seconds
+            remaining = end - now()
+            while remaining > 0:
+                self.backend.sleep(remaining)
+                remaining = end - now()
+
+        channel.stop()
+        elapsed = now() - start
+        self.timing[name].append(elapsed)
+
+        return elapsed
+
+    # End def
+
+    def play(self, name, scheduler, on_done=None, timer="pwm"):
+        """Start profile name and return right away. The steps are timers
+        on scheduler, so the caller keeps running while the profile plays.
+
+        :param on_done: function called with the time from the output being
+                        enabled to it being disabled, in seconds
+        :param timer:   name of the step timer (one per pin on a scheduler)
+        """
+        profile = self.profiles[name]
+        channel = self.channels[profile.pin]
+        steps   = profile.steps
+
+        channel.start(steps[0][0], profile.frequency)
+        start   = scheduler.now()
+
+        # Step deadlines from the start, like run()
+        ends    = []
+        end     = start
+        for duty, seconds in steps:
+            end += seconds
+            ends.append(end)
+
+        def step(index):
+            if index < len(steps):
+                channel.set_duty(steps[index][0])
+                scheduler.call_at(ends[index], lambda: step(index + 1), name=timer)
+                return
+
+            channel.stop()
+            elapsed = scheduler.now() - start
+            self.timing[name].append(elapsed)
+            if on_done is not None:
+                on_done(elapsed)
+
+        scheduler.call_at(ends[0], lambda: step(1), name=timer)
+
+    # End def
+
+    def timing_stats(self, name):
+        """Return (runs, mean, min, max) of how long profile name took."""
+        samples = self.timing[name]
+        if not samples:
+            return (0, 0.0, 0.0, 0.0)
+        return (len(samples), sum(samples) / len(samples), min(samples), max(samples))
+
+    # End def
+
+    def close(self):
+        """Turn every output off and release the files."""
+        for channel in self.channels.values():
+            channel.close()
+
+    # End def
+
+# End class
+
+
+# ------------------------------------------------------------------------
+# Benchmark
+# ------------------------------------------------------------------------
+
+def make_fake_sysfs(root):
+    """Make a fake /sys/class/pwm under root with the PocketBeagle chips and
+    their channels already exported. Returns the class directory."""
+    base = os.path.join(root, "class", "pwm")
+    os.makedirs(base)
+
+    for number, device in enumerate(sorted(set(device for device, index in PWM_PINS.values()))):
+        chip = os.path.join(root, "devices", device, "pwm", "pwmchip{0}".format(number))
+        for index in (0, 1):
+            channel = os.path.join(chip, "pwm-{0}:{1}".format(number, index))
+            os.makedirs(channel)
+            for name in ("period", "duty_cycle", "enable"):
+                with open(os.path.join(channel, name), "w") as attribute:
+                    attribute.write("0\n")
+        os.symlink(chip, os.path.join(base, "pwmchip{0}".format(number)))
+
+    return base
+
+# End def
+
+
+class FakeSysfsBackend(object):
+    """Just enough of a backend to run profiles on a fake sysfs tree on the
+    real clock."""
+
+    def __init__(self, base):
+        self.base = base
+
+    def pwm_channel(self, pin):
+        return SysfsPWMChannel(pin, self.base, config_pin=False)
+
+    def now(self):
+        return time.monotonic()
+
+    def sleep(self, duration):
+        time.sleep(duration)
+
+# End class
+
+
+def print_stats(name, samples):
+    samples = sorted(samples)
+    count   = len(samples)
+    print("    {0:<28} mean {1:>8.3f} ms  min {2:>8.3f} ms  max {3:>8.3f} ms  "
+          "spread {4:>7.3f} ms".format(name, sum(samples) / count * 1e3, samples[0] * 1e3,
+                                       samples[-1] * 1e3, (samples[-1] - samples[0]) * 1e3))
+
+# End def
+
+
+# ------------------------------------------------------------------------
+# Main script
+# ------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="PWM channel and profile timing")
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--board", action="store_true",
+                        help="use the PWM hardware of the PocketBeagle")
+    args = parser.parse_args()
+
+    import shutil
+    import tempfile
+
+    import hal
+
+    profiles = {
+        "dispense"   : Profile("P1_36", hal.PWM_FREQUENCY, [(1, 0.09)]),
+        "short buzz" : Profile("P2_1", hal.PWM_FREQUENCY, [(100, 0.05), (50, 0.05)]),
+    }
+
+    root = None
+    if args.board:
+        backend = hal.BBIOBackend()
+    else:
+        root    = tempfile.mkdtemp()
+        backend = FakeSysfsBackend(make_fake_sysfs(root))
+
+    try:
+        start   = time.perf_counter()
+        manager = PWMManager(backend, profiles)
+        print("claimed {0} channels in {1:.1f} ms".format(
+              len(manager.channels), (time.perf_counter() - start) * 1e3))
+
+        print("profile timing over {0} runs (enable to disable):".format(args.runs))
+        for name in sorted(profiles):
+            for i in range(args.runs):
+                manager.run(name)
+            print_stats(name, manager.timing[name])
+
+        print("duty/enable change:")
+        channel = manager.channels["P1_36"]
+        samples = []
+        for i in range(args.runs):
+            start = time.perf_counter()
+            channel.start(1, hal.PWM_FREQUENCY)
+            channel.stop()
+            samples.append(time.perf_counter() - start)
+        print_stats("channel start + stop", samples)
+
+        if args.board:
+            manager.close()
+            samples = []
+            for i in range(args.runs):
+                start = time.perf_counter()
+                backend.pwm_start("P1_36", 1)
+                backend.pwm_stop("P1_36")
+                samples.append(time.perf_counter() - start)
+            print_stats("PWM.start + PWM.stop", samples)
+    finally:
+        if root is not None:
+            shutil.rmtree(root)
+
@@ -0,0 +1,304 @@
+"""
+--------------------------------------------------------------------------
+Display Renderer
+--------------------------------------------------------------------------
+License:
+Copyright 2021 <Jessica Kies>
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors
+may be used to endorse or promote products derived from this software without
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+Display Renderer
+    Overview: Rendering layer for the 4 digit display. The game says what
+    to show (a number, a short word, a countdown, scrolling text) and the
+    renderer turns it into frames and sends them to the HT16K33.
+
+      - A frame is 5 bytes: the segments of the 4 digits and the colon.
+      - Frames for every number 0 - 9999 are worked out once (on first use)
+        and kept in a table, and words are cached, so showing something
+        is a table lookup instead of encoding digits every time.
+      - Countdowns and scrolling text are sources: functions of the time
+        that return a frame. They are drawn by a timer at REFRESH_RATE,
+        and a frame is only sent to the display when it changed. Static
+        frames are drawn once and need no timer.
+
+--------------------------------------------------------------------------
+"""
+import ht16k33
+
+
+# ------------------------------------------------------------------------
+# Global Constants
+# ------------------------------------------------------------------------
+REFRESH_RATE                 = 10                # frames per second
+SCROLL_STEP_TIME             = 0.3               # seconds per character
+SAMPLE_DELAY                 = 0.001             # see Renderer.refresh()
+
+BLANK                        = 0x00
+COLON_ON                     = ht16k33.COLON_VALUE
+
+# 7-segment font (bit 0 = segment a ... bit 6 = segment g)
+FONT = {
+    " " : 0x00, "-" : 0x40, "_" : 0x08, "=" : 0x48,
+    "A" : 0x77, "B" : 0x7c, "C" : 0x39, "D" : 0x5e, "E" : 0x79, "F" : 0x71,
+    "G" : 0x3d, "H" : 0x76, "I" : 0x06, "J" : 0x1e, "K" : 0x75, "L" : 0x38,
+    "M" : 0x37, "N" : 0x54, "O" : 0x3f, "P" : 0x73, "Q" : 0x67, "R" : 0x50,
+    "S" : 0x6d, "T" : 0x78, "U" : 0x3e, "V" : 0x3e, "W" : 0x7e, "X" : 0x76,
+    "Y" : 0x6e, "Z" : 0x5b,
+}
+for _digit in range(10):
+    FONT[str(_digit)] = ht16k33.HEX_DIGITS[_digit]
+
+BLANK_FRAME                  = bytes(bytearray(5))
+
+
+# ------------------------------------------------------------------------
+# Frame tables
+# ------------------------------------------------------------------------
+
+_number_tables = {}
+_text_cache    = {}
+TEXT_CACHE_SIZE = 64
+
+
+def _number_table(leading_zeros):
+    """Return the table of frames for 0 - 9999 (5 bytes per frame)."""
+    table = _number_tables.get(leading_zeros)
+
+    if table is None:
+        table = bytearray(10000 * 5)
+        for value in range(10000):
+            digits = "{0:04d}".format(value) if leading_zeros else "{0:>4d}".format(value)
+            offset = value * 5
+            for i in range(4):
+                table[offset + i] = FONT[digits[i]]
+        table = bytes(table)
+        _number_tables[leading_zeros] = table
+
+    return table
+
+# End def
+
+
+def number_frame(value, leading_zeros=False, colon=False):
+    """Return the frame for a value between 0 and 9999.
+
+    Will throw a ValueError if value is not between 0 and 9999.
+    """
+    if (value < 0) or (value > 9999):
+        raise ValueError("Value is not within 0 and 9999.")
+
+    offset = int(value) * 5
+    frame  = _number_table(leading_zeros)[offset:offset + 5]
+
+    if colon:
+        frame = frame[:4] + bytes(bytearray([COLON_ON]))
+
+    return frame
+
+# End def
+
+
+def text_frame(text):
+    """Return the frame for up to 4 characters of text.
+
+    A ':' after the second character turns on the colon. Characters not in
+    FONT are shown blank.
+    """
+    frame = _text_cache.get(text)
+
+    if frame is None:
+        colon = False
+        chars = text.upper()
+        if (len(chars) > 2) and (chars[2] == ":"):
+            colon = True
+            chars = chars[:2] + chars[3:]
+
+        chars = (chars + "    ")[:4]
+        frame = bytes(bytearray([FONT.get(char, BLANK) for char in chars] +
+                                [COLON_ON if colon else BLANK]))
+
+        if len(_text_cache) >= TEXT_CACHE_SIZE:
+            _text_cache.clear()
+        _text_cache[text] = frame
+
+    return frame
+
+# End def
+
+
+def time_frame(seconds):
+    """Return the frame for a time left as M:SS (or MM:SS)."""
+    seconds = int(seconds + 0.999)              # round up, so 0:00 means done
+    minutes = min(99, seconds // 60)
+    value   = minutes * 100 + (seconds % 60)
+
+    if minutes == 0:
+        # Keep the 0 of the tens of seconds: " :05"
+        frame = number_frame(value, leading_zeros=True, colon=True)
+        return bytes(bytearray([BLANK, BLANK])) + frame[2:]
+
+    return number_frame(value, colon=True)
+
+# End def
+
+
+# ------------------------------------------------------------------------
+# Sources
+# ------------------------------------------------------------------------
+
+def countdown_source(end_time):
+    """Source showing the time left until end_time as M:SS."""
+    def source(now):
+        return time_frame(max(0.0, end_time - now))
+    return source
+
+# End def
+
+
+def scroll_source(text, start_time, step_time=SCROLL_STEP_TIME):
+    """Source scrolling text across the display from start_time."""
+    padded = "    " + text.upper() + "    "
+    frames = [text_frame(padded[i:i + 4]) for i in range(len(padded) - 3)]
+
+    def source(now):
+        step = int((now - start_time) / step_time)
+        return frames[step % len(frames)]
+    return source
+
+# End def
+
+
+def alternate_source(parts, start_time):
+    """Source switching between sources.
+
+    :param parts: list of (source or frame, seconds to show it)
+    """
+    period = sum(seconds for part, seconds in parts)
+
+    def source(now):
+        offset = (now - start_time) % period
+        for part, seconds in parts:
+            if offset < seconds:
+                break
+            offset -= seconds
+        if callable(part):
+            return part(now)
+        return part
+    return source
+
+# End def
+
+
+# ------------------------------------------------------------------------
+# Renderer
+# ------------------------------------------------------------------------
+
+class Renderer(object):
+    """Sends frames to an HT16K33, redrawing sources on a timer."""
+
+    def __init__(self, display, scheduler, rate=REFRESH_RATE, name="display"):
+        """Create the renderer.
+
+        :param display:   ht16k33.HT16K33
+        :param scheduler: scheduler.Scheduler used for the refresh timer
+        :param name:      name of the refresh timer (one per display)
+        """
+        self.display   = display
+        self.scheduler = scheduler
+        self.name      = name
+        self.interval  = 1.0 / rate
+        self.source    = None
+        self.last      = None
+        self.frames    = 0                # frames sent to the display
+
+    # End def
+
+    def show(self, what, rate=None):
+        """Show a frame (bytes) or a source (function of the time).
+
+        :param rate: frames per second to redraw a source at (None uses the
+                     renderer's rate). A countdown only needs 1.
+        """
+        if callable(what):
+            self.source = what
+            interval    = self.interval if rate is None else 1.0 / rate
+            self.scheduler.call_every(interval, self.refresh, name=self.name)
+        else:
+            self.source = None
+            self.scheduler.cancel(self.name)
+            self._draw(what)
+            return
+
+        self.refresh()
+
+    # End def
+
+    def show_number(self, value, leading_zeros=False):
+        self.show(number_frame(value, leading_zeros))
+
+    def show_text(self, text):
+        self.show(text_frame(text))
+
+    def show_countdown(self, end_time):
+        self.show(countdown_source(end_time), rate=1)
+
+    def show_scroll(self, text, step_time=SCROLL_STEP_TIME):
+        self.show(scroll_source(text, self.scheduler.now(), step_time))
+
+    def clear(self):
+        self.show(BLANK_FRAME)
+
+    def refresh(self):
+        """Draw the current source.
+
+        The refresh timer often fires right on the time a source changes
+        frame (a countdown second, the end of a word). The source is drawn
+        as of SAMPLE_DELAY later, so which frame is shown does not depend
+        on how the times round. A late timer on the board does the same.
+        """
+        if self.source is not None:
+            self._draw(self.source(self.scheduler.now() + SAMPLE_DELAY))
+
+    # End def
+
+    def _draw(self, frame):
+        """Send frame to the display if it is not already showing."""
+        if frame == self.last:
+            return
+
+        display = self.display
+        for i in range(4):
+            display.set_raw(i, frame[i])
+        display.set_colon(frame[4])
+        display.flush()
+
+        self.last    = frame
+        self.frames += 1
+
+    # End def
+
+# End class
@@ -5,5 +5,20 @@
 
 cd /var/lib/cloud9/ENGI301/project_1
 
-python3 candy_game.py
+# Wait for the start button GPIO (gpio47) to be exported instead of a fixed 
+# sleep at boot. Give up waiting after 30 seconds and start anyway.
+tries=0
+while [ ! -e /sys/class/gpio/gpio47/value ] && [ $tries -lt 300 ]; do
+    sleep 0.1
+    tries=$((tries + 1))
+done
+
+# The game writes logs/ready once it is accepting button presses
+rm -f logs/ready
+
+# The supervisor starts the game again right away if it dies; the lockout
+# and difficulty timers are picked up from logs/candy_game.state
+python3 supervisor.py
+
+
 
@@ -0,0 +1,246 @@
+"""
+--------------------------------------------------------------------------
+Scheduler
+--------------------------------------------------------------------------
+License:
+Copyright 2021 <Jessica Kies>
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors
+may be used to endorse or promote products derived from this software without
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+Scheduler
+    Overview: Small timer scheduler for the timed parts of the candy game
+    (the lockout, the level windows after a win and display refreshes).
+
+    Deadlines are kept on time.monotonic(), so they are not moved when the
+    wall clock jumps (e.g. when NTP syncs after boot). wait() sleeps until
+    the next deadline or until an input event arrives, whichever is first,
+    so nothing is polled while the game is idle.
+
+    Timers can be given a name. Starting a timer with a name that is
+    already in use replaces the old timer, and remaining(name) tells how
+    long is left (e.g. for showing the lockout countdown).
+
+--------------------------------------------------------------------------
+"""
+import heapq
+import itertools
+import time
+
+
+# ------------------------------------------------------------------------
+# Timer
+# ------------------------------------------------------------------------
+
+class Timer(object):
+    """A callback that is due at a monotonic deadline."""
+
+    def __init__(self, deadline, callback, name, interval):
+        """Create the timer.
+
+        :param interval: None for a one shot timer, otherwise the period in
+                         seconds of a repeating timer
+        """
+        self.deadline  = deadline
+        self.callback  = callback
+        self.name      = name
+        self.interval  = interval
+        self.cancelled = False
+
+    # End def
+
+# End class
+
+
+# ------------------------------------------------------------------------
+# Scheduler
+# ------------------------------------------------------------------------
+
+class Scheduler(object):
+    """Runs timers on a monotonic clock."""
+
+    def __init__(self, clock=time.monotonic, sleep=time.sleep):
+        """Create an empty scheduler.
+
+        :param clock: function returning the current time in seconds
+        :param sleep: function used to sleep when there is no input source
+        """
+        self.clock   = clock
+        self.sleep   = sleep
+        self.heap    = []
+        self.named   = {}
+        self.counter = itertools.count()
+        self.dead    = 0                   # cancelled timers still in heap
+
+    # End def
+
+    def now(self):
+        """Return the current time of the scheduler clock."""
+        return self.clock()
+
+    # End def
+
+    def call_at(self, deadline, callback=None, name=None, interval=None):
+        """Run callback at deadline (a time from now()).
+
+        A callback of None gives a timer that only marks the deadline, which
+        can be checked with pending() and remaining().
+        """
+        if name is not None:
+            self.cancel(name)
+
+        timer = Timer(deadline, callback, name, interval)
+        heapq.heappush(self.heap, (deadline, next(self.counter), timer))
+
+        if name is not None:
+            self.named[name] = timer
+
+        return timer
+
+    # End def
+
+    def call_later(self, delay, callback=None, name=None):
+        """Run callback delay seconds from now."""
+        return self.call_at(self.clock() + delay, callback, name)
+
+    # End def
+
+    def call_every(self, interval, callback, name=None):
+        """Run callback every interval seconds, starting one interval from now.
+
+        The next deadline is always the previous deadline plus interval, so
+        the timer does not drift when a callback runs late.
+        """
+        return self.call_at(self.clock() + interval, callback, name, interval)
+
+    # End def
+
+    def cancel(self, name):
+        """Cancel the timer with the given name, if there is one."""
+        timer = self.named.pop(name, None)
+        if timer is not None:
+            timer.cancelled = True
+            self.dead += 1
+
+            # Drop cancelled timers once they are half of the heap, so a
+            # timer that is restarted over and over does not grow the heap
+            if self.dead > 8 and self.dead * 2 > len(self.heap):
+                self.heap[:] = [entry for entry in self.heap if not entry[2].cancelled]
+                heapq.heapify(self.heap)
+                self.dead = 0
+
+    # End def
+
+    def pending(self, name):
+        """Return True if the timer with the given name has not run yet."""
+        return name in self.named
+
+    # End def
+
+    def remaining(self, name):
+        """Return the seconds left on the named timer (0 if not pending)."""
+        timer = self.named.get(name)
+        if timer is None:
+            return 0.0
+        return max(0.0, timer.deadline - self.clock())
+
+    # End def
+
+    def next_deadline(self):
+        """Return the earliest deadline, or None if there are no timers."""
+        heap = self.heap
+        while heap and heap[0][2].cancelled:
+            heapq.heappop(heap)
+            self.dead -= 1
+
+        if heap:
+            return heap[0][0]
+        return None
+
+    # End def
+
+    def run_due(self):
+        """Run every timer whose deadline has passed.
+
+        Returns the number of callbacks run.
+        """
+        heap = self.heap
+        now  = self.clock()
+        ran  = 0
+
+        while heap and heap[0][0] <= now:
+            _, _, timer = heapq.heappop(heap)
+
+            if timer.cancelled:
+                self.dead -= 1
+                continue
+
+            if timer.interval is None:
+                if timer.name is not None:
+                    del self.named[timer.name]
+            else:
+                timer.deadline += timer.interval
+                heapq.heappush(heap, (timer.deadline, next(self.counter), timer))
+
+            if timer.callback is not None:
+                timer.callback()
+            ran += 1
+
+        return ran
+
+    # End def
+
+    def wait(self, source=None, timeout=None):
+        """Sleep until the next deadline, then run the due timers.
+
+        :param source:  optional function taking a timeout (None = forever)
+                        and returning an input event or None. When given,
+                        the wait ends early if an event arrives.
+        :param timeout: longest time to wait in seconds (None = no limit)
+
+        Returns the event from source, or None.
+        """
+        deadline = self.next_deadline()
+        if deadline is not None:
+            wait = max(0.0, deadline - self.clock())
+            if (timeout is None) or (wait < timeout):
+                timeout = wait
+
+        event = None
+        if source is not None:
+            event = source(timeout)
+        elif timeout is not None:
+            self.sleep(timeout)
+        else:
+            raise ValueError("Nothing to wait for.")
+
+        self.run_due()
+
+        return event
+
+    # End def
+
+# End class
@@ -0,0 +1,247 @@
+"""
+--------------------------------------------------------------------------
+Pattern Sequencer
+--------------------------------------------------------------------------
+License:
+Copyright 2021 <Jessica Kies>
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors
+may be used to endorse or promote products derived from this software without
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+Pattern Sequencer
+    Overview: Plays a pattern on the LEDs with a matching buzzer tone for
+    each step. Every LED on/off is a timer on the game scheduler, so the
+    game loop keeps handling input while a pattern plays.
+
+    The deadline of each step is worked out from the time the pattern
+    started (start + step * step_time), never from the previous step, so
+    late callbacks do not add up and the pattern does not drift. The
+    difference between each deadline and when it actually ran is kept so
+    the timing jitter can be reported.
+
+    Running this file directly plays patterns on the real clock (with
+    simulated pins) and prints the jitter:
+        python3 sequencer.py [--steps N] [--step-time S]
+
+--------------------------------------------------------------------------
+"""
+import argparse
+import collections
+import random
+
+import hal
+import scheduler as game_scheduler
+
+
+# ------------------------------------------------------------------------
+# Global Constants
+# ------------------------------------------------------------------------
+STEP_TIME                    = 1.0               # seconds per pattern step
+ON_FRACTION                  = 0.5               # part of the step the LED is on
+BUZZER_DUTY                  = 50
+JITTER_SAMPLES               = 1024
+
+
+# ------------------------------------------------------------------------
+# Sequencer
+# ------------------------------------------------------------------------
+
+class Sequencer(object):
+    """Plays patterns on a set of LEDs and a buzzer."""
+
+    def __init__(self, backend, scheduler, leds, buzzer=None, notes=None,
+                 step_time=STEP_TIME, on_times=None, name="sequencer"):
+        """Create the sequencer.
+
+        :param leds:      list of LED pins, indexed by pattern step value
+        :param buzzer:    PWM pin of the buzzer, or None for no sound
+        :param notes:     tone in Hz for each LED (same order as leds)
+        :param step_time: default seconds per step (the tempo)
+        :param on_times:  histogram (metrics.Histogram) of how long each LED
+                          of a pattern was really on, or None
+        :param name:      name of the step timer (one per sequencer on a
+                          scheduler)
+        """
+        self.backend   = backend
+        self.scheduler = scheduler
+        self.leds      = leds
+        self.buzzer    = buzzer
+        self.notes     = notes
+        self.step_time = step_time
+
+        # The buzzer channel is claimed once; a note only changes the
+        # frequency and turns the output on and off
+        self.tone      = None
+        if (buzzer is not None) and notes:
+            self.tone  = backend.pwm_channel(buzzer)
+
+        self.pattern   = []
+        self.index     = 0
+        self.start     = 0.0
+        self.on_time   = 0.0
+        self.playing   = False
+        self.jitter    = collections.deque(maxlen=JITTER_SAMPLES)
+        self.on_times  = on_times
+        self.on_at     = 0.0
+        self.name      = name
+        self.on_done   = None
+
+    # End def
+
+    def note_on(self, step):
+        """Light the LED of step and play its tone."""
+        self.backend.gpio_output(self.leds[step], hal.HIGH)
+        if self.tone is not None:
+            self.tone.start(BUZZER_DUTY, self.notes[step])
+
+    # End def
+
+    def note_off(self, step):
+        """Turn off the LED of step and its tone."""
+        self.backend.gpio_output(self.leds[step], hal.LOW)
+        if self.tone is not None:
+            self.tone.stop()
+
+    # End def
+
+    def play(self, pattern, step_time=None, on_done=None):
+        """Start playing pattern. Returns right away.
+
+        :param step_time: seconds per step for this pattern (None uses the
+                          default); smaller is faster
+        :param on_done:   function called when the pattern has played (not
+                          when it is stopped)
+        """
+        if self.playing:
+            self.stop()
+
+        if step_time is None:
+            step_time = self.step_time
+
+        self.pattern   = list(pattern)
+        self.index     = 0
+        self.start     = self.scheduler.now()
+        self.step_time = step_time
+        self.on_time   = step_time * ON_FRACTION
+        self.playing   = True
+        self.on_done   = on_done
+
+        self._schedule(self.start, self._on)
+
+    # End def
+
+    def stop(self):
+        """Stop the pattern early."""
+        if self.playing:
+            self.scheduler.cancel(self.name)
+            if self.index < len(self.pattern):
+                self.note_off(self.pattern[self.index])
+            self.playing = False
+
+    # End def
+
+    def _schedule(self, deadline, func):
+        """Run func at deadline and record how late it ran."""
+        def run():
+            self.jitter.append(self.scheduler.now() - deadline)
+            func()
+
+        self.scheduler.call_at(deadline, run, name=self.name)
+
+    # End def
+
+    def _on(self):
+        """Start the current step."""
+        if self.index >= len(self.pattern):
+            self.playing = False
+            if self.on_done is not None:
+                self.on_done()
+            return
+
+        self.note_on(self.pattern[self.index])
+        self.on_at = self.scheduler.now()
+        self._schedule(self.start + self.index * self.step_time + self.on_time, self._off)
+
+    # End def
+
+    def _off(self):
+        """End the current step and schedule the next one."""
+        self.note_off(self.pattern[self.index])
+        if self.on_times is not None:
+            self.on_times.observe(self.scheduler.now() - self.on_at)
+        self.index += 1
+
+        # After the last step, _on() marks the pattern as done once the
+        # gap of the last step is over
+        self._schedule(self.start + self.index * self.step_time, self._on)
+
+    # End def
+
+    def jitter_stats(self):
+        """Return (samples, mean, p50, p99, max) of the jitter in seconds."""
+        samples = sorted(self.jitter)
+        count   = len(samples)
+        if count == 0:
+            return (0, 0.0, 0.0, 0.0, 0.0)
+
+        return (count, sum(samples) / count, samples[count // 2],
+                samples[min(count - 1, int(count * 0.99))], samples[-1])
+
+    # End def
+
+# End class
+
+
+# ------------------------------------------------------------------------
+# Main script
+# ------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Pattern sequencer jitter test")
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--step-time", type=float, default=0.1,
+                        help="seconds per step")
+    args = parser.parse_args()
+
+    # Simulated pins, real clock
+    pins      = hal.SimBackend()
+    scheduler = game_scheduler.Scheduler()
+    sequencer = Sequencer(pins, scheduler, ["LED0", "LED1", "LED2", "LED3"],
+                          "BUZZER", [262, 329, 392, 529])
+
+    sequencer.play([random.randint(0, 3) for i in range(args.steps)], args.step_time)
+    start = scheduler.now()
+    while sequencer.playing:
+        scheduler.wait()
+    elapsed = scheduler.now() - start
+
+    count, mean, p50, p99, worst = sequencer.jitter_stats()
+    print("{0} steps of {1} s in {2:.4f} s (expected {3:.4f} s)".format(
+          args.steps, args.step_time, elapsed, args.steps * args.step_time))
+    print("jitter over {0} events: mean {1:.1f} us  p50 {2:.1f} us  "
+          "p99 {3:.1f} us  max {4:.1f} us".format(
+          count, mean * 1e6, p50 * 1e6, p99 * 1e6, worst * 1e6))
+
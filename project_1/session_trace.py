@@ -0,0 +1,851 @@
+"""
+--------------------------------------------------------------------------
+Session Trace
+--------------------------------------------------------------------------
+License:
+Copyright 2021 <Jessica Kies>
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors
+may be used to endorse or promote products derived from this software without
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+Session Trace
+    Overview: Compact binary trace of what happened in a game session, and
+    a replay engine that plays a trace back through the game logic to check
+    that it does the same thing again.
+
+    A trace records:
+      - the seed of the random number generator (so the patterns can be
+        made again)
+      - the timers the game picked up from the state file, if it resumed
+        (a RESTORE record)
+      - every pattern the game made
+      - every button edge the game read, at the time it read it
+      - every actuator command: LED outputs, PWM start/duty/stop and I2C
+        writes to the display
+
+    Format: the file starts with MAGIC and is a list of records. Each
+    record is a 1 byte kind, the microseconds since the previous record (4
+    bytes) and a small payload. Pins are given a 1 byte id the first time
+    they are used (a PIN record). A SESSION record starts every run of the
+    game, so one file holds many sessions. The file is only ever appended
+    to, in batches, so a crash loses at most the last batch.
+
+    When the file passes MAX_BYTES it is moved to <path>.1 and a new one
+    is started. The new file starts with the SESSION and PIN records of
+    the session again, and a CONTINUED record giving the time into the
+    session, so it can be read on its own. A continued session starts in
+    the middle of a game, so it is not replayed.
+
+    Replay runs the game on the simulated backend with the recorded seed
+    and button edges, records what it does in memory and compares the two
+    traces channel by channel (each LED, PWM pin, I2C bus and the
+    patterns). The difference between the recorded and replayed time of
+    each output is how late the board was.
+
+    Usage:
+        python3 session_trace.py [logs/candy_game.trace] [--dump] [-n N]
+        python3 session_trace.py test.trace --record GAMES [--resume]
+
+--------------------------------------------------------------------------
+"""
+import argparse
+import collections
+import os
+import struct
+import sys
+import time
+
+import hal
+
+
+# ------------------------------------------------------------------------
+# Global Constants
+# ------------------------------------------------------------------------
+MAGIC                        = b"CGTRACE1"
+FLUSH_SIZE                   = 4096              # bytes buffered before a write
+FLUSH_INTERVAL               = 10                # seconds between writes
+MAX_BYTES                    = 4 * 1024 * 1024   # size before starting a new file
+
+# Record kinds
+SESSION                      = 1     # seed, wall clock, monotonic start
+TIME                         = 2     # microseconds since the session started
+PIN                          = 3     # pin id, name
+PATTERN                      = 4     # steps
+BUTTON                       = 5     # button, pressed
+GPIO                         = 6     # pin id, value
+PWM_START                    = 7     # pin id, duty, frequency
+PWM_DUTY                     = 8     # pin id, duty
+PWM_STOP                     = 9     # pin id
+I2C_BYTE                     = 10    # bus id, value
+I2C_BLOCK                    = 11    # bus id, register, data
+CONTINUED                    = 12    # microseconds since the session started
+RESTORE                      = 13    # state, win, again, lose time (saved timers)
+
+KIND_NAMES = {
+    SESSION : "session",  TIME : "time",          PIN : "pin",
+    PATTERN : "pattern",  BUTTON : "button",      GPIO : "gpio",
+    PWM_START : "pwm_start", PWM_DUTY : "pwm_duty", PWM_STOP : "pwm_stop",
+    I2C_BYTE : "i2c_byte", I2C_BLOCK : "i2c_block", CONTINUED : "continued",
+    RESTORE : "restore",
+}
+
+HEADER                       = struct.Struct("<BI")
+PAYLOADS = {
+    SESSION   : struct.Struct("<Qdd"),
+    TIME      : struct.Struct("<Q"),
+    PIN       : struct.Struct("<BB"),    # followed by the name
+    PATTERN   : struct.Struct("<B"),     # followed by the steps
+    BUTTON    : struct.Struct("<BB"),
+    GPIO      : struct.Struct("<BB"),
+    PWM_START : struct.Struct("<Bff"),
+    PWM_DUTY  : struct.Struct("<Bf"),
+    PWM_STOP  : struct.Struct("<B"),
+    I2C_BYTE  : struct.Struct("<BB"),
+    I2C_BLOCK : struct.Struct("<BBB"),   # followed by the data
+    CONTINUED : struct.Struct("<Q"),
+    RESTORE   : struct.Struct("<Bddd"),  # times from the session start
+}
+MAX_DELTA                    = 0xffffffff
+
+Record  = collections.namedtuple("Record", ["time", "kind", "args"])
+Session = collections.namedtuple("Session", ["seed", "wall", "start", "records", "continued",
+                                             "saved"])
+
+
+# ------------------------------------------------------------------------
+# Writer
+# ------------------------------------------------------------------------
+
+class TraceWriter(object):
+    """Appends records to a trace file in batches."""
+
+    def __init__(self, path=None, flush_size=FLUSH_SIZE, max_bytes=MAX_BYTES):
+        """Create the writer. Nothing is opened until the first flush.
+
+        :param path: trace file, or None to keep the trace in memory (data)
+        """
+        self.path       = path
+        self.flush_size = flush_size
+        self.max_bytes  = max_bytes
+        self.buffer     = bytearray()
+        self.data       = bytearray()        # everything, when path is None
+        self.fd         = None
+        self.size       = 0                  # bytes in the file
+        self.started    = None               # SESSION payload of the session
+        self.clock      = time.monotonic
+        self.start      = 0.0
+        self.last       = 0                  # microseconds of the last record
+        self.pins       = {}
+        self.records    = 0
+
+    # End def
+
+    def session(self, seed, clock=None):
+        """Start a session: record the seed and the time it started.
+
+        :param clock: function returning the monotonic time in seconds
+        """
+        if clock is not None:
+            self.clock = clock
+        self.start   = self.clock()
+        self.last    = 0
+        self.pins    = {}
+        self.started = PAYLOADS[SESSION].pack(seed, time.time(), self.start)
+        self._append(SESSION, 0, self.started)
+
+    # End def
+
+    def start_timer(self, scheduler, interval=FLUSH_INTERVAL):
+        """Flush the trace every interval seconds on scheduler."""
+        if self.path is not None:
+            scheduler.call_every(interval, self.flush, name="trace")
+
+    # End def
+
+    def _append(self, kind, delta, payload, extra=b""):
+        """Add one record to the buffer."""
+        buffer = self.buffer
+        buffer += HEADER.pack(kind, delta)
+        buffer += payload
+        if extra:
+            buffer += extra
+        self.records += 1
+
+        if len(buffer) >= self.flush_size:
+            self.flush()
+
+    # End def
+
+    def _record(self, kind, payload, extra=b""):
+        """Add a record stamped with the current time."""
+        now   = int((self.clock() - self.start) * 1e6 + 0.5)
+        delta = now - self.last
+
+        if (delta < 0) or (delta > MAX_DELTA):
+            self._append(TIME, 0, PAYLOADS[TIME].pack(max(0, now)))
+            delta = 0
+        self.last = now
+
+        self._append(kind, delta, payload, extra)
+
+    # End def
+
+    def _pin(self, name):
+        """Return the id of pin name, recording it the first time."""
+        pin = self.pins.get(name)
+        if pin is None:
+            pin = len(self.pins)
+            self.pins[name] = pin
+            encoded = str(name).encode("ascii")
+            self._append(PIN, 0, PAYLOADS[PIN].pack(pin, len(encoded)), encoded)
+        return pin
+
+    # End def
+
+    def restore(self, saved):
+        """Record the state_file.Saved timers the game started from."""
+        self._record(RESTORE, PAYLOADS[RESTORE].pack(saved.state, saved.win_time - self.start,
+                                                     saved.again_time - self.start,
+                                                     saved.lose_time - self.start))
+
+    # End def
+
+    def pattern(self, steps):
+        self._record(PATTERN, PAYLOADS[PATTERN].pack(len(steps)), bytes(bytearray(steps)))
+
+    def button(self, event):
+        self._record(BUTTON, PAYLOADS[BUTTON].pack(event.button, bool(event.pressed)))
+
+    def gpio(self, pin, value):
+        self._record(GPIO, PAYLOADS[GPIO].pack(self._pin(pin), value))
+
+    def pwm_start(self, pin, duty, frequency):
+        self._record(PWM_START, PAYLOADS[PWM_START].pack(self._pin(pin), duty, frequency))
+
+    def pwm_duty(self, pin, duty):
+        self._record(PWM_DUTY, PAYLOADS[PWM_DUTY].pack(self._pin(pin), duty))
+
+    def pwm_stop(self, pin):
+        self._record(PWM_STOP, PAYLOADS[PWM_STOP].pack(self._pin(pin)))
+
+    def i2c_byte(self, bus, value):
+        self._record(I2C_BYTE, PAYLOADS[I2C_BYTE].pack(bus, value))
+
+    def i2c_block(self, bus, register, data):
+        self._record(I2C_BLOCK, PAYLOADS[I2C_BLOCK].pack(bus, register, len(data)), bytes(data))
+
+    def flush(self):
+        """Append the buffered records to the file in one write."""
+        if not self.buffer:
+            return
+
+        if self.path is None:
+            self.data += self.buffer
+        else:
+            if self.fd is None:
+                self._open()
+            os.write(self.fd, self.buffer)
+            self.size += len(self.buffer)
+        del self.buffer[:]
+
+        if (self.fd is not None) and (self.size >= self.max_bytes):
+            self._rotate()
+
+    # End def
+
+    def _open(self):
+        """Open the file for appending, starting a new one if it is full."""
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        if os.path.exists(self.path) and (os.path.getsize(self.path) >= self.max_bytes):
+            os.replace(self.path, self.path + ".1")
+
+        self.fd   = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self.size = os.fstat(self.fd).st_size
+        if self.size == 0:
+            os.write(self.fd, MAGIC)
+            self.size = len(MAGIC)
+
+    # End def
+
+    def _rotate(self):
+        """Move the full file to <path>.1 and start a new one with the
+        session (as CONTINUED from the time of the last record) and its
+        pins, so the new file can be read on its own."""
+        os.close(self.fd)
+        self.fd = None
+        os.replace(self.path, self.path + ".1")
+        self._open()
+
+        if self.started is None:
+            return
+
+        header  = bytearray(HEADER.pack(SESSION, 0) + self.started)
+        header += HEADER.pack(CONTINUED, 0) + PAYLOADS[CONTINUED].pack(self.last)
+        for name, pin in sorted(self.pins.items(), key=lambda item: item[1]):
+            encoded = str(name).encode("ascii")
+            header += HEADER.pack(PIN, 0) + PAYLOADS[PIN].pack(pin, len(encoded)) + encoded
+        os.write(self.fd, header)
+        self.size += len(header)
+
+    # End def
+
+    def getvalue(self):
+        """Return the trace kept in memory as a trace file would hold it."""
+        self.flush()
+        return MAGIC + bytes(self.data)
+
+    # End def
+
+    def close(self):
+        """Write what is left and close the file."""
+        self.flush()
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    # End def
+
+# End class
+
+
+# ------------------------------------------------------------------------
+# Recording backend
+# ------------------------------------------------------------------------
+
+class TracedTransport(object):
+    """I2C transport that records every write."""
+
+    def __init__(self, transport, writer, bus):
+        self.transport = transport
+        self.writer    = writer
+        self.bus       = bus
+
+    def write_byte(self, value):
+        self.writer.i2c_byte(self.bus, value)
+        self.transport.write_byte(value)
+
+    def write_block(self, register, data):
+        self.writer.i2c_block(self.bus, register, data)
+        self.transport.write_block(register, data)
+
+    def close(self):
+        self.transport.close()
+
+# End class
+
+
+class TracedPWMChannel(object):
+    """PWM channel that records every change."""
+
+    def __init__(self, channel, writer, pin):
+        self.channel = channel
+        self.writer  = writer
+        self.pin     = pin
+
+    def start(self, duty, frequency):
+        self.writer.pwm_start(self.pin, duty, frequency)
+        self.channel.start(duty, frequency)
+
+    def set_duty(self, duty):
+        self.writer.pwm_duty(self.pin, duty)
+        self.channel.set_duty(duty)
+
+    def stop(self):
+        self.writer.pwm_stop(self.pin)
+        self.channel.stop()
+
+    def close(self):
+        self.channel.close()
+
+# End class
+
+
+class TracedButtons(object):
+    """Button input that records every event the game reads."""
+
+    def __init__(self, buttons, writer):
+        self.buttons = buttons
+        self.writer  = writer
+
+    # End def
+
+    def get(self, timeout=None):
+        event = self.buttons.get(timeout)
+        if event is not None:
+            self.writer.button(event)
+        return event
+
+    def wait_for_press(self, button, timeout=None):
+        event = self.buttons.wait_for_press(button, timeout)
+        if event is not None:
+            self.writer.button(event)
+        return event
+
+    def __getattr__(self, name):
+        return getattr(self.buttons, name)
+
+# End class
+
+
+class TraceBackend(hal.Backend):
+    """Backend that records the actuator commands and button events going
+    through another backend."""
+
+    def __init__(self, backend, writer):
+        self.backend  = backend
+        self.writer   = writer
+        self.buses    = 0
+        self.channels = {}
+
+    # End def
+
+    def gpio_setup(self, pin, direction, initial=hal.LOW):
+        self.backend.gpio_setup(pin, direction, initial)
+
+    def gpio_setup_many(self, pins, direction, initial=hal.LOW):
+        self.backend.gpio_setup_many(pins, direction, initial)
+
+    def gpio_input(self, pin):
+        return self.backend.gpio_input(pin)
+
+    def gpio_output(self, pin, value):
+        self.writer.gpio(pin, value)
+        self.backend.gpio_output(pin, value)
+
+    def gpio_input_many(self, pins):
+        return self.backend.gpio_input_many(pins)
+
+    def gpio_output_many(self, pins, values):
+        for pin, value in zip(pins, values):
+            self.writer.gpio(pin, value)
+        self.backend.gpio_output_many(pins, values)
+
+    def pwm_start(self, pin, duty, frequency=hal.PWM_FREQUENCY):
+        self.writer.pwm_start(pin, duty, frequency)
+        self.backend.pwm_start(pin, duty, frequency)
+
+    def pwm_set_duty(self, pin, duty):
+        self.writer.pwm_duty(pin, duty)
+        self.backend.pwm_set_duty(pin, duty)
+
+    def pwm_stop(self, pin):
+        self.writer.pwm_stop(pin)
+        self.backend.pwm_stop(pin)
+
+    def pwm_channel(self, pin):
+        if pin not in self.channels:
+            self.channels[pin] = TracedPWMChannel(self.backend.pwm_channel(pin),
+                                                  self.writer, pin)
+        return self.channels[pin]
+
+    def i2c_open(self, bus, address):
+        transport   = TracedTransport(self.backend.i2c_open(bus, address), self.writer, self.buses)
+        self.buses += 1
+        return transport
+
+    def button_input(self, gpios):
+        return TracedButtons(self.backend.button_input(gpios), self.writer)
+
+    def now(self):
+        return self.backend.now()
+
+    def sleep(self, duration):
+        self.backend.sleep(duration)
+
+    def close(self):
+        self.backend.close()
+
+    def __getattr__(self, name):
+        # Anything else (SimBackend.calls, i2c_transfers(), ...)
+        return getattr(self.backend, name)
+
+# End class
+
+
+# ------------------------------------------------------------------------
+# Reader
+# ------------------------------------------------------------------------
+
+def read_sessions(data):
+    """Return the list of Sessions in the trace data (bytes).
+
+    The times of the records are on the monotonic clock of the session. Pin
+    ids are replaced by the pin names. The saved timers of a resumed
+    session are its saved (state, win time, again time, lose time), on the
+    same clock. A partly written record at the end
+    is ignored.
+    """
+    if not data.startswith(MAGIC):
+        raise ValueError("Not a candy game trace.")
+
+    sessions = []
+    records  = None
+    start    = 0.0
+    now      = 0
+    pins     = {}
+    offset   = len(MAGIC)
+    size     = len(data)
+
+    try:
+        while offset < size:
+            kind, delta = HEADER.unpack_from(data, offset)
+            offset     += HEADER.size
+            payload     = PAYLOADS[kind]
+            args        = payload.unpack_from(data, offset)
+            offset     += payload.size
+            now        += delta
+
+            if kind in (PIN, PATTERN, I2C_BLOCK):
+                length = args[-1]
+                if offset + length > size:
+                    break
+                extra   = data[offset:offset + length]
+                offset += length
+
+            if kind == SESSION:
+                seed, wall, start = args
+                records = []
+                now     = 0
+                pins    = {}
+                sessions.append(Session(seed, wall, start, records, False, None))
+                continue
+            if records is None:
+                raise ValueError("Trace does not start with a session.")
+
+            if kind == TIME:
+                now = args[0]
+            elif kind == CONTINUED:
+                now          = args[0]
+                sessions[-1] = sessions[-1]._replace(continued=True)
+            elif kind == RESTORE:
+                saved        = (args[0],) + tuple(start + value for value in args[1:])
+                sessions[-1] = sessions[-1]._replace(saved=saved)
+            elif kind == PIN:
+                pins[args[0]] = extra.decode("ascii")
+            else:
+                if kind == PATTERN:
+                    args = (bytes(extra),)
+                elif kind == I2C_BLOCK:
+                    args = (args[0], args[1], bytes(extra))
+                elif kind in (GPIO, PWM_START, PWM_DUTY, PWM_STOP):
+                    args = (pins[args[0]],) + args[1:]
+                records.append(Record(start + now / 1e6, kind, args))
+    except struct.error:
+        pass                                      # partly written record
+
+    return sessions
+
+# End def
+
+
+def read_trace(path):
+    """Return the Sessions in the trace file path."""
+    with open(path, "rb") as trace_file:
+        return read_sessions(trace_file.read())
+
+# End def
+
+
+def channel(record):
+    """Return the output channel of record (None for inputs)."""
+    kind = record.kind
+    if kind in (GPIO, PWM_START, PWM_DUTY, PWM_STOP):
+        return ("pwm" if kind != GPIO else "gpio", record.args[0])
+    if kind in (I2C_BYTE, I2C_BLOCK):
+        return ("i2c", record.args[0])
+    if kind == PATTERN:
+        return ("pattern",)
+    return None
+
+# End def
+
+
+def format_record(record):
+    """Format one record as a line of text."""
+    args = []
+    for arg in record.args:
+        if isinstance(arg, bytes):
+            arg = "".join("{0:02x}".format(byte) for byte in bytearray(arg))
+        elif isinstance(arg, float):
+            arg = "{0:g}".format(arg)
+        args.append(str(arg))
+
+    return "{0:>14.6f}  {1:<10} {2}".format(record.time, KIND_NAMES[record.kind], " ".join(args))
+
+# End def
+
+
+# ------------------------------------------------------------------------
+# Replay
+# ------------------------------------------------------------------------
+
+class EndOfTrace(Exception):
+    """The replay reached the end of the recorded session."""
+    pass
+
+# End class
+
+
+class ReplayButtons(hal.SimButtons):
+    """Simulated buttons that give the game the recorded button edges, at
+    the times it read them."""
+
+    def __init__(self, backend, count, events, end):
+        hal.SimButtons.__init__(self, backend, count)
+        self.events.extend(events)
+        self.end = end
+
+    # End def
+
+    def get(self, timeout=None):
+        """Like SimButtons.get, but raise EndOfTrace instead of waiting
+        past the end of the session."""
+        if not self.events:
+            if (timeout is None) or (self.backend.time + timeout > self.end):
+                raise EndOfTrace()
+        return hal.SimButtons.get(self, timeout)
+
+    # End def
+
+    def clear(self):
+        # Every recorded edge was read by the game, so none can be dropped
+        pass
+
+# End class
+
+
+class ReplayBackend(hal.SimBackend):
+    """Simulated backend whose buttons replay a session."""
+
+    def __init__(self, session):
+        hal.SimBackend.__init__(self, start_time=session.start)
+        self.session = session
+
+    # End def
+
+    def button_input(self, gpios):
+        import button_input
+
+        events = [button_input.ButtonEvent(record.args[0], bool(record.args[1]), record.time)
+                  for record in self.session.records if record.kind == BUTTON]
+        end    = self.session.records[-1].time if self.session.records else self.session.start
+        return ReplayButtons(self, len(gpios), events, end)
+
+# End class
+
+
+def replay_session(session):
+    """Play session through the game and return the replayed Records."""
+    import candy_game as game
+    import state_file
+
+    saved = None
+    if session.saved is not None:
+        saved = [state_file.Saved(*session.saved)]
+
+    writer  = TraceWriter()
+    backend = ReplayBackend(session)
+    game.setup_game(backend, seed=session.seed, trace=writer, saved=saved)
+
+    # The main script sets up the display once the game is waiting
+    if any(record.kind in (I2C_BYTE, I2C_BLOCK) for record in session.records):
+        game.scheduler.call_later(0, game.display_setup)
+
+    try:
+        while True:
+            game.step_game()
+    except EndOfTrace:
+        pass
+
+    return read_sessions(writer.getvalue())[0].records
+
+# End def
+
+
+def compare(recorded, replayed):
+    """Compare the outputs of two runs channel by channel.
+
+    The replay may make a few more outputs than were recorded: the game
+    kept going after the last record was written (or the process was
+    stopped before its last batch was). Fewer outputs is a mismatch.
+
+    Returns (outputs matched, outputs after the end of the recording, list
+    of mismatch messages, list of how late each recorded output was
+    compared with the replay in seconds).
+    """
+    channels = collections.OrderedDict()
+    for source, records in ((0, recorded), (1, replayed)):
+        for record in records:
+            key = channel(record)
+            if key is not None:
+                channels.setdefault(key, ([], []))[source].append(record)
+
+    matched    = 0
+    extra      = 0
+    mismatches = []
+    late       = []
+
+    for key, (expected, actual) in channels.items():
+        for want, got in zip(expected, actual):
+            if (want.kind != got.kind) or (want.args != got.args):
+                mismatches.append("{0}: recorded {1} replayed {2}".format(
+                                  "/".join(str(part) for part in key),
+                                  format_record(want).strip(), format_record(got).strip()))
+                break
+            matched += 1
+            late.append(want.time - got.time)
+        else:
+            if len(expected) > len(actual):
+                mismatches.append("{0}: recorded {1} outputs, replayed {2}".format(
+                                  "/".join(str(part) for part in key),
+                                  len(expected), len(actual)))
+            else:
+                extra += len(actual) - len(expected)
+
+    return matched, extra, mismatches, late
+
+# End def
+
+
+def record_games(path, games, seed, recall, resume=False):
+    """Write a trace of games simulated games (with the soak test player).
+
+    :param resume: play the games in two sessions sharing a state file,
+                   the second picking up the lockout or cooldown the first
+                   stopped in
+    """
+    import random
+    import shutil
+    import tempfile
+
+    import candy_game as game
+    import soak_game
+
+    random.seed(seed)
+    player     = soak_game.make_player(random.Random(seed), recall)
+    writer     = TraceWriter(path)
+    directory  = tempfile.mkdtemp() if resume else None
+    state_path = os.path.join(directory, "candy_game.state") if resume else None
+    sessions   = [(games + 1) // 2, games // 2] if resume else [games]
+    start      = 0.0
+
+    try:
+        for number, count in enumerate(sessions):
+            backend = hal.SimBackend(player, start_time=start)
+            game.setup_game(backend, trace=writer, state_path=state_path)
+            game.scheduler.call_later(0, game.display_setup)
+
+            played = 0
+            while played < count:
+                if game.step_game() == game.SHOW_PATTERN:
+                    played += 1
+
+            if number + 1 < len(sessions):
+                # Stop (as a crash would) where there are timers to pick up
+                while game.station.state not in (game.COOLDOWN, game.LOCKED):
+                    game.step_game()
+                game.station.save(sync=True)
+                game.game_loop.state_file.close()
+                start = backend.now()
+    finally:
+        writer.close()
+        if directory is not None:
+            shutil.rmtree(directory)
+
+# End def
+
+
+# ------------------------------------------------------------------------
+# Main script
+# ------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay and check candy game traces")
+    parser.add_argument("path", nargs="?", default="logs/candy_game.trace")
+    parser.add_argument("--dump", action="store_true", help="print the records")
+    parser.add_argument("-n", type=int, default=50, help="number of records to print")
+    parser.add_argument("--record", type=int, metavar="GAMES",
+                        help="write a trace of simulated games to path")
+    parser.add_argument("--resume", action="store_true",
+                        help="with --record: record a second session that "
+                             "resumes from the state file of the first")
+    parser.add_argument("--seed", type=int, default=301)
+    parser.add_argument("--recall", type=float, default=0.97)
+    args = parser.parse_args()
+
+    if args.record:
+        record_games(args.path, args.record, args.seed, args.recall, args.resume)
+
+    start    = time.perf_counter()
+    sessions = read_trace(args.path)
+    read     = time.perf_counter() - start
+
+    if args.dump:
+        for session in sessions:
+            print("session seed={0} started {1}".format(session.seed,
+                  time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(session.wall))))
+            for record in session.records[-args.n:]:
+                print(format_record(record))
+        sys.exit(0)
+
+    failed   = 0
+    records  = 0
+    hours    = 0.0
+    start    = time.perf_counter()
+
+    for session in sessions:
+        if session.continued:
+            print("session seed={0}: {1} records, continued from the previous file "
+                  "(not replayed)".format(session.seed, len(session.records)))
+            continue
+
+        replayed = replay_session(session)
+        matched, extra, mismatches, late = compare(session.records, replayed)
+        records += len(session.records)
+        if session.records:
+            hours += (session.records[-1].time - session.start) / 3600.0
+
+        late.sort()
+        print("session seed={0}: {1} records, {2} outputs match, {3} after the "
+              "end of the recording".format(session.seed, len(session.records), matched, extra))
+        if late:
+            print("    output late by p50 {0:.2f} ms  p99 {1:.2f} ms  max {2:.2f} ms".format(
+                  late[len(late) // 2] * 1e3, late[min(len(late) - 1, int(len(late) * 0.99))] * 1e3,
+                  late[-1] * 1e3))
+        for message in mismatches:
+            print("    MISMATCH " + message)
+        if mismatches:
+            failed += 1
+
+    elapsed = time.perf_counter() - start
+    print("{0} sessions, {1} records, {2:.1f} h of play checked in {3:.2f} s "
+          "(read {4:.2f} s)".format(len(sessions), records, hours, elapsed, read))
+    print("FAIL" if failed else "PASS")
+    sys.exit(1 if failed else 0)
+
@@ -0,0 +1,163 @@
+"""
+--------------------------------------------------------------------------
+Candy Game Soak Test
+--------------------------------------------------------------------------
+License:
+Copyright 2021 <Jessica Kies>
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors
+may be used to endorse or promote products derived from this software without
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+Candy Game Soak Test
+    Overview: Plays a large number of simulated rounds of the candy game
+    state machine and checks that memory use stays flat.
+
+    The game runs on the simulated hardware backend (hal.SimBackend) with a
+    virtual clock, so 100k rounds (years of cabinet time) take seconds.
+    The resident set size (RSS) is sampled as the rounds are played. The
+    test fails if RSS grows by more than --max-growth KiB after warm up.
+
+    Usage:
+        python3 soak_game.py [--rounds N] [--seed N] [--recall P]
+
+--------------------------------------------------------------------------
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+
+import candy_game as game
+import hal
+
+
+# ------------------------------------------------------------------------
+# Player
+# ------------------------------------------------------------------------
+
+def make_player(rng, recall):
+    """Return a player that gets each step right with probability recall."""
+
+    def player(buttons):
+        state = game.station.state
+
+        if state == game.IDLE:
+            buttons.press(game.START_BUTTON, rng.uniform(1, 600))
+
+        elif state == game.READ_INPUT:
+            for step in game.station.pattern:
+                if rng.random() >= recall:
+                    step = (step + 1) % 4
+                buttons.press(step, rng.uniform(0.2, 0.8))
+
+        elif state == game.COOLDOWN:
+            buttons.press(game.START_BUTTON, rng.uniform(1, 1500))
+
+        # Nothing is pressed while locked
+
+    return player
+
+# End def
+
+
+# ------------------------------------------------------------------------
+# Soak test
+# ------------------------------------------------------------------------
+
+def rss_kib():
+    """Return the resident set size of this process in KiB."""
+    with open("/proc/self/statm") as statm:
+        pages = int(statm.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") // 1024
+
+# End def
+
+
+def soak(rounds, seed, recall, samples=10):
+    """Play rounds rounds.
+
+    Returns a list of (round, rss, objects) samples and the simulated time.
+    """
+    rng     = random.Random(seed)
+    random.seed(seed)
+
+    backend = hal.SimBackend(make_player(rng, recall))
+    game.setup_game(backend)
+
+    results = []
+    played  = 0
+    every   = max(1, rounds // samples)
+
+    stdout     = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        while played < rounds:
+            if game.step_game() == game.SHOW_PATTERN:
+                played += 1
+                if (played % every) == 0:
+                    gc.collect()
+                    results.append((played, rss_kib(), len(gc.get_objects())))
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    return results, backend.now()
+
+# End def
+
+
+# ------------------------------------------------------------------------
+# Main script
+# ------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Candy game soak test")
+    parser.add_argument("--rounds", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=301)
+    parser.add_argument("--recall", type=float, default=0.97,
+                        help="chance the player gets each step right")
+    parser.add_argument("--max-growth", type=int, default=512,
+                        help="allowed RSS growth after warm up in KiB")
+    args = parser.parse_args()
+
+    results, sim_time = soak(args.rounds, args.seed, args.recall)
+
+    print("{0:>10} {1:>10} {2:>10}".format("round", "RSS KiB", "objects"))
+    for played, rss, objects in results:
+        print("{0:>10} {1:>10} {2:>10}".format(played, rss, objects))
+    print("simulated time: {0:.1f} days".format(sim_time / 86400))
+
+    # The first sample is the warm up
+    growth = results[-1][1] - results[0][1]
+    print("RSS growth after warm up: {0} KiB".format(growth))
+
+    if growth > args.max_growth:
+        print("FAIL")
+        sys.exit(1)
+
+    print("PASS")
+
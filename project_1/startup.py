@@ -0,0 +1,320 @@
+"""
+--------------------------------------------------------------------------
+Startup
+--------------------------------------------------------------------------
+License:
+Copyright 2021 <Jessica Kies>
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors
+may be used to endorse or promote products derived from this software without
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+Startup
+    Overview: Measures and signals the start up of the candy game.
+
+      - PROFILER marks how long after the process started each step of
+        start up finished (imports, buttons ready, set up done, ...).
+      - ImportTimer times every module imported while it is installed.
+      - notify_ready() tells whoever started the game that it is accepting
+        input: it writes READY_PATH and, under systemd, sends READY=1.
+
+    Running this file directly is the start up benchmark. It starts the
+    game in fresh processes (simulated hardware unless --board is given)
+    and reports the time to first input: from the process starting to the
+    start button being read.
+        python3 startup.py [--repeat N] [--board] [--imports]
+
+--------------------------------------------------------------------------
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+
+# ------------------------------------------------------------------------
+# Global Constants
+# ------------------------------------------------------------------------
+READY_PATH                   = "logs/ready"
+
+
+# ------------------------------------------------------------------------
+# Functions
+# ------------------------------------------------------------------------
+
+def read_process_age():
+    """Read the seconds since this process started from /proc (includes the
+    time python took to start). The kernel only keeps the start time to a 
+    clock tick (10 ms). Returns 0 when /proc is not available."""
+    try:
+        with open("/proc/self/stat") as stat:
+            # The command name can contain spaces, the fields start after ")"
+            fields = stat.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as uptime:
+            now = float(uptime.read().split()[0])
+        return max(0.0, now - int(fields[19]) / os.sysconf("SC_CLK_TCK"))
+    except (IOError, OSError, IndexError, ValueError):
+        return 0.0
+
+# End def
+
+
+def process_age():
+    """Return the seconds since this process started.
+    
+    /proc is only read once, when this module is imported. After that the
+    monotonic clock is used, so the steps are timed to the microsecond.
+    """
+    return START_AGE + (time.monotonic() - IMPORT_TIME)
+
+# End def
+
+
+def forked():
+    """Time the start up from now on. Called in a process forked from one
+    that had already imported the game (see supervisor.py), where the 
+    process start time is the start of the parent."""
+    global IMPORT_TIME
+    global START_AGE
+
+    IMPORT_TIME = time.monotonic()
+    START_AGE   = 0.0
+    del PROFILER.marks[:]
+
+# End def
+
+
+def notify_ready(path=READY_PATH, **info):
+    """Signal that the game is accepting input.
+
+    Writes info (and the time to first input) as JSON to path and sends
+    READY=1 to systemd when NOTIFY_SOCKET is set.
+    """
+    info["time_to_input"] = round(process_age(), 3)
+    info["pid"]           = os.getpid()
+
+    if path is not None:
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(path + ".tmp", "w") as ready_file:
+            json.dump(info, ready_file)
+        os.replace(path + ".tmp", path)
+
+    address = os.environ.get("NOTIFY_SOCKET")
+    if address:
+        import socket
+
+        if address.startswith("@"):
+            address = "\0" + address[1:]
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            sock.sendto(b"READY=1", address)
+        finally:
+            sock.close()
+
+# End def
+
+
+# ------------------------------------------------------------------------
+# Profiler
+# ------------------------------------------------------------------------
+
+class Profiler(object):
+    """Records when each start up step finished."""
+
+    def __init__(self):
+        self.marks = []
+
+    # End def
+
+    def mark(self, name):
+        """Record that step name just finished."""
+        self.marks.append((name, process_age()))
+
+    # End def
+
+    def as_dict(self):
+        """Return {step: seconds since process start} rounded to ms."""
+        return dict((name, round(seconds, 3)) for name, seconds in self.marks)
+
+    # End def
+
+# End class
+
+
+class ImportTimer(object):
+    """Meta path finder that times how long each module takes to import.
+
+    Times include the modules imported by the module.
+    """
+
+    def __init__(self):
+        self.times = []
+
+    # End def
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        sys.meta_path.remove(self)
+
+    def find_spec(self, name, path, target=None):
+        """Find the module with the other finders and time its loading."""
+        for finder in sys.meta_path:
+            if (finder is self) or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+
+        loader = spec.loader
+        if (loader is None) or not hasattr(loader, "exec_module"):
+            return spec
+
+        exec_module = loader.exec_module
+        times       = self.times
+
+        def timed_exec_module(module):
+            start = time.perf_counter()
+            try:
+                exec_module(module)
+            finally:
+                times.append((name, time.perf_counter() - start))
+
+        # Only this load goes through the timer
+        class TimedLoader(object):
+            def __getattr__(self, attr):
+                return getattr(loader, attr)
+
+            def create_module(self, spec):
+                return loader.create_module(spec)
+
+            def exec_module(self, module):
+                timed_exec_module(module)
+
+        spec.loader = TimedLoader()
+        return spec
+
+    # End def
+
+# End class
+
+
+IMPORT_TIME                  = time.monotonic()
+START_AGE                    = read_process_age()
+PROFILER                     = Profiler()
+
+
+# ------------------------------------------------------------------------
+# Benchmark
+# ------------------------------------------------------------------------
+
+def start_once(board, imports):
+    """Start the game up to the point it reads the start button and print
+    the profile as JSON."""
+    timer = ImportTimer()
+    if imports:
+        timer.install()
+
+    # The game marks its steps on the startup module it imports, which is
+    # not this one when this file is run as a script
+    import startup
+    import candy_game
+    import hal
+
+    if imports:
+        timer.uninstall()
+
+    backend = None if board else hal.SimBackend()
+    ready   = {}
+
+    def on_ready():
+        ready["time_to_input"] = process_age()
+
+    candy_game.setup_game(backend, on_ready=on_ready)
+
+    print(json.dumps({"marks": startup.PROFILER.marks, "imports": timer.times,
+                      "time_to_input": ready["time_to_input"]}))
+
+# End def
+
+
+# ------------------------------------------------------------------------
+# Main script
+# ------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Candy game start up benchmark")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="number of fresh processes to start")
+    parser.add_argument("--board", action="store_true",
+                        help="use the real hardware instead of the simulation")
+    parser.add_argument("--imports", action="store_true",
+                        help="show the slowest imports")
+    parser.add_argument("--once", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.once:
+        start_once(args.board, args.imports)
+        sys.exit(0)
+
+    import subprocess
+
+    command = [sys.executable, os.path.abspath(__file__), "--once"]
+    if args.board:
+        command.append("--board")
+    if args.imports:
+        command.append("--imports")
+
+    runs = []
+    for i in range(args.repeat):
+        output = subprocess.check_output(command, cwd=os.path.dirname(os.path.abspath(__file__)))
+        runs.append(json.loads(output.decode().strip().splitlines()[-1]))
+
+    # Show the profile of the median run
+    runs.sort(key=lambda run: run["time_to_input"])
+    median = runs[len(runs) // 2]
+
+    print("start up profile (median of {0} runs):".format(len(runs)))
+    last = 0.0
+    for name, seconds in median["marks"]:
+        print("    {0:<20} {1:>8.1f} ms  (+{2:.1f} ms)".format(
+              name, seconds * 1000, (seconds - last) * 1000))
+        last = seconds
+
+    if args.imports:
+        print("slowest imports:")
+        for name, seconds in sorted(median["imports"], key=lambda item: -item[1])[:10]:
+            print("    {0:<30} {1:>8.1f} ms".format(name, seconds * 1000))
+
+    times = [run["time_to_input"] * 1000 for run in runs]
+    print("time to first input: min {0:.1f} ms  median {1:.1f} ms  max {2:.1f} ms".format(
+          times[0], times[len(times) // 2], times[-1]))
+
@@ -0,0 +1,330 @@
+"""
+--------------------------------------------------------------------------
+State File
+--------------------------------------------------------------------------
+License:
+Copyright 2021 <Jessica Kies>
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors
+may be used to endorse or promote products derived from this software without
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+State File
+    Overview: Keeps the timers of the candy game (the lockout after a loss
+    and the difficulty after a win) in a small memory mapped file, so a
+    crash, a restart or a power cycle does not forget them.
+
+      - Every station has two slots. A save writes the slot that does not
+        hold the newest record, with a sequence number and a CRC, so a save
+        cut off half way (a crash, or power lost while the page was being
+        written) leaves the other slot whole. Loading takes the newest slot
+        whose CRC matches.
+      - A save only writes to the mapped page. The page is written to the
+        SD card (msync) by a timer every SYNC_INTERVAL seconds if anything
+        changed, so a busy game does not wear the card. A save can ask for
+        the page to be written right away (the game does for a lockout).
+      - Times are saved on the monotonic clock of the game, with the boot
+        id and a (monotonic, wall clock) pair taken at the save. After a
+        restart in the same boot the monotonic clock has gone on counting,
+        so the times are used as they are. After a reboot they are moved
+        to the new monotonic clock by the wall clock time that passed while
+        the board was off. The PocketBeagle has no RTC: until NTP sets it,
+        the wall clock starts from an old date, and then the time off is
+        taken as 0 (a lockout goes on from where it was, it is never cut).
+
+    Running this file directly prints the records in a state file (it is
+    opened read only, and never changed):
+        python3 state_file.py [logs/candy_game.state]
+
+--------------------------------------------------------------------------
+"""
+import argparse
+import collections
+import mmap
+import os
+import struct
+import sys
+import time
+import zlib
+
+
+# ------------------------------------------------------------------------
+# Global Constants
+# ------------------------------------------------------------------------
+MAGIC                        = b"CGSTATE1"
+HEADER_SIZE                  = 16
+SLOT_SIZE                    = 128
+SYNC_INTERVAL                = 30                # seconds between msyncs
+
+BOOT_ID_PATH                 = "/proc/sys/kernel/random/boot_id"
+NO_BOOT_ID                   = b"\0" * 16
+
+# Wall clock times before this are a board whose clock is not set yet
+# (2021-01-01)
+MIN_WALL_TIME                = 1609459200
+
+# sequence, state, win time, again time, lose time, monotonic and wall 
+# clock time of the save, boot id; then the CRC32 of all of that
+RECORD                       = struct.Struct("<QB7x5d16s")
+CRC                          = struct.Struct("<I")
+
+Saved = collections.namedtuple("Saved", ["state", "win_time", "again_time", "lose_time"])
+
+
+# ------------------------------------------------------------------------
+# Functions
+# ------------------------------------------------------------------------
+
+def read_boot_id(path=BOOT_ID_PATH):
+    """Return the id of this boot (16 bytes), or NO_BOOT_ID if it is not 
+    known."""
+    try:
+        with open(path) as boot_id:
+            return bytes.fromhex(boot_id.read().strip().replace("-", ""))
+    except (IOError, OSError, ValueError):
+        return NO_BOOT_ID
+
+# End def
+
+
+def wall_clock_set(wall):
+    """Return True if wall looks like a time from a set clock."""
+    return wall >= MIN_WALL_TIME
+
+# End def
+
+
+# ------------------------------------------------------------------------
+# State File
+# ------------------------------------------------------------------------
+
+class StateFile(object):
+    """A memory mapped file with the saved timers of a number of stations."""
+
+    def __init__(self, path, stations, clock=time.monotonic, wall=time.time,
+                 boot_id=None, scheduler=None, sync_interval=SYNC_INTERVAL,
+                 read_only=False):
+        """Open (or create) path.
+
+        :param stations:  number of stations (two slots each)
+        :param clock:     monotonic clock the saved times are on
+        :param wall:      wall clock
+        :param boot_id:   id of this boot (default is read from /proc)
+        :param scheduler: scheduler.Scheduler for the msync timer (None: 
+                          only msync when asked)
+        :param read_only: open an existing file to read it, as it is
+        
+        Will throw a ValueError if read_only and path is not a state file
+        (an OSError if it cannot be opened).
+        """
+        self.path    = path
+        self.clock   = clock
+        self.wall    = wall
+        self.boot_id = read_boot_id() if boot_id is None else boot_id
+        self.dirty   = False
+        self.syncs   = 0
+
+        if read_only:
+            self._open_read_only(path)
+            return
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        size      = HEADER_SIZE + stations * 2 * SLOT_SIZE
+        size      = -(-size // mmap.PAGESIZE) * mmap.PAGESIZE
+        self.fd   = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(self.fd).st_size < size:
+                os.ftruncate(self.fd, size)        # new space reads as zeros
+            self.map = mmap.mmap(self.fd, size)
+        except:
+            os.close(self.fd)
+            raise
+
+        if self.map[:len(MAGIC)] != MAGIC:
+            self.map[:] = bytes(size)
+            self.map[:len(MAGIC)] = MAGIC
+            self.dirty = True
+            self.sync()
+
+        if scheduler is not None:
+            scheduler.call_every(sync_interval, self.sync, name="state")
+
+    # End def
+
+    def _open_read_only(self, path):
+        """Map path read only, checking that it is a state file."""
+        self.fd = os.open(path, os.O_RDONLY)
+        try:
+            size = os.fstat(self.fd).st_size
+            if size < HEADER_SIZE + 2 * SLOT_SIZE:
+                raise ValueError("not a candy game state file (too small)")
+            self.map = mmap.mmap(self.fd, size, access=mmap.ACCESS_READ)
+            if self.map[:len(MAGIC)] != MAGIC:
+                self.map.close()
+                raise ValueError("not a candy game state file")
+        except:
+            os.close(self.fd)
+            raise
+
+    # End def
+
+    def stations(self):
+        """Return the number of stations the file has room for."""
+        return (len(self.map) - HEADER_SIZE) // (2 * SLOT_SIZE)
+
+    # End def
+
+    def _slots(self, station):
+        """Return the offsets of the two slots of station."""
+        first = HEADER_SIZE + station * 2 * SLOT_SIZE
+        return (first, first + SLOT_SIZE)
+
+    # End def
+
+    def _read(self, offset):
+        """Return the record at offset as a tuple, or None if it is empty or
+        its CRC does not match."""
+        end    = offset + RECORD.size
+        data   = self.map[offset:end]
+        crc,   = CRC.unpack_from(self.map, end)
+        record = RECORD.unpack(data)
+        if (record[0] == 0) or (zlib.crc32(data) != crc):
+            return None
+        return record
+
+    # End def
+
+    def _newest(self, station):
+        """Return (offset, record) of the newest whole slot of station, or
+        (None, None) if it has none."""
+        best = (None, None)
+        for offset in self._slots(station):
+            record = self._read(offset)
+            if (record is not None) and ((best[1] is None) or (record[0] > best[1][0])):
+                best = (offset, record)
+        return best
+
+    # End def
+
+    def save(self, station, state, win_time, again_time, lose_time, sync=False):
+        """Save the timers of station.
+
+        :param state: number of the state the station is in
+        :param sync:  write the page to the card now instead of on the timer
+        """
+        offset, record = self._newest(station)
+        first, second  = self._slots(station)
+        sequence       = 1
+        target         = first
+        if record is not None:
+            sequence = record[0] + 1
+            target   = second if offset == first else first
+
+        data = RECORD.pack(sequence, state, win_time, again_time, lose_time,
+                           self.clock(), self.wall(), self.boot_id)
+        self.map[target:target + RECORD.size + CRC.size] = data + CRC.pack(zlib.crc32(data))
+        self.dirty = True
+
+        if sync:
+            self.sync()
+
+    # End def
+
+    def load(self, station):
+        """Return the Saved timers of station moved to this clock, or None
+        if nothing was saved."""
+        offset, record = self._newest(station)
+        if record is None:
+            return None
+
+        sequence, state, win_time, again_time, lose_time, mono, wall, boot_id = record
+
+        if (boot_id == self.boot_id) and (boot_id != NO_BOOT_ID):
+            # Same boot: the monotonic clock went on counting
+            shift = 0.0
+        else:
+            now_wall = self.wall()
+            off      = 0.0
+            if wall_clock_set(wall) and wall_clock_set(now_wall):
+                off  = max(0.0, now_wall - wall)
+            # The save was off seconds ago
+            shift    = (self.clock() - off) - mono
+
+        return Saved(state, win_time + shift, again_time + shift, lose_time + shift)
+
+    # End def
+
+    def sync(self):
+        """Write the page to the card if anything changed since the last time."""
+        if self.dirty:
+            self.map.flush()
+            self.dirty  = False
+            self.syncs += 1
+
+    # End def
+
+    def close(self):
+        """Write what is left and close the file."""
+        self.sync()
+        self.map.close()
+        os.close(self.fd)
+
+    # End def
+
+# End class
+
+
+# ------------------------------------------------------------------------
+# Main script
+# ------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Print a candy game state file")
+    parser.add_argument("path", nargs="?", default="logs/candy_game.state")
+    args = parser.parse_args()
+
+    try:
+        state_file = StateFile(args.path, 0, read_only=True)
+    except (OSError, ValueError) as error:
+        print("Cannot read {0}: {1}".format(args.path, getattr(error, "strerror", None) or error))
+        sys.exit(1)
+
+    try:
+        for station in range(state_file.stations()):
+            offset, record = state_file._newest(station)
+            if record is None:
+                continue
+            saved = state_file.load(station)
+            now   = state_file.clock()
+            print("station {0}: save {1} at {2}, state {3}, last win {4:.0f} s ago, "
+                  "lost {5:.0f} s ago".format(
+                  station, record[0],
+                  time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record[6])),
+                  saved.state, now - saved.win_time, now - saved.lose_time))
+    finally:
+        state_file.close()
@@ -0,0 +1,269 @@
+"""
+--------------------------------------------------------------------------
+Supervisor
+--------------------------------------------------------------------------
+License:
+Copyright 2021 <Jessica Kies>
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors
+may be used to endorse or promote products derived from this software without
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+Supervisor
+    Overview: Runs the candy game and starts it again right away when it
+    dies.
+
+    The supervisor imports the game once and then forks a child process to
+    run it. A new child starts from the modules that are already imported,
+    so all it has to do is set up the hardware: the buttons are read again
+    a few tens of milliseconds after a crash, instead of after a new python
+    start (and the wait in run_candy_game.sh). The child picks up the
+    lockout and difficulty timers from the state file (see state_file.py).
+
+      - A child that dies within HEALTHY_TIME seconds of starting is 
+        started again after a delay that doubles every time (up to 
+        MAX_DELAY), so a game that cannot start does not spin.
+      - A child that exits without an error (it was stopped) is not 
+        started again.
+      - SIGTERM and SIGINT are passed on to the child.
+
+    Usage:
+        python3 supervisor.py               run the game
+        python3 supervisor.py --bench N     crash a simulated game N times
+                                            and time the restarts
+
+--------------------------------------------------------------------------
+"""
+import argparse
+import os
+import signal
+import sys
+import time
+import traceback
+
+import startup
+
+
+# ------------------------------------------------------------------------
+# Global Constants
+# ------------------------------------------------------------------------
+RESTART_DELAY                = 0.1               # seconds, first restart
+MAX_DELAY                    = 10.0
+HEALTHY_TIME                 = 60.0              # resets the delay
+
+
+# ------------------------------------------------------------------------
+# Supervisor
+# ------------------------------------------------------------------------
+
+def log(message):
+    """Write a line to stderr (the cron log)."""
+    sys.stderr.write("{0} supervisor: {1}\n".format(
+                     time.strftime("%Y-%m-%d %H:%M:%S"), message))
+    sys.stderr.flush()
+
+# End def
+
+
+def run_child(target):
+    """Run target() in this (forked) process and exit with its status."""
+    status = 1
+    try:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        startup.forked()
+        target()
+        status = 0
+    except SystemExit as error:
+        status = error.code if isinstance(error.code, int) else 1
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(status)
+
+# End def
+
+
+def supervise(target, delay=RESTART_DELAY, max_delay=MAX_DELAY,
+              healthy_time=HEALTHY_TIME, restarts=None, on_exit=None):
+    """Run target() in a child process, and again whenever it dies.
+
+    :param restarts: return after this many restarts (None: never)
+    :param on_exit:  function called with (pid, status, seconds it ran)
+                     each time a child exits
+
+    Returns the exit status of the last child.
+    """
+    child    = [None]
+    stopping = [False]
+
+    def forward(signum, frame):
+        stopping[0] = True
+        if child[0] is not None:
+            try:
+                os.kill(child[0], signum)
+            except OSError:
+                pass
+
+    old_handlers = [(signum, signal.signal(signum, forward))
+                    for signum in (signal.SIGTERM, signal.SIGINT)]
+    wait = delay
+
+    try:
+        while True:
+            started  = time.monotonic()
+            child[0] = os.fork()
+            if child[0] == 0:
+                run_child(target)
+
+            pid, status = os.waitpid(child[0], 0)
+            ran         = time.monotonic() - started
+            child[0]    = None
+            if on_exit is not None:
+                on_exit(pid, status, ran)
+
+            if stopping[0] or (os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0):
+                return status
+            if restarts is not None:
+                if restarts == 0:
+                    return status
+                restarts -= 1
+
+            if ran >= healthy_time:
+                wait = delay
+            if on_exit is None:
+                log("game exited with status {0} after {1:.1f} s, restarting in "
+                    "{2:.2f} s".format(status, ran, wait))
+            time.sleep(wait)
+            wait = min(max_delay, wait * 2)
+    finally:
+        for signum, handler in old_handlers:
+            signal.signal(signum, handler)
+
+# End def
+
+
+# ------------------------------------------------------------------------
+# Benchmark
+# ------------------------------------------------------------------------
+
+def crash_game(path, report, seed):
+    """Start the game on simulated hardware with the state file at path and
+    write a line to the file descriptor report: the time the buttons were
+    ready, the time setup finished, the state and the lockout left. Then
+    lose a game if the station is not locked, and crash.
+
+    The game runs on the simulated clock, started at the real monotonic
+    time, so the lockout of the first child ends about a round after the
+    real time it was saved at.
+    """
+    import candy_game as game
+    import hal
+
+    def player(buttons):
+        station = game.station
+        if station.state == game.IDLE:
+            buttons.press(game.START_BUTTON, 0.1)
+        elif station.state == game.READ_INPUT:
+            for step in station.pattern:
+                buttons.press((step + 1) % 4, 0.2)
+
+    ready = []
+    backend = hal.SimBackend(player, start_time=time.monotonic())
+    game.setup_game(backend, seed=seed, state_path=path,
+                    on_ready=lambda: ready.append(time.monotonic()))
+    restored = time.monotonic()
+    station  = game.station
+    os.write(report, "{0!r} {1!r} {2} {3!r}\n".format(
+             ready[0], restored, station.state, station.lockout_remaining()).encode())
+
+    while station.state != game.LOCKED:
+        game.step_game()
+
+    # The state file is not closed; nothing else is either
+    os._exit(1)
+
+# End def
+
+
+# ------------------------------------------------------------------------
+# Main script
+# ------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the candy game and restart it when it dies")
+    parser.add_argument("--bench", type=int, metavar="N",
+                        help="crash a simulated game N times and time the restarts")
+    parser.add_argument("--delay", type=float, default=RESTART_DELAY,
+                        help="seconds to wait before a restart")
+    parser.add_argument("--seed", type=int, default=301)
+    args = parser.parse_args()
+
+    # Imported once here; every child starts with it imported, and with
+    # the number frames of the display already built
+    import candy_game
+    candy_game.display_renderer.number_frame(0)
+
+    if args.bench is None:
+        sys.exit(1 if supervise(candy_game.main, args.delay) else 0)
+
+    import shutil
+    import tempfile
+
+    root          = tempfile.mkdtemp()
+    read_fd, report = os.pipe()
+    exits         = []
+    try:
+        supervise(lambda: crash_game(os.path.join(root, "candy_game.state"), report, args.seed),
+                  args.delay, args.delay, restarts=args.bench,
+                  on_exit=lambda pid, status, ran: exits.append(time.monotonic()))
+        os.close(report)
+        with os.fdopen(read_fd) as lines:
+            runs = [line.split() for line in lines]
+    finally:
+        shutil.rmtree(root)
+
+    print("{0:>5} {1:>14} {2:>14} {3:>14} {4:>16}".format(
+          "run", "buttons ready", "restored", "state", "lockout left"))
+    ready_times = []
+    for index, (ready, restored, state, remaining) in enumerate(runs):
+        ready, restored = float(ready), float(restored)
+        if index == 0:
+            print("{0:>5} {1:>14} {2:>14} {3:>14} {4:>14.1f} s".format(
+                  index, "-", "-", state, float(remaining)))
+            continue
+        # Time from the crash (the supervisor seeing the child exit)
+        ready_times.append(ready - exits[index - 1])
+        print("{0:>5} {1:>11.1f} ms {2:>11.1f} ms {3:>14} {4:>14.1f} s".format(
+              index, (ready - exits[index - 1]) * 1e3, (restored - exits[index - 1]) * 1e3,
+              state, float(remaining)))
+
+    if ready_times:
+        ready_times.sort()
+        print("restart to buttons ready: p50 {0:.1f} ms  max {1:.1f} ms "
+              "(including the {2:.0f} ms restart delay)".format(
+              ready_times[len(ready_times) // 2] * 1e3, ready_times[-1] * 1e3, args.delay * 1e3))
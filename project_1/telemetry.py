@@ -0,0 +1,278 @@
+"""
+--------------------------------------------------------------------------
+Telemetry
+--------------------------------------------------------------------------
+License:
+Copyright 2021 <Jessica Kies>
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors
+may be used to endorse or promote products derived from this software without
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+Telemetry
+    Overview: Structured event log for the candy game. Events (state
+    changes, wins, losses, dispenses, errors) go into an in-memory ring
+    buffer and are written to the log file in one batch on a timer, instead
+    of a print to the cron log for every message.
+
+      - The same event repeated within REPEAT_WINDOW seconds is counted
+        instead of stored, and written once as a "repeat" event.
+      - The log file is rotated when it grows past max_bytes, keeping
+        BACKUPS old files (candy_game.log.1, .2, ...).
+      - Without a path the events are only kept in memory.
+
+    Each line of the log file is one JSON object:
+        {"time": <wall clock>, "mono": <monotonic>, "kind": ..., <fields>}
+
+    Running this file directly dumps the most recent events:
+        python3 telemetry.py [logs/candy_game.log] [-n 50] [--kind KIND]
+
+--------------------------------------------------------------------------
+"""
+import argparse
+import collections
+import json
+import os
+import time
+
+
+# ------------------------------------------------------------------------
+# Global Constants
+# ------------------------------------------------------------------------
+CAPACITY                     = 256               # events kept in memory
+FLUSH_INTERVAL               = 60                # seconds between writes
+MAX_BYTES                    = 256 * 1024        # size before rotating
+BACKUPS                      = 2
+REPEAT_WINDOW                = 10                # seconds
+
+Event = collections.namedtuple("Event", ["time", "mono", "kind", "fields"])
+
+
+# ------------------------------------------------------------------------
+# Event Log
+# ------------------------------------------------------------------------
+
+class EventLog(object):
+    """Ring buffer of events that is written to a file in batches."""
+
+    def __init__(self, path=None, scheduler=None, capacity=CAPACITY,
+                 flush_interval=FLUSH_INTERVAL, max_bytes=MAX_BYTES,
+                 backups=BACKUPS, repeat_window=REPEAT_WINDOW):
+        """Create the log.
+
+        :param path:      log file, or None to keep events only in memory
+        :param scheduler: scheduler.Scheduler used for the flush timer and
+                          the monotonic clock (None: flush only when asked)
+        """
+        self.path          = path
+        self.scheduler     = scheduler
+        self.events        = collections.deque(maxlen=capacity)
+        self.unflushed     = 0
+        self.dropped       = 0
+        self.max_bytes     = max_bytes
+        self.backups       = backups
+        self.repeat_window = repeat_window
+
+        self.last_key      = None
+        self.last_time     = 0.0
+        self.repeats       = 0
+        self.file          = None
+
+        if scheduler is not None:
+            self.clock = scheduler.now
+            if path is not None:
+                scheduler.call_every(flush_interval, self.flush, name="telemetry")
+        else:
+            self.clock = time.monotonic
+
+    # End def
+
+    def log(self, kind, **fields):
+        """Record an event. Only a tuple is stored; nothing is written."""
+        mono = self.clock()
+        key  = (kind, tuple(sorted(fields.items())))
+
+        if (key == self.last_key) and (mono - self.last_time < self.repeat_window):
+            self.repeats  += 1
+            self.last_time = mono
+            return
+
+        self._end_repeats()
+        self.last_key  = key
+        self.last_time = mono
+        self._append(Event(time.time(), mono, kind, fields))
+
+    # End def
+
+    def _append(self, event):
+        """Add an event to the ring buffer."""
+        if self.unflushed == self.events.maxlen:
+            self.dropped += 1
+        else:
+            self.unflushed += 1
+        self.events.append(event)
+
+    # End def
+
+    def _end_repeats(self):
+        """Store the count of repeats of the last event, if there were any."""
+        if self.repeats:
+            kind, fields = self.last_key
+            self._append(Event(time.time(), self.last_time, "repeat",
+                               {"event": kind, "count": self.repeats}))
+            self.repeats = 0
+
+    # End def
+
+    def recent(self, count=None):
+        """Return up to count of the most recent events (oldest first)."""
+        events = list(self.events)
+        if count is not None:
+            events = events[-count:]
+        return events
+
+    # End def
+
+    def flush(self):
+        """Write the events logged since the last flush in one write."""
+        self._end_repeats()
+        self.last_key = None
+
+        if (self.path is None) or (self.unflushed == 0):
+            self.unflushed = 0
+            return
+
+        lines = []
+        if self.dropped:
+            lines.append(json.dumps({"time": time.time(), "mono": self.clock(),
+                                     "kind": "dropped", "count": self.dropped}))
+            self.dropped = 0
+
+        for event in list(self.events)[-self.unflushed:]:
+            record = {"time": round(event.time, 3), "mono": round(event.mono, 3),
+                      "kind": event.kind}
+            record.update(event.fields)
+            lines.append(json.dumps(record))
+        self.unflushed = 0
+
+        if self.file is None:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            self.file = open(self.path, "a")
+
+        self.file.write("\n".join(lines) + "\n")
+        self.file.flush()
+
+        if self.file.tell() >= self.max_bytes:
+            self.rotate()
+
+    # End def
+
+    def rotate(self):
+        """Move candy_game.log to candy_game.log.1 (and .1 to .2, ...)."""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists("{0}.{1}".format(self.path, i)):
+                os.replace("{0}.{1}".format(self.path, i),
+                           "{0}.{1}".format(self.path, i + 1))
+
+        if self.backups > 0:
+            os.replace(self.path, self.path + ".1")
+        else:
+            os.remove(self.path)
+
+    # End def
+
+    def close(self):
+        """Write what is left and close the file."""
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    # End def
+
+# End class
+
+
+# ------------------------------------------------------------------------
+# Reader
+# ------------------------------------------------------------------------
+
+def read_events(path, backups=BACKUPS):
+    """Return the events in path and its backups, oldest first."""
+    events = []
+    files  = ["{0}.{1}".format(path, i) for i in range(backups, 0, -1)] + [path]
+
+    for name in files:
+        if not os.path.exists(name):
+            continue
+        with open(name) as log_file:
+            for line in log_file:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    pass                # partly written line
+
+    return events
+
+# End def
+
+
+def format_event(record):
+    """Format one event as a line of text."""
+    record = dict(record)
+    stamp  = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record.pop("time", 0)))
+    record.pop("mono", None)
+    kind   = record.pop("kind", "?")
+    fields = " ".join("{0}={1}".format(key, value) for key, value in sorted(record.items()))
+
+    return "{0}  {1:<10} {2}".format(stamp, kind, fields)
+
+# End def
+
+
+# ------------------------------------------------------------------------
+# Main script
+# ------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Dump recent candy game events")
+    parser.add_argument("path", nargs="?", default="logs/candy_game.log")
+    parser.add_argument("-n", type=int, default=50, help="number of events")
+    parser.add_argument("--kind", help="only show events of this kind")
+    args = parser.parse_args()
+
+    events = read_events(args.path)
+    if args.kind:
+        events = [event for event in events if event.get("kind") == args.kind]
+
+    for event in events[-args.n:]:
+        print(format_event(event))
+
@@ -0,0 +1,177 @@
+"""
+--------------------------------------------------------------------------
+BOM Cost Command
+--------------------------------------------------------------------------
+License:
+Copyright 2021 <Jessica Kies>
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors
+may be used to endorse or promote products derived from this software without
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+BOM Cost Command
+    Overview: Prints the cost of building this project's board (or any
+    design given) in a number of boards, from a price list.
+
+    --detail N also prints every costed item of a build of N boards.
+    --bench N times parsing, the cache and quoting N build sizes at once,
+    against parsing and quoting each of them on its own.
+
+--------------------------------------------------------------------------
+"""
+import argparse
+import glob
+import os
+import time
+
+import numpy
+
+from . import design
+from . import quote
+
+
+# ------------------------------------------------------------------------
+# Global Constants
+# ------------------------------------------------------------------------
+PACKAGE_DIR                  = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR                  = os.path.dirname(PACKAGE_DIR)
+
+BOM                          = os.path.join(PROJECT_DIR, "301 Project BOM")
+PNP                          = sorted(glob.glob(os.path.join(
+                                   PROJECT_DIR, "Project2EagleFiles", "MFG", "CAMOutputs",
+                                   "Assembly", "PnP_*.txt")))
+PRICES                       = os.path.join(PACKAGE_DIR, "prices.csv")
+BUILDS                       = [1, 10, 100, 1000]
+
+
+# ------------------------------------------------------------------------
+# Functions
+# ------------------------------------------------------------------------
+
+def boards(text):
+    """argparse type of a build size: a whole number of boards, at least 1."""
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError("a build is at least 1 board, not {0}".format(text))
+    return value
+
+# End def
+
+
+def report(plan, result, detail=None):
+    """Print a quote (and the items of the build of detail boards)."""
+    print("{0:>8} {1:>12} {2:>12}".format("boards", "total", "per board"))
+    for (builds, total, per_board) in zip(result.builds, result.total, result.per_board):
+        print("{0:>8.0f} {1:>12.2f} {2:>12.3f}".format(builds, total, per_board))
+
+    if detail is not None:
+        single = quote.quote(plan, [detail])
+        print("")
+        print("{0} boards:".format(detail))
+        print("    {0:<6} {1:<40} {2:>8} {3:>10} {4:>10}".format(
+              "kind", "item", "bought", "unit", "cost"))
+        for item in range(len(plan.labels)):
+            print("    {0:<6} {1:<40} {2:>8.0f} {3:>10.4f} {4:>10.2f}".format(
+                  plan.kinds[item], plan.labels[item], single.bought[item, 0],
+                  single.unit[item, 0], single.cost[item, 0]))
+
+    if plan.unpriced:
+        print("")
+        print("No part price for: {0}".format(", ".join(plan.unpriced)))
+
+# End def
+
+
+def bench(bom, pnp, prices, count):
+    """Time count build sizes quoted at once against one at a time."""
+    builds = numpy.arange(1, count + 1)
+    repeat = 20
+
+    start = time.perf_counter()
+    for i in range(repeat):
+        parsed = design.Design.parse(bom, pnp)
+    parse_time = (time.perf_counter() - start) / repeat
+
+    cache = design.DesignCache()
+    cache.get(bom, pnp)
+    start = time.perf_counter()
+    for i in range(repeat):
+        (parsed, index) = cache.get(bom, pnp)
+    cached_time = (time.perf_counter() - start) / repeat
+
+    price_list = quote.read_prices(prices)
+    plan  = quote.plan(parsed, index, price_list)          # first use imports parts of NumPy
+    start = time.perf_counter()
+    for i in range(repeat):
+        plan = quote.plan(parsed, index, price_list)
+    plan_time = (time.perf_counter() - start) / repeat
+
+    start = time.perf_counter()
+    for i in range(repeat):
+        quote.quote(plan, builds)
+    batch_time = (time.perf_counter() - start) / repeat
+
+    start = time.perf_counter()
+    for boards in builds:
+        parsed = design.Design.parse(bom, pnp)
+        single = quote.quote(quote.plan(parsed, design.Index(parsed), quote.read_prices(prices)),
+                             [boards])
+    single_time = time.perf_counter() - start
+
+    print("parse design             {0:>10.3f} ms".format(parse_time * 1e3))
+    print("cached design            {0:>10.3f} ms".format(cached_time * 1e3))
+    print("plan (match price list)  {0:>10.3f} ms".format(plan_time * 1e3))
+    print("{0:>5} builds at once     {1:>10.3f} ms".format(count, batch_time * 1e3))
+    print("{0:>5} builds one by one  {1:>10.3f} ms (parse, plan and quote each)".format(
+          count, single_time * 1e3))
+
+# End def
+
+
+# ------------------------------------------------------------------------
+# Main script
+# ------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog="bom_cost", description="Cost a build from a price list")
+    parser.add_argument("--bom", default=BOM, help="EAGLE part list")
+    parser.add_argument("--pnp", nargs="*", default=PNP, help="pick and place files")
+    parser.add_argument("--prices", default=PRICES, help="price list (CSV)")
+    parser.add_argument("--builds", type=boards, nargs="+", default=BUILDS,
+                        help="numbers of boards to quote")
+    parser.add_argument("--detail", type=boards, help="print the items of this build")
+    parser.add_argument("--cache", help="directory to keep parsed designs in")
+    parser.add_argument("--bench", type=boards, metavar="N",
+                        help="time quoting N build sizes")
+    args = parser.parse_args()
+
+    if args.bench:
+        bench(args.bom, args.pnp, args.prices, args.bench)
+    else:
+        design.cache.directory = args.cache
+        (parsed, index) = design.load_design(args.bom, args.pnp)
+        plan = quote.plan(parsed, index, quote.read_prices(args.prices))
+        report(plan, quote.quote(plan, args.builds), args.detail)
+
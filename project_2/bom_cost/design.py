@@ -0,0 +1,350 @@
+"""
+--------------------------------------------------------------------------
+Design Tables
+--------------------------------------------------------------------------
+License:
+Copyright 2021 <Jessica Kies>
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors
+may be used to endorse or promote products derived from this software without
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+Design Tables
+    Overview: Reads a design's EAGLE part list (BOM) and pick and place
+    files into a columnar table, indexes it by value, package and MPN,
+    and caches it by the content of its files.
+
+    A Design holds NumPy arrays, one entry per BOM line:
+      - quantity:   parts per board
+      - value, device, package, mpn: codes into Design.strings
+      - placements: parts of the line in the pick and place files (the
+                    machine placed, SMT, parts)
+    and per part (reference designator): its name and its BOM line.
+
+    The part list is fixed width: each column starts where its name
+    starts in the header line ("Qty Value Device ..."), and the last one
+    runs to the end of the line. Attribute columns of the same name but
+    another case ("Package" and "PACKAGE") are kept apart.
+
+    DesignCache keeps parsed designs by the SHA-256 of their files, in
+    memory (least recently used first out) and, if it has a directory, as
+    .npz files there, so a design is only parsed again when a file
+    changes. A file is only hashed again when its size or modification
+    time changes.
+
+--------------------------------------------------------------------------
+"""
+import collections
+import hashlib
+import os
+
+import numpy
+
+from gerber_check import assembly
+
+
+# ------------------------------------------------------------------------
+# Global Constants
+# ------------------------------------------------------------------------
+FIELDS                       = ("value", "device", "package", "mpn")
+COLUMNS                      = {"Qty" : "quantity", "Value" : "value", "Device" : "device",
+                                "Package" : "package", "Parts" : "parts", "MP" : "mpn",
+                                "MPN" : "mpn"}
+
+CACHE_SIZE                   = 32                # designs kept in memory
+READ_SIZE                    = 1 << 20
+
+
+# ------------------------------------------------------------------------
+# Part list
+# ------------------------------------------------------------------------
+
+def read_bom(path):
+    """Return the lines of an EAGLE part list as dicts of the COLUMNS
+    fields (strings; parts is a list of names)."""
+    rows    = []
+    columns = None
+
+    with open(path, "r") as bom:
+        for line in bom:
+            line = line.rstrip("\r\n")
+            if columns is None:
+                if line.startswith("Qty "):
+                    columns = header_columns(line)
+                continue
+            if not line.strip():
+                continue
+
+            row = {"quantity" : "0", "value" : "", "device" : "", "package" : "",
+                   "parts" : "", "mpn" : ""}
+            for (name, start, stop) in columns:
+                if name in COLUMNS:
+                    row[COLUMNS[name]] = line[start:stop].strip()
+            row["parts"] = [part.strip() for part in row["parts"].split(",") if part.strip()]
+            rows.append(row)
+
+    if columns is None:
+        raise ValueError("No part list header in {0}".format(path))
+
+    return rows
+
+# End def
+
+
+def header_columns(line):
+    """Return [(name, start, stop)] of a fixed width header line."""
+    starts = []
+    for (index, char) in enumerate(line):
+        if char != " " and (index == 0 or line[index - 1] == " "):
+            starts.append(index)
+
+    columns = []
+    for (number, start) in enumerate(starts):
+        stop = starts[number + 1] if number + 1 < len(starts) else None
+        columns.append((line[start:stop].strip(), start, stop))
+    return columns
+
+# End def
+
+
+# ------------------------------------------------------------------------
+# Design
+# ------------------------------------------------------------------------
+
+class Design(object):
+    """The columnar table of a design."""
+
+    def __init__(self, strings, columns):
+        """Make the design from its string table and its arrays (a dict
+        of quantity, value, device, package, mpn, placements, part_names,
+        part_lines)."""
+        self.strings    = list(strings)
+        self.quantity   = columns["quantity"]
+        self.value      = columns["value"]
+        self.device     = columns["device"]
+        self.package    = columns["package"]
+        self.mpn        = columns["mpn"]
+        self.placements = columns["placements"]
+        self.part_names = columns["part_names"]
+        self.part_lines = columns["part_lines"]
+        self.codes      = dict((text, code) for (code, text) in enumerate(self.strings))
+
+    # End def
+
+    @classmethod
+    def parse(cls, bom_path, pnp_paths=()):
+        """Read a part list and its pick and place files."""
+        strings = [""]
+        codes   = {"" : 0}
+
+        def code(text):
+            if text not in codes:
+                codes[text] = len(strings)
+                strings.append(text)
+            return codes[text]
+
+        rows    = read_bom(bom_path)
+        columns = {"quantity" : numpy.array([int(row["quantity"] or 0) for row in rows],
+                                            dtype=numpy.int32)}
+        for field in FIELDS:
+            columns[field] = numpy.array([code(row[field]) for row in rows], dtype=numpy.int32)
+
+        names = []
+        lines = []
+        for (line, row) in enumerate(rows):
+            names.extend(row["parts"])
+            lines.extend([line] * len(row["parts"]))
+        columns["part_names"] = numpy.array(names, dtype=str)
+        columns["part_lines"] = numpy.array(lines, dtype=numpy.int32)
+
+        # Count the placements of each line by the part names
+        line_of = dict(zip(names, lines))
+        placed  = []
+        for path in pnp_paths:
+            placed.extend(line_of.get(name, -1) for name in assembly.read_parts(path).names)
+        placed = numpy.array(placed, dtype=numpy.int64)
+        columns["placements"] = numpy.bincount(placed[placed >= 0],
+                                               minlength=len(rows)).astype(numpy.int32)
+
+        return cls(strings, columns)
+
+    # End def
+
+    def __len__(self):
+        return len(self.quantity)
+
+    def text(self, field, line):
+        """Return the string of field ("value", ...) of a line."""
+        return self.strings[getattr(self, field)[line]]
+
+    # End def
+
+    def label(self, line):
+        """Return "value (package)" of a line."""
+        return "{0} ({1})".format(self.text("value", line), self.text("package", line))
+
+    # End def
+
+    def save(self, path):
+        """Write the design to an .npz file."""
+        numpy.savez(path, strings=numpy.array(self.strings, dtype=str),
+                    quantity=self.quantity, value=self.value, device=self.device,
+                    package=self.package, mpn=self.mpn, placements=self.placements,
+                    part_names=self.part_names, part_lines=self.part_lines)
+
+    # End def
+
+    @classmethod
+    def load(cls, path):
+        """Read a design written by save()."""
+        with numpy.load(path, allow_pickle=False) as data:
+            columns = dict((name, data[name]) for name in data.files)
+        return cls(columns.pop("strings").tolist(), columns)
+
+    # End def
+
+# End class
+
+
+class Index(object):
+    """Lookup of the BOM lines of a design by value, package and MPN."""
+
+    def __init__(self, design):
+        self.design = design
+        self.lines  = {}
+        for field in ("value", "package", "mpn"):
+            codes  = getattr(design, field)
+            order  = numpy.argsort(codes, kind="stable")
+            bounds = numpy.flatnonzero(numpy.diff(codes[order])) + 1
+            groups = numpy.split(order, bounds) if len(order) else []
+            self.lines[field] = dict((int(codes[group[0]]), group) for group in groups)
+
+    # End def
+
+    def lookup(self, value=None, package=None, mpn=None):
+        """Return the array of the lines matching all the fields given
+        (blank or None fields match any line)."""
+        result = None
+        for (field, text) in (("value", value), ("package", package), ("mpn", mpn)):
+            if not text:
+                continue
+            code  = self.design.codes.get(text)
+            lines = self.lines[field].get(code) if code is not None else None
+            if lines is None:
+                return numpy.zeros(0, dtype=numpy.int64)
+            result = lines if result is None else numpy.intersect1d(result, lines)
+
+        if result is None:
+            return numpy.arange(len(self.design))
+        return numpy.sort(result)
+
+    # End def
+
+# End class
+
+
+# ------------------------------------------------------------------------
+# Cache
+# ------------------------------------------------------------------------
+
+class DesignCache(object):
+    """Parsed designs (with their index) by the hash of their files."""
+
+    def __init__(self, size=CACHE_SIZE, directory=None):
+        """Create the cache.
+
+        :param directory: where to keep designs between runs (None: memory only)
+        """
+        self.size      = size
+        self.directory = directory
+        self.designs   = collections.OrderedDict()
+        self.digests   = {}
+        self.hits      = 0
+        self.misses    = 0
+
+    # End def
+
+    def digest(self, path):
+        """Return the SHA-256 of a file, hashing it only if its size or
+        modification time changed since the last time."""
+        status = os.stat(path)
+        key    = (status.st_size, status.st_mtime_ns)
+        known  = self.digests.get(path)
+        if known is not None and known[0] == key:
+            return known[1]
+
+        sha = hashlib.sha256()
+        with open(path, "rb") as source:
+            for block in iter(lambda: source.read(READ_SIZE), b""):
+                sha.update(block)
+        self.digests[path] = (key, sha.digest())
+        return sha.digest()
+
+    # End def
+
+    def get(self, bom_path, pnp_paths=()):
+        """Return (Design, Index) of a part list and its pick and place files."""
+        sha = hashlib.sha256(self.digest(bom_path))
+        for path in pnp_paths:
+            sha.update(self.digest(path))
+        key = sha.hexdigest()
+
+        found = self.designs.get(key)
+        if found is not None:
+            self.designs.move_to_end(key)
+            self.hits += 1
+            return found
+
+        self.misses += 1
+        saved = os.path.join(self.directory, key + ".npz") if self.directory else None
+        if saved is not None and os.path.exists(saved):
+            design = Design.load(saved)
+        else:
+            design = Design.parse(bom_path, pnp_paths)
+            if saved is not None:
+                os.makedirs(self.directory, exist_ok=True)
+                design.save(saved + ".tmp.npz")
+                os.replace(saved + ".tmp.npz", saved)
+
+        found = self.designs[key] = (design, Index(design))
+        if len(self.designs) > self.size:
+            self.designs.popitem(last=False)
+        return found
+
+    # End def
+
+# End class
+
+
+cache = DesignCache()
+
+
+def load_design(bom_path, pnp_paths=()):
+    """Return (Design, Index) of a part list and its pick and place files,
+    from the module's cache."""
+    return cache.get(bom_path, pnp_paths)
+
+# End def
+
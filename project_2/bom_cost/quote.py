@@ -0,0 +1,205 @@
+"""
+--------------------------------------------------------------------------
+Quotes
+--------------------------------------------------------------------------
+License:
+Copyright 2021 <Jessica Kies>
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors
+may be used to endorse or promote products derived from this software without
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+Quotes
+    Overview: Costs of building a design in any number of boards, from a
+    local price list with quantity breaks.
+
+    A price list is a CSV file (lines starting with "#" are comments):
+        kind,mpn,value,package,quantity,price
+    where every row is one quantity break: price is the unit price when
+    at least quantity units are bought. Units below the smallest break
+    are bought up to it (a minimum order). The kinds are:
+      - part:  a part of the BOM, per part
+      - smt:   a machine placement (a part in the pick and place files)
+      - tht:   a part of the BOM that is not in the pick and place files
+               (through hole or hand soldered), per part
+      - board: a cost per board (fabrication, testing); value names it
+      - order: a cost per build (setup, stencil); value names it
+    A part, smt or tht row applies to the BOM lines that match all its
+    mpn, value and package fields that are not blank; where several
+    match a line, the one with the most fields given wins.
+
+    plan() matches the price list to a design once (through its Index).
+    quote() then costs any array of build sizes at once: the quantity
+    bought of every costed item in every build is one (items, builds)
+    array, and its price break one comparison with the (items, breaks)
+    array of the price list.
+
+--------------------------------------------------------------------------
+"""
+import collections
+import csv
+
+import numpy
+
+
+# ------------------------------------------------------------------------
+# Global Constants
+# ------------------------------------------------------------------------
+KINDS                        = ("part", "smt", "tht", "board", "order")
+LINE_KINDS                   = ("part", "smt", "tht")
+
+
+PriceList = collections.namedtuple("PriceList", ["keys", "breaks", "prices"])
+Plan      = collections.namedtuple("Plan", ["labels", "kinds", "per_board", "per_order",
+                                            "breaks", "prices", "unpriced"])
+Quote     = collections.namedtuple("Quote", ["builds", "bought", "unit", "cost", "total",
+                                             "per_board"])
+
+
+# ------------------------------------------------------------------------
+# Price list
+# ------------------------------------------------------------------------
+
+def read_prices(path):
+    """Return the PriceList of a price list file.
+
+    keys are the (kind, mpn, value, package) of every priced item;
+    breaks and prices are (items, most breaks) arrays, sorted by
+    quantity and padded with infinite quantities.
+    """
+    rows = collections.OrderedDict()
+
+    with open(path, "r") as prices:
+        lines = (line for line in prices if line.strip() and not line.lstrip().startswith("#"))
+        for (number, row) in enumerate(csv.DictReader(lines)):
+            kind = row["kind"].strip()
+            if kind not in KINDS:
+                raise ValueError("{0}: unknown kind '{1}' in row {2}".format(path, kind, number + 1))
+            key = (kind, row["mpn"].strip(), row["value"].strip(), row["package"].strip())
+            rows.setdefault(key, []).append((int(row["quantity"]), float(row["price"])))
+
+    width  = max([len(breaks) for breaks in rows.values()] or [1])
+    breaks = numpy.full((len(rows), width), numpy.inf)
+    prices = numpy.zeros((len(rows), width))
+    for (item, points) in enumerate(rows.values()):
+        points = sorted(points)
+        breaks[item, :len(points)] = [point[0] for point in points]
+        prices[item, :len(points)] = [point[1] for point in points]
+        prices[item, len(points):] = points[-1][1]
+
+    return PriceList(list(rows.keys()), breaks, prices)
+
+# End def
+
+
+# ------------------------------------------------------------------------
+# Quotes
+# ------------------------------------------------------------------------
+
+def plan(design, index, price_list):
+    """Match a price list to a design (a design.Design and its
+    design.Index).
+
+    Returns the Plan of the costed items: their labels and kinds, the
+    units needed per board (or per build, where per_order is set), their
+    rows of breaks and prices, and the labels of the BOM lines that have
+    no part price.
+    """
+    # For each line kind, the most specific item of each BOM line
+    chosen = {}
+    for kind in LINE_KINDS:
+        item_of     = numpy.full(len(design), -1, dtype=numpy.int64)
+        specificity = numpy.full(len(design), -1, dtype=numpy.int64)
+        for (item, key) in enumerate(price_list.keys):
+            if key[0] != kind:
+                continue
+            lines = index.lookup(mpn=key[1], value=key[2], package=key[3])
+            given = sum(1 for field in key[1:] if field)
+            lines = lines[specificity[lines] < given]
+            item_of[lines]     = item
+            specificity[lines] = given
+        chosen[kind] = item_of
+
+    placements = design.placements.astype(numpy.float64)
+    units      = {"part" : design.quantity.astype(numpy.float64),
+                  "smt"  : placements,
+                  "tht"  : numpy.maximum(design.quantity - placements, 0.0)}
+
+    labels    = []
+    kinds     = []
+    per_board = []
+    per_order = []
+    items     = []
+    for kind in LINE_KINDS:
+        for line in numpy.flatnonzero((chosen[kind] >= 0) & (units[kind] > 0)):
+            labels.append(design.label(line))
+            kinds.append(kind)
+            per_board.append(units[kind][line])
+            per_order.append(False)
+            items.append(chosen[kind][line])
+
+    for (item, key) in enumerate(price_list.keys):
+        if key[0] in ("board", "order"):
+            labels.append(key[2] or key[0])
+            kinds.append(key[0])
+            per_board.append(1.0)
+            per_order.append(key[0] == "order")
+            items.append(item)
+
+    unpriced = [design.label(line) for line in
+                numpy.flatnonzero((chosen["part"] < 0) & (design.quantity > 0))]
+    items    = numpy.array(items, dtype=numpy.int64)
+
+    return Plan(labels, kinds, numpy.array(per_board), numpy.array(per_order, dtype=bool),
+                price_list.breaks[items], price_list.prices[items], unpriced)
+
+# End def
+
+
+def quote(plan, builds):
+    """Cost builds (a sequence of board counts) of a Plan, all at once.
+
+    Returns a Quote of arrays: bought, unit and cost are (items, builds);
+    total and per_board are (builds,).
+
+    Will throw a ValueError if a build is of less than one board.
+    """
+    builds = numpy.asarray(builds, dtype=numpy.float64)
+    if (builds < 1).any():
+        raise ValueError("Builds must be of at least one board")
+    needed = numpy.where(plan.per_order[:, None], plan.per_board[:, None],
+                         plan.per_board[:, None] * builds[None, :])
+    bought = numpy.maximum(needed, plan.breaks[:, :1])
+
+    # Highest break at or below the quantity bought
+    breaks = (plan.breaks[:, None, :] <= bought[:, :, None]).sum(axis=2) - 1
+    unit   = numpy.take_along_axis(plan.prices, numpy.maximum(breaks, 0), axis=1)
+    cost   = bought * unit
+    total  = cost.sum(axis=0)
+
+    return Quote(builds, bought, unit, cost, total, total / builds)
+
+# End def
+
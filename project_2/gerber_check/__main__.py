@@ -0,0 +1,182 @@
+"""
+--------------------------------------------------------------------------
+Gerber Check Command
+--------------------------------------------------------------------------
+License:
+Copyright 2021 <Jessica Kies>
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors
+may be used to endorse or promote products derived from this software without
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+Gerber Check Command
+    Overview: Rasterizes and checks CAM output directories (the project's
+    own by default) and prints a report. Exits with status 1 if a check
+    failed.
+
+    --copies N checks every directory N times, as a panel of N boards, to
+    use (and time) all the workers. --images also writes every layer as a
+    PGM image next to its bitmap.
+
+--------------------------------------------------------------------------
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from . import checks
+from . import panel
+from . import raster
+
+
+# ------------------------------------------------------------------------
+# Global Constants
+# ------------------------------------------------------------------------
+CAM_OUTPUTS                  = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..",
+                                            "Project2EagleFiles", "MFG", "CAMOutputs")
+
+
+# ------------------------------------------------------------------------
+# Functions
+# ------------------------------------------------------------------------
+
+def report(board, result, min_ring):
+    """Print the report of one board. Returns the number of failures."""
+    failures = 0
+    print("{0}".format(board.name))
+    print("    {0:<24} {1:>7} {2:>7} {3:>7} {4:>11}".format(
+          "layer", "flashes", "lines", "regions", "area mm^2"))
+    for (layer, value) in sorted(result["layers"].items()):
+        (origin, shape, counts, pads, area, unsupported) = value
+        print("    {0:<24} {1:>7} {2:>7} {3:>7} {4:>11.1f}{5}".format(
+              layer, counts["flash"], counts["line"], counts["region"], area,
+              "  unsupported: {0}".format(unsupported) if unsupported else ""))
+
+    for (layer, rings) in result["rings"].items():
+        plated = rings.plated
+        print("    drills on {0:<18} {1:>4} plated, ring >= {2:.3f} mm, offset <= {3:.3f} mm".format(
+              layer, int(plated.sum()),
+              rings.ring[plated].min() if plated.any() else 0.0,
+              rings.offset[plated].max() if plated.any() else 0.0))
+        for index in rings.failed.nonzero()[0]:
+            print("        FAIL drill at ({0:.2f}, {1:.2f}): ring {2:.3f} mm (min {3:.3f}), "
+                  "offset {4:.3f} mm".format(rings.x[index], rings.y[index], rings.ring[index],
+                                            min_ring, rings.offset[index]))
+        failures += int(rings.failed.sum())
+
+    for (side, (parts, places)) in result["places"].items():
+        print("    {0:<5} parts {1:>4}, {2} on copper, {3} between pads".format(
+              side, len(parts.names), int(places.on_copper.sum()), int(places.between.sum())))
+        for index in places.failed.nonzero()[0]:
+            print("        FAIL {0} at ({1:.2f}, {2:.2f}): centroid not on its pads".format(
+                  parts.names[index], parts.x[index], parts.y[index]))
+        failures += int(places.failed.sum())
+
+    if result["drill unsupported"]:
+        print("    drill commands skipped: {0}".format(result["drill unsupported"]))
+
+    return failures
+
+# End def
+
+
+def write_images(boards, results, output, dpi):
+    """Write every layer bitmap as a PGM image."""
+    for board in boards:
+        for (layer, value) in results[board.name]["layers"].items():
+            path   = panel.bitmap_path(output, board.name, layer)
+            bitmap = raster.Bitmap(path, value[0], value[1], dpi, mode="r")
+            bitmap.write_pgm(os.path.splitext(path)[0] + ".pgm")
+            bitmap.close()
+
+# End def
+
+
+# ------------------------------------------------------------------------
+# Main script
+# ------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog="gerber_check", description="Check CAM outputs")
+    parser.add_argument("directories", nargs="*", default=[CAM_OUTPUTS],
+                        help="CAM output directories (default: this project's)")
+    parser.add_argument("--dpi", type=int, default=raster.DPI)
+    parser.add_argument("--out", help="directory for the bitmaps (default: a temporary "
+                                      "directory, removed at the end)")
+    parser.add_argument("--copies", type=int, default=1,
+                        help="check every directory this many times, as a panel")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one a CPU)")
+    parser.add_argument("--images", action="store_true", help="also write PGM images")
+    parser.add_argument("--min-ring", type=float, default=checks.MIN_RING,
+                        help="smallest annular ring, in mm")
+    args = parser.parse_args()
+
+    boards = []
+    try:
+        for (number, directory) in enumerate(args.directories):
+            for copy in range(args.copies):
+                name = "board{0}".format(number * args.copies + copy + 1)
+                boards.append(panel.find_board(directory, name))
+    except (ValueError, OSError) as error:
+        print(error, file=sys.stderr)
+        sys.exit(1)
+
+    if 25.4 / args.dpi > args.min_ring / 2.0:
+        print("Warning: pixels of {0:.3f} mm are too coarse to measure rings of {1:.3f} mm; "
+              "use a higher --dpi".format(25.4 / args.dpi, args.min_ring))
+
+    output = args.out or tempfile.mkdtemp(prefix="gerber_check_")
+    try:
+        start   = time.perf_counter()
+        try:
+            results = panel.check_panel(boards, output, args.dpi, args.workers, args.min_ring)
+        except (ValueError, OSError) as error:
+            print(error, file=sys.stderr)
+            sys.exit(1)
+        elapsed = time.perf_counter() - start
+
+        failures = 0
+        for board in boards:
+            failures += report(board, results[board.name], args.min_ring)
+
+        pixels = sum(value[1][0] * value[1][1] for result in results.values()
+                     for value in result["layers"].values())
+        print("")
+        print("{0} boards, {1} layers, {2:.0f} Mpixels at {3} DPI in {4:.2f} s, {5} failures".format(
+              len(boards), sum(len(board.layers) for board in boards), pixels / 1e6,
+              args.dpi, elapsed, failures))
+
+        if args.images:
+            write_images(boards, results, output, args.dpi)
+            print("images in {0}".format(output))
+    finally:
+        if args.out is None:
+            shutil.rmtree(output)
+
+    sys.exit(1 if failures else 0)
+
@@ -0,0 +1,83 @@
+"""
+--------------------------------------------------------------------------
+Assembly Reader
+--------------------------------------------------------------------------
+License:
+Copyright 2021 <Jessica Kies>
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors
+may be used to endorse or promote products derived from this software without
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+Assembly Reader
+    Overview: Reads EAGLE's pick and place (mountsmd style) files: one
+    part a line, "name x y rotation value package", separated by tabs or
+    spaces, in mm.
+
+--------------------------------------------------------------------------
+"""
+import collections
+
+import numpy
+
+
+# ------------------------------------------------------------------------
+# Functions
+# ------------------------------------------------------------------------
+
+Parts = collections.namedtuple("Parts", ["names", "x", "y", "rotation", "values", "packages"])
+
+
+def read_parts(path):
+    """Return the Parts in a pick and place file. Lines that are not a part
+    (headers, blank lines) are skipped."""
+    names    = []
+    xs       = []
+    ys       = []
+    angles   = []
+    values   = []
+    packages = []
+
+    with open(path, "r") as parts:
+        for line in parts:
+            fields = line.split()
+            if len(fields) < 4:
+                continue
+            try:
+                (x, y, rotation) = (float(fields[1]), float(fields[2]), float(fields[3]))
+            except ValueError:
+                continue
+
+            names.append(fields[0])
+            xs.append(x)
+            ys.append(y)
+            angles.append(rotation)
+            values.append(fields[4] if len(fields) > 4 else "")
+            packages.append(fields[5] if len(fields) > 5 else "")
+
+    return Parts(names, numpy.array(xs), numpy.array(ys), numpy.array(angles), values, packages)
+
+# End def
+
@@ -0,0 +1,187 @@
+"""
+--------------------------------------------------------------------------
+Board Checks
+--------------------------------------------------------------------------
+License:
+Copyright 2021 <Jessica Kies>
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors
+may be used to endorse or promote products derived from this software without
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+Board Checks
+    Overview: Checks of a board's layers, done on their bitmaps with NumPy
+    over all drills or parts at once:
+      - copper_area():       copper area of a layer
+      - drill_rings():       annular ring left around each drill hit on a
+                             copper layer, and how far the hit is from the
+                             center of its pad (drill to copper alignment)
+      - centroids_on_pads(): whether each pick and place centroid is on
+                             the pads of its part
+
+    The ring of a hit is measured along RING_ANGLES rays from the edge of
+    the hole out to the first pixel without copper; the smallest of those
+    is the ring. Rays along a trace or into a plane only get longer, so
+    they never hide a thin ring.
+
+    A centroid is on its pads if it is on copper (a fiducial, a large pad)
+    or if the pads closest to it are on opposite sides of it (two or more
+    pad parts, whose centroid is between the pads).
+
+--------------------------------------------------------------------------
+"""
+import collections
+import math
+
+import numpy
+
+
+# ------------------------------------------------------------------------
+# Global Constants
+# ------------------------------------------------------------------------
+MIN_RING                     = 0.1               # mm
+MAX_RING                     = 2.0               # mm measured past the hole
+RING_ANGLES                  = 32
+MAX_OFFSET                   = 0.05              # mm from hit to pad center
+
+PAD_RADIUS                   = 5.0               # mm from centroid to pads
+PAD_COUNT                    = 4                 # closest pads looked at
+OPPOSITE                     = -0.5              # cosine of "opposite sides"
+
+CHUNK                        = 4096              # points per distance block
+
+
+Rings  = collections.namedtuple("Rings", ["x", "y", "ring", "offset", "plated", "failed"])
+Places = collections.namedtuple("Places", ["on_copper", "between", "failed"])
+
+
+# ------------------------------------------------------------------------
+# Functions
+# ------------------------------------------------------------------------
+
+def copper_area(bitmap):
+    """Return the copper area of a layer, in mm^2."""
+    return bitmap.area()
+
+# End def
+
+
+def nearest(points, x, y, count):
+    """Return (distances, indexes) of the count points ((M, 2) array)
+    closest to each of (x, y), nearest first, as (N, count) arrays. Missing
+    neighbours (fewer than count points) are at an infinite distance."""
+    size      = len(x)
+    distances = numpy.full((size, count), numpy.inf)
+    indexes   = numpy.zeros((size, count), dtype=numpy.int64)
+    if size == 0 or len(points) == 0:
+        return (distances, indexes)
+
+    take = min(count, len(points))
+    for start in range(0, size, CHUNK):
+        stop    = min(size, start + CHUNK)
+        dx      = points[None, :, 0] - x[start:stop, None]
+        dy      = points[None, :, 1] - y[start:stop, None]
+        squared = dx * dx + dy * dy
+        closest = numpy.argpartition(squared, take - 1, axis=1)[:, :take]
+        rows    = numpy.arange(stop - start)[:, None]
+        order   = numpy.argsort(squared[rows, closest], axis=1)
+        closest = closest[rows, order]
+        distances[start:stop, :take] = numpy.sqrt(squared[rows, closest])
+        indexes[start:stop, :take]   = closest
+
+    return (distances, indexes)
+
+# End def
+
+
+def drill_rings(bitmap, hits, pads, min_ring=MIN_RING, max_offset=MAX_OFFSET):
+    """Measure the annular ring of every drill hit on a copper layer.
+
+    :param hits: excellon.Hits
+    :param pads: (M, 2) array of the pad (flash) centers of the layer
+
+    Returns Rings of (N,) arrays (x and y are the hits'):
+      - ring:   smallest copper width around the hole, in mm (up to MAX_RING)
+      - offset: distance from the hit to the closest pad center, in mm
+      - plated: hits with copper around them (the others are not checked)
+      - failed: plated hits whose ring is under min_ring or whose offset is
+                over max_offset
+    """
+    step   = bitmap.pitch / 2.0
+    angles = numpy.linspace(0.0, 2.0 * math.pi, RING_ANGLES, endpoint=False)
+    widths = numpy.arange(step / 2.0, MAX_RING, step)
+
+    # Samples (hit, angle, width): out from the edge of each hole
+    radius = hits.diameter[:, None, None] / 2.0 + widths[None, None, :]
+    x      = hits.x[:, None, None] + radius * numpy.cos(angles)[None, :, None]
+    y      = hits.y[:, None, None] + radius * numpy.sin(angles)[None, :, None]
+    copper = bitmap.sample(x, y).astype(bool)
+
+    # The first sample without copper on each ray ends the ring
+    ends = numpy.where(copper.all(axis=2), len(widths), numpy.argmin(copper, axis=2))
+    ring = numpy.concatenate([widths, [MAX_RING]])[ends].min(axis=1) - step / 2.0
+    ring = numpy.maximum(ring, 0.0)
+
+    plated      = copper[:, :, 0].any(axis=1)
+    offset      = nearest(pads, hits.x, hits.y, 1)[0][:, 0]
+    failed      = plated & ((ring < min_ring) | (offset > max_offset))
+
+    return Rings(hits.x, hits.y, ring, offset, plated, failed)
+
+# End def
+
+
+def centroids_on_pads(bitmap, pads, parts, radius=PAD_RADIUS):
+    """Check that every part centroid is on the pads of its part.
+
+    :param pads:  (M, 2) array of the pad (flash) centers of the copper
+                  layer the parts are on
+    :param parts: assembly.Parts
+
+    Returns Places of (N,) arrays: on_copper, between (not on copper but
+    between pads on opposite sides) and failed (neither). Each part is in
+    exactly one of them.
+    """
+    on_copper = bitmap.sample(parts.x, parts.y).astype(bool)
+
+    (distances, indexes) = nearest(pads, parts.x, parts.y, PAD_COUNT)
+    near = distances <= radius
+    dx   = numpy.where(near, pads[indexes, 0] - parts.x[:, None], 0.0) if len(pads) else distances * 0.0
+    dy   = numpy.where(near, pads[indexes, 1] - parts.y[:, None], 0.0) if len(pads) else distances * 0.0
+    size = numpy.where(near, numpy.hypot(dx, dy), 1.0)
+    size[size == 0.0] = 1.0
+    (ux, uy) = (dx / size, dy / size)
+
+    # Cosine between every pair of the closest pads
+    cosine    = ux[:, :, None] * ux[:, None, :] + uy[:, :, None] * uy[:, None, :]
+    both      = near[:, :, None] & near[:, None, :]
+    straddled = (both & (cosine <= OPPOSITE)).any(axis=(1, 2))
+
+    between   = straddled & ~on_copper
+
+    return Places(on_copper, between, ~(on_copper | between))
+
+# End def
+
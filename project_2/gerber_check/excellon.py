@@ -0,0 +1,187 @@
+"""
+--------------------------------------------------------------------------
+Excellon Reader
+--------------------------------------------------------------------------
+License:
+Copyright 2021 <Jessica Kies>
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors
+may be used to endorse or promote products derived from this software without
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+Excellon Reader
+    Overview: Streaming reader for Excellon drill files (as made by
+    EAGLE's CAM processor), one line at a time.
+
+    read_hits() returns the hits as NumPy arrays (x, y and diameter in
+    mm), which is all the checks need. Routed slots (G85) and the rest of
+    the Excellon routing commands are counted as unsupported and skipped.
+
+--------------------------------------------------------------------------
+"""
+import array
+import collections
+import re
+
+import numpy
+
+
+# ------------------------------------------------------------------------
+# Global Constants
+# ------------------------------------------------------------------------
+INCH                         = 25.4              # mm
+
+TOOL                         = re.compile(r"T0*(\d+)(?:[FS][\d.]+)*C([\d.]+)")
+SELECT                       = re.compile(r"T0*(\d+)$")
+COORDINATE                   = re.compile(r"([XY])([-+]?[\d.]+)")
+UNITS                        = re.compile(r"(METRIC|INCH)(?:,(LZ|TZ))?(?:,(0*)\.(0*))?")
+
+
+Hits = collections.namedtuple("Hits", ["x", "y", "diameter", "unsupported"])
+
+
+# ------------------------------------------------------------------------
+# Reader
+# ------------------------------------------------------------------------
+
+class ExcellonReader(object):
+    """Reads one Excellon file."""
+
+    def __init__(self, path):
+        self.path        = path
+        self.scale       = 1.0               # file units to mm
+        self.trailing    = True              # TZ: trailing zeros kept
+        self.digits      = (3, 3)            # integer and decimal digits
+        self.tools       = {}
+        self.diameter    = 0.0
+        self.x           = 0.0
+        self.y           = 0.0
+        self.unsupported = collections.Counter()
+
+    # End def
+
+    def number(self, text):
+        """Return a coordinate from the file in mm."""
+        if "." in text:
+            return float(text) * self.scale
+
+        (integer, decimal) = self.digits
+        sign = -1 if text[0] == "-" else 1
+        text = text.lstrip("+-")
+        if not self.trailing:
+            # Leading zeros kept, trailing ones left out
+            text = text.ljust(integer + decimal, "0")
+        return sign * int(text) * self.scale / 10 ** decimal
+
+    # End def
+
+    def header(self, line):
+        """Handle a line of the header."""
+        match = UNITS.match(line)
+        if match is not None:
+            (units, zeros, integer, decimal) = match.groups()
+            self.scale    = INCH if units == "INCH" else 1.0
+            self.trailing = zeros != "LZ"
+            if integer is not None:
+                self.digits = (len(integer), len(decimal))
+            elif units == "INCH":
+                self.digits = (2, 4)
+            return
+
+        match = TOOL.match(line)
+        if match is not None:
+            self.tools[int(match.group(1))] = float(match.group(2)) * self.scale
+
+    # End def
+
+    def read_hits(self):
+        """Return the Hits of the file."""
+        xs        = array.array("d")
+        ys        = array.array("d")
+        diameters = array.array("d")
+        in_header = False
+
+        with open(self.path, "r") as drill:
+            for line in drill:
+                line = line.strip()
+                if not line or line[0] == ";":
+                    continue
+
+                if line == "M48":
+                    in_header = True
+                    continue
+                if in_header:
+                    if line in ("%", "M95"):
+                        in_header = False
+                    else:
+                        self.header(line)
+                    continue
+
+                if line == "M30":
+                    break
+                if line == "M71":
+                    self.scale = 1.0
+                    continue
+                if line == "M72":
+                    self.scale = INCH
+                    continue
+
+                match = SELECT.match(line)
+                if match is not None:
+                    self.diameter = self.tools.get(int(match.group(1)), 0.0)
+                    continue
+
+                if line[0] in "XY":
+                    for (axis, value) in COORDINATE.findall(line):
+                        if axis == "X":
+                            self.x = self.number(value)
+                        else:
+                            self.y = self.number(value)
+                    if "G85" in line:
+                        self.unsupported["G85"] += 1
+                        continue
+                    xs.append(self.x)
+                    ys.append(self.y)
+                    diameters.append(self.diameter)
+                elif line[0] in "GM":
+                    if line not in ("G90", "G05", "M71", "M72"):
+                        self.unsupported[line[:3]] += 1
+
+        return Hits(numpy.frombuffer(xs, dtype=numpy.float64),
+                    numpy.frombuffer(ys, dtype=numpy.float64),
+                    numpy.frombuffer(diameters, dtype=numpy.float64),
+                    dict(self.unsupported))
+
+    # End def
+
+# End class
+
+
+def read_hits(path):
+    """Return the Hits of an Excellon file."""
+    return ExcellonReader(path).read_hits()
+
+# End def
+
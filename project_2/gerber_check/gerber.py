@@ -0,0 +1,384 @@
+"""
+--------------------------------------------------------------------------
+Gerber Reader
+--------------------------------------------------------------------------
+License:
+Copyright 2021 <Jessica Kies>
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors
+may be used to endorse or promote products derived from this software without
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+Gerber Reader
+    Overview: Streaming reader for RS-274X (extended Gerber) files, as
+    made by EAGLE's CAM processor.
+
+    The file is read a block at a time and turned into drawing events one
+    command at a time, so only the current command (and the outline of
+    the current region) is ever held in Python objects:
+      - (FLASH, aperture, x, y, polarity)
+      - (LINE, aperture, x1, y1, x2, y2, polarity)
+      - (REGION, [(x, y), ...], polarity)         one closed contour
+    Coordinates are in mm, polarity is 1 (dark) or 0 (clear). Arcs (G02 /
+    G03) are turned into lines of up to ARC_STEP mm.
+
+    Supported: FS, MO, AD (C, R, O, P and macros), AM, LP, G01 - G03,
+    G36 / G37, G74 / G75, D01 - D03 and the deprecated G54 / G70 / G71.
+    Attributes (TF, TA, TO, TD) and other commands are skipped; step and
+    repeat (SR) and image transforms are not supported.
+
+--------------------------------------------------------------------------
+"""
+import collections
+import math
+import re
+
+
+# ------------------------------------------------------------------------
+# Global Constants
+# ------------------------------------------------------------------------
+READ_SIZE                    = 65536
+ARC_STEP                     = 0.05              # mm per line of an arc
+INCH                         = 25.4              # mm
+
+FLASH                        = "flash"
+LINE                         = "line"
+REGION                       = "region"
+
+# Lengths (in file units) of the parameters of the standard apertures:
+# which of them are scaled to mm
+LENGTHS                      = {"C" : (0, 2), "R" : (0, 1, 2), "O" : (0, 1, 2), "P" : (0, 3)}
+
+COORDINATE                   = re.compile(r"([XYIJ])([-+]?\d+)")
+OPERATION                    = re.compile(r"D0*(\d+)$")
+FORMAT                       = re.compile(r"FS([LTD]?)([AI])X(\d)(\d)Y(\d)(\d)")
+DEFINITION                   = re.compile(r"ADD(\d+)([^,]+)(?:,(.*))?$")
+
+
+Aperture = collections.namedtuple("Aperture", ["shape", "params", "macro", "scale"])
+"""An aperture: shape is "C", "R", "O", "P" or a macro name; params are in
+mm for the standard shapes and as written for macros (macro is then the
+list of the macro's primitives and scale converts its lengths to mm)."""
+
+
+# ------------------------------------------------------------------------
+# Functions
+# ------------------------------------------------------------------------
+
+def read_commands(path, read_size=READ_SIZE):
+    """Yield the commands of a Gerber file one at a time: (True, text) for
+    an extended command (without its %s) and (False, word) for a word
+    (without its *). Line breaks mean nothing in a Gerber file and are
+    dropped."""
+    with open(path, "r") as gerber:
+        buffer = ""
+        while True:
+            chunk  = gerber.read(read_size)
+            buffer = buffer + chunk.replace("\r", "").replace("\n", "")
+
+            position = 0
+            while position < len(buffer):
+                if buffer[position] == "%":
+                    end = buffer.find("%", position + 1)
+                    if end < 0:
+                        break
+                    yield (True, buffer[position + 1:end])
+                else:
+                    end = buffer.find("*", position)
+                    if end < 0:
+                        break
+                    word = buffer[position:end].strip()
+                    if word:
+                        yield (False, word)
+                position = end + 1
+
+            buffer = buffer[position:]
+            if not chunk:
+                break
+
+# End def
+
+
+def arc_points(x1, y1, x2, y2, i, j, clockwise):
+    """Return the points (after the start) of a multi quadrant arc from
+    (x1, y1) to (x2, y2) around (x1 + i, y1 + j)."""
+    cx     = x1 + i
+    cy     = y1 + j
+    radius = math.hypot(i, j)
+    start  = math.atan2(y1 - cy, x1 - cx)
+    end    = math.atan2(y2 - cy, x2 - cx)
+
+    if clockwise:
+        sweep = start - end
+    else:
+        sweep = end - start
+    if sweep <= 1e-9:
+        sweep += 2 * math.pi                     # start == end: a full circle
+
+    steps = max(1, int(math.ceil(sweep * radius / ARC_STEP)))
+    sign  = -1 if clockwise else 1
+    points = []
+    for step in range(1, steps):
+        angle = start + sign * sweep * step / steps
+        points.append((cx + radius * math.cos(angle), cy + radius * math.sin(angle)))
+    points.append((x2, y2))
+    return points
+
+# End def
+
+
+# ------------------------------------------------------------------------
+# Reader
+# ------------------------------------------------------------------------
+
+class GerberReader(object):
+    """Reads one Gerber file. events() yields its drawing events."""
+
+    def __init__(self, path):
+        self.path          = path
+        self.name          = None            # from %IN
+        self.scale         = 1.0             # file units to mm
+        self.leading       = True            # leading zeros omitted
+        self.digits        = (3, 4)          # X integer and decimal digits
+        self.apertures     = {}
+        self.macros        = {}
+        self.aperture      = None
+        self.x             = 0.0
+        self.y             = 0.0
+        self.interpolation = 1               # 1 linear, 2 clockwise, 3 counter
+        self.polarity      = 1
+        self.operation     = None            # last D01 / D02 / D03
+        self.region        = None            # points of the current contour
+        self.unsupported   = collections.Counter()
+
+    # End def
+
+    def number(self, text):
+        """Return a coordinate from the file in mm."""
+        (integer, decimal) = self.digits
+        sign = -1 if text[0] == "-" else 1
+        text = text.lstrip("+-")
+        if not self.leading:
+            text = text.ljust(integer + decimal, "0")
+        return sign * int(text) * self.scale / 10 ** decimal
+
+    # End def
+
+    def events(self):
+        """Yield the drawing events of the file."""
+        for (extended, text) in read_commands(self.path):
+            if extended:
+                self.extended(text)
+                continue
+            for event in self.word(text):
+                yield event
+            if self.operation == "end":
+                break
+
+        # A region left open at the end of the file
+        if self.region is not None and len(self.region) > 2:
+            yield (REGION, self.region, self.polarity)
+        self.region = None
+
+    # End def
+
+    def extended(self, text):
+        """Handle an extended (%) command."""
+        blocks = [block for block in text.split("*") if block]
+        if not blocks:
+            return
+        command = blocks[0][:2]
+
+        if command == "FS":
+            match = FORMAT.match(blocks[0])
+            if match is not None:
+                self.leading = match.group(1) != "T"
+                self.digits  = (int(match.group(3)), int(match.group(4)))
+        elif command == "MO":
+            self.scale = INCH if blocks[0][2:4] == "IN" else 1.0
+        elif command == "LP":
+            self.polarity = 0 if blocks[0][2:3] == "C" else 1
+        elif command == "IN":
+            self.name = blocks[0][2:]
+        elif command == "AM":
+            self.macros[blocks[0][2:]] = blocks[1:]
+        elif command == "AD":
+            self.define(blocks[0])
+        elif command in ("TF", "TA", "TO", "TD", "IP", "G0"):
+            pass
+        else:
+            self.unsupported[command] += 1
+
+    # End def
+
+    def define(self, text):
+        """Handle an aperture definition (%ADD...)."""
+        match = DEFINITION.match(text)
+        if match is None:
+            self.unsupported["AD"] += 1
+            return
+
+        (code, shape, params) = match.groups()
+        params = [float(param) for param in params.split("X")] if params else []
+
+        if shape in LENGTHS:
+            params = [param * self.scale if index in LENGTHS[shape] else param
+                      for (index, param) in enumerate(params)]
+            self.apertures[int(code)] = Aperture(shape, params, None, self.scale)
+        else:
+            self.apertures[int(code)] = Aperture(shape, params, self.macros.get(shape),
+                                                 self.scale)
+
+    # End def
+
+    def word(self, text):
+        """Handle a word; return the list of events it makes."""
+        if text[0] == "G":
+            match = re.match(r"G0*(\d+)", text)
+            code  = int(match.group(1))
+            text  = text[match.end():]
+
+            if code == 4:
+                return []                        # comment
+            elif code in (1, 2, 3):
+                self.interpolation = code
+            elif code == 36:
+                self.region = []
+            elif code == 37:
+                region      = self.region
+                self.region = None
+                if region is not None and len(region) > 2:
+                    return [(REGION, region, self.polarity)]
+                return []
+            elif code == 70:
+                self.scale = INCH
+            elif code == 71:
+                self.scale = 1.0
+            elif code in (54, 55, 74, 75, 90, 91):
+                pass                             # aperture prefix, quadrants, ...
+            else:
+                self.unsupported["G{0:02d}".format(code)] += 1
+
+            if not text:
+                return []
+
+        if text.startswith("M0"):
+            self.operation = "end"
+            return []
+
+        match = OPERATION.search(text)
+        if match is not None:
+            code = int(match.group(1))
+            text = text[:match.start()]
+            if code >= 10:
+                self.aperture = self.apertures.get(code)
+                return []
+            self.operation = code
+        elif not text:
+            return []
+
+        return self.operate(text)
+
+    # End def
+
+    def operate(self, text):
+        """Carry out the current operation at the coordinates in text."""
+        x1 = self.x
+        y1 = self.y
+        i  = 0.0
+        j  = 0.0
+        for (axis, value) in COORDINATE.findall(text):
+            if axis == "X":
+                self.x = self.number(value)
+            elif axis == "Y":
+                self.y = self.number(value)
+            elif axis == "I":
+                i = self.number(value)
+            else:
+                j = self.number(value)
+
+        if self.operation == 2:
+            if self.region is not None:
+                # A new contour of the region: the last one is complete
+                region      = self.region
+                self.region = [(self.x, self.y)]
+                if len(region) > 2:
+                    return [(REGION, region, self.polarity)]
+            return []
+
+        if self.operation == 3:
+            if self.aperture is None:
+                return []
+            return [(FLASH, self.aperture, self.x, self.y, self.polarity)]
+
+        if self.operation != 1:
+            return []
+
+        if self.interpolation == 1:
+            points = [(self.x, self.y)]
+        else:
+            points = arc_points(x1, y1, self.x, self.y, i, j, self.interpolation == 2)
+
+        if self.region is not None:
+            if not self.region:
+                self.region.append((x1, y1))
+            self.region.extend(points)
+            return []
+
+        if self.aperture is None:
+            return []
+
+        events = []
+        for (x2, y2) in points:
+            events.append((LINE, self.aperture, x1, y1, x2, y2, self.polarity))
+            (x1, y1) = (x2, y2)
+        return events
+
+    # End def
+
+# End class
+
+
+# ------------------------------------------------------------------------
+# Main script
+# ------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Count the events of Gerber files")
+    parser.add_argument("paths", nargs="+")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        start  = time.perf_counter()
+        reader = GerberReader(path)
+        counts = collections.Counter(event[0] for event in reader.events())
+        print("{0:<28} {1:>8.1f} ms  {2}{3}".format(
+              reader.name or path, (time.perf_counter() - start) * 1e3,
+              ", ".join("{0} {1}".format(count, kind) for (kind, count) in sorted(counts.items())),
+              "  unsupported: {0}".format(dict(reader.unsupported)) if reader.unsupported else ""))
+
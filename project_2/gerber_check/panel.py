@@ -0,0 +1,255 @@
+"""
+--------------------------------------------------------------------------
+Panel Checks
+--------------------------------------------------------------------------
+License:
+Copyright 2021 <Jessica Kies>
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors
+may be used to endorse or promote products derived from this software without
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+Panel Checks
+    Overview: Rasterizes and checks a panel of boards (each a CAM output
+    directory, as made by EAGLE: GerberFiles/, DrillFiles/ and Assembly/)
+    with a pool of worker processes.
+
+    Work is split in two rounds over the pool:
+      1. every (board, layer) is rasterized into its own memory mapped
+         bitmap under the output directory
+      2. every board is checked, its workers mapping the bitmaps of round
+         1 read only (the pages are shared through the page cache, nothing
+         is copied between processes)
+
+    All the layers of a board use the same window: the extent of its
+    profile (board outline) layer plus MARGIN, or of all its layers if it
+    has no profile.
+
+--------------------------------------------------------------------------
+"""
+import collections
+import glob
+import multiprocessing
+import os
+
+from . import assembly
+from . import checks
+from . import excellon
+from . import gerber
+from . import raster
+
+
+# ------------------------------------------------------------------------
+# Global Constants
+# ------------------------------------------------------------------------
+MARGIN                       = 1.0               # mm around the profile
+
+PROFILE                      = "profile"
+TOP                          = "copper_top"
+BOTTOM                       = "copper_bottom"
+
+
+Board = collections.namedtuple("Board", ["name", "directory", "layers", "drills",
+                                         "front", "back"])
+
+
+# ------------------------------------------------------------------------
+# Boards
+# ------------------------------------------------------------------------
+
+def find_board(directory, name=None):
+    """Return the Board of a CAM output directory.
+
+    Layers are named by their file name without its extension (for
+    example "copper_top_l1"); the front and back pick and place files are
+    the Assembly/ files ending in _front.txt and _back.txt.
+    """
+    layers = collections.OrderedDict()
+    for path in sorted(glob.glob(os.path.join(directory, "GerberFiles", "*.gbr"))):
+        layers[os.path.splitext(os.path.basename(path))[0]] = path
+
+    drills = sorted(glob.glob(os.path.join(directory, "DrillFiles", "*.xln")) +
+                    glob.glob(os.path.join(directory, "DrillFiles", "*.drl")))
+    front  = glob.glob(os.path.join(directory, "Assembly", "*_front.txt"))
+    back   = glob.glob(os.path.join(directory, "Assembly", "*_back.txt"))
+
+    if not layers:
+        raise ValueError("No Gerber files in {0}".format(directory))
+
+    return Board(name or os.path.basename(os.path.normpath(directory)), directory, layers,
+                 drills, front[0] if front else None, back[0] if back else None)
+
+# End def
+
+
+def layer_named(board, prefix):
+    """Return the name of the first layer of board starting with prefix."""
+    for name in board.layers:
+        if name.startswith(prefix):
+            return name
+    return None
+
+# End def
+
+
+def board_bounds(board):
+    """Return the window (xmin, ymin, xmax, ymax) in mm of the bitmaps of board."""
+    profile = layer_named(board, PROFILE)
+    paths   = [board.layers[profile]] if profile else list(board.layers.values())
+
+    box = None
+    for path in paths:
+        extent = raster.bounds(path)
+        if extent is None:
+            continue
+        if box is None:
+            box = list(extent)
+        else:
+            box = [min(box[0], extent[0]), min(box[1], extent[1]),
+                   max(box[2], extent[2]), max(box[3], extent[3])]
+
+    if box is None:
+        raise ValueError("Nothing drawn in {0}".format(board.directory))
+
+    return (box[0] - MARGIN, box[1] - MARGIN, box[2] + MARGIN, box[3] + MARGIN)
+
+# End def
+
+
+# ------------------------------------------------------------------------
+# Workers
+# ------------------------------------------------------------------------
+
+def bitmap_path(output, board, layer):
+    return os.path.join(output, board, layer + ".u8")
+
+# End def
+
+
+def rasterize_task(task):
+    """Rasterize one layer. task is (board name, layer, Gerber path,
+    bounds, dpi, output directory).
+
+    Returns (board name, layer, origin, shape, counts, pads, area,
+    unsupported commands)."""
+    (board, layer, path, bounds, dpi, output) = task
+
+    bitmap = raster.Bitmap.create(bitmap_path(output, board, layer), bounds, dpi)
+    reader = gerber.GerberReader(path)
+    (counts, pads) = raster.rasterize(reader, bitmap)
+    area   = checks.copper_area(bitmap)
+    result = (board, layer, bitmap.origin, bitmap.shape, counts, pads, area,
+              dict(reader.unsupported))
+    bitmap.close()
+    return result
+
+# End def
+
+
+def check_task(task):
+    """Check one board. task is (Board, {layer : (origin, shape, pads)},
+    dpi, output directory, min_ring).
+
+    Returns (board name, {layer : Rings}, {side : (Parts, Places)},
+    unsupported drill commands)."""
+    (board, layers, dpi, output, min_ring) = task
+
+    def open_layer(layer):
+        (origin, shape, pads) = layers[layer]
+        return (raster.Bitmap(bitmap_path(output, board.name, layer), origin, shape,
+                              dpi, mode="r"), pads)
+
+    rings       = collections.OrderedDict()
+    unsupported = collections.Counter()
+    for path in board.drills:
+        hits = excellon.read_hits(path)
+        unsupported.update(hits.unsupported)
+        for layer in sorted(layers):
+            if layer.startswith("copper"):
+                (bitmap, pads) = open_layer(layer)
+                rings[layer]   = checks.drill_rings(bitmap, hits, pads, min_ring)
+                bitmap.close()
+
+    places = collections.OrderedDict()
+    for (side, path, prefix) in (("front", board.front, TOP), ("back", board.back, BOTTOM)):
+        layer = layer_named(board, prefix)
+        if path is None or layer is None:
+            continue
+        parts          = assembly.read_parts(path)
+        (bitmap, pads) = open_layer(layer)
+        places[side]   = (parts, checks.centroids_on_pads(bitmap, pads, parts))
+        bitmap.close()
+
+    return (board.name, rings, places, dict(unsupported))
+
+# End def
+
+
+# ------------------------------------------------------------------------
+# Panel
+# ------------------------------------------------------------------------
+
+def check_panel(boards, output, dpi=raster.DPI, workers=None, min_ring=checks.MIN_RING):
+    """Rasterize and check boards (a list of Board, with different names).
+
+    Returns {board name : {"layers" : {layer : (origin, shape, counts,
+    pads, area, unsupported)}, "rings" : ..., "places" : ...,
+    "drill unsupported" : ...}}.
+    """
+    tasks = []
+    for board in boards:
+        os.makedirs(os.path.join(output, board.name), exist_ok=True)
+        bounds = board_bounds(board)
+        for (layer, path) in board.layers.items():
+            tasks.append((board.name, layer, path, bounds, dpi, output))
+
+    # Largest files first, so a big layer does not start last
+    tasks.sort(key=lambda task: -os.path.getsize(task[2]))
+
+    results = collections.OrderedDict((board.name, {"layers" : {}}) for board in boards)
+    pool    = multiprocessing.Pool(workers)
+    try:
+        for result in pool.imap_unordered(rasterize_task, tasks):
+            results[result[0]]["layers"][result[1]] = result[2:]
+
+        check_tasks = []
+        for board in boards:
+            layers = results[board.name]["layers"]
+            check_tasks.append((board, dict((layer, (value[0], value[1], value[3]))
+                                            for (layer, value) in layers.items()),
+                                dpi, output, min_ring))
+
+        for (name, rings, places, unsupported) in pool.imap_unordered(check_task, check_tasks):
+            results[name]["rings"]             = rings
+            results[name]["places"]            = places
+            results[name]["drill unsupported"] = unsupported
+    finally:
+        pool.close()
+        pool.join()
+
+    return results
+
+# End def
+
@@ -0,0 +1,503 @@
+"""
+--------------------------------------------------------------------------
+Rasterizer
+--------------------------------------------------------------------------
+License:
+Copyright 2021 <Jessica Kies>
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors
+may be used to endorse or promote products derived from this software without
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+Rasterizer
+    Overview: Draws Gerber layers into bitmaps of one byte a pixel (1 where
+    the layer has material), memory mapped from a file so that a layer of
+    any size and DPI costs no more than its pages in use.
+
+    Pixel (row, column) covers x from origin x + column * pitch and y from
+    origin y + row * pitch (row 0 is the bottom of the board). A pixel is
+    drawn if its center is inside a shape. Every shape is drawn with NumPy
+    over the window of pixels around it:
+      - circles, lines with a round aperture (capsules) and rectangles
+        from the distance of each pixel center
+      - everything else (regions, polygons, macro outlines, lines with a
+        square aperture) as a polygon, filled with the even-odd rule by
+        counting the edge crossings left of each pixel center
+
+    rasterize() draws the events of a gerber.GerberReader as they come,
+    so the layer is never held as a list of shapes.
+
+--------------------------------------------------------------------------
+"""
+import array
+import math
+import re
+
+import numpy
+
+from . import gerber
+
+
+# ------------------------------------------------------------------------
+# Global Constants
+# ------------------------------------------------------------------------
+DPI                          = 1000
+CIRCLE_POINTS                = 32                # outline of a round aperture end
+
+EXPRESSION                   = re.compile(r"^[-+*/(). \d]*$")
+VARIABLE                     = re.compile(r"\$(\d+)")
+
+
+# ------------------------------------------------------------------------
+# Bitmap
+# ------------------------------------------------------------------------
+
+class Bitmap(object):
+    """A memory mapped layer bitmap."""
+
+    def __init__(self, path, origin, shape, dpi=DPI, mode="w+"):
+        """Map path (created if mode is "w+").
+
+        :param origin: (x, y) in mm of the bottom left corner
+        :param shape:  (rows, columns)
+        """
+        self.path   = path
+        self.origin = origin
+        self.shape  = tuple(shape)
+        self.dpi    = dpi
+        self.pitch  = 25.4 / dpi
+        self.pixels = numpy.memmap(path, dtype=numpy.uint8, mode=mode, shape=self.shape)
+
+    # End def
+
+    @classmethod
+    def create(cls, path, bounds, dpi=DPI):
+        """Make a bitmap covering bounds (xmin, ymin, xmax, ymax) in mm."""
+        pitch = 25.4 / dpi
+        shape = (int(math.ceil((bounds[3] - bounds[1]) / pitch)),
+                 int(math.ceil((bounds[2] - bounds[0]) / pitch)))
+        return cls(path, (bounds[0], bounds[1]), shape, dpi)
+
+    # End def
+
+    def window(self, xmin, ymin, xmax, ymax):
+        """Return (rows slice, columns slice, x of the column centers, y of
+        the row centers) of the pixels that can have their center in the
+        box, or None if there are none."""
+        (x0, y0) = self.origin
+        pitch    = self.pitch
+        c0 = max(0, int(math.floor((xmin - x0) / pitch - 0.5)))
+        c1 = min(self.shape[1], int(math.ceil((xmax - x0) / pitch - 0.5)) + 1)
+        r0 = max(0, int(math.floor((ymin - y0) / pitch - 0.5)))
+        r1 = min(self.shape[0], int(math.ceil((ymax - y0) / pitch - 0.5)) + 1)
+        if c0 >= c1 or r0 >= r1:
+            return None
+
+        xs = x0 + (numpy.arange(c0, c1) + 0.5) * pitch
+        ys = y0 + (numpy.arange(r0, r1) + 0.5) * pitch
+        return (slice(r0, r1), slice(c0, c1), xs, ys)
+
+    # End def
+
+    def paint(self, window, mask, value):
+        """Set the pixels of window where mask is true to value."""
+        self.pixels[window[0], window[1]][mask] = value
+
+    # End def
+
+    def circle(self, cx, cy, diameter, value):
+        radius = diameter / 2.0
+        window = self.window(cx - radius, cy - radius, cx + radius, cy + radius)
+        if window is not None:
+            dx = window[2] - cx
+            dy = window[3] - cy
+            self.paint(window, dy[:, None] ** 2 + dx[None, :] ** 2 <= radius * radius, value)
+
+    # End def
+
+    def rectangle(self, cx, cy, width, height, value):
+        window = self.window(cx - width / 2.0, cy - height / 2.0,
+                             cx + width / 2.0, cy + height / 2.0)
+        if window is not None:
+            inside_x = numpy.abs(window[2] - cx) <= width / 2.0
+            inside_y = numpy.abs(window[3] - cy) <= height / 2.0
+            self.paint(window, inside_y[:, None] & inside_x[None, :], value)
+
+    # End def
+
+    def capsule(self, x1, y1, x2, y2, diameter, value):
+        """Draw a line with a round aperture."""
+        radius = diameter / 2.0
+        window = self.window(min(x1, x2) - radius, min(y1, y2) - radius,
+                             max(x1, x2) + radius, max(y1, y2) + radius)
+        if window is None:
+            return
+
+        dx     = x2 - x1
+        dy     = y2 - y1
+        length = dx * dx + dy * dy
+        px     = window[2][None, :] - x1
+        py     = window[3][:, None] - y1
+        if length == 0.0:
+            self.paint(window, px * px + py * py <= radius * radius, value)
+            return
+
+        # Distance from each pixel center to the closest point of the line
+        t  = numpy.clip((px * dx + py * dy) / length, 0.0, 1.0)
+        ex = px - t * dx
+        ey = py - t * dy
+        self.paint(window, ex * ex + ey * ey <= radius * radius, value)
+
+    # End def
+
+    def polygon(self, points, value):
+        """Fill a closed polygon ((N, 2) array or list of (x, y)) with the
+        even-odd rule."""
+        points = numpy.asarray(points, dtype=numpy.float64)
+        if len(points) < 3:
+            return
+        window = self.window(points[:, 0].min(), points[:, 1].min(),
+                             points[:, 0].max(), points[:, 1].max())
+        if window is None:
+            return
+
+        (xs, ys) = (window[2], window[3])
+        pitch    = self.pitch
+        x1 = points[:, 0]
+        y1 = points[:, 1]
+        x2 = numpy.roll(x1, -1)
+        y2 = numpy.roll(y1, -1)
+
+        # Rows whose center line each edge crosses (low <= y < high)
+        low   = numpy.minimum(y1, y2)
+        high  = numpy.maximum(y1, y2)
+        first = numpy.clip(numpy.ceil((low - ys[0]) / pitch), 0, len(ys)).astype(numpy.int64)
+        last  = numpy.clip(numpy.ceil((high - ys[0]) / pitch), 0, len(ys)).astype(numpy.int64)
+        count = numpy.maximum(last - first, 0)
+        total = int(count.sum())
+        if total == 0:
+            return
+
+        # One entry per (edge, row) crossing
+        edge   = numpy.repeat(numpy.arange(len(points)), count)
+        offset = numpy.arange(total) - numpy.repeat(numpy.cumsum(count) - count, count)
+        row    = first[edge] + offset
+        y      = ys[row]
+        x      = x1[edge] + (y - y1[edge]) * (x2[edge] - x1[edge]) / (y2[edge] - y1[edge])
+
+        # The pixels right of a crossing have one more crossing on their left
+        column = numpy.clip(numpy.floor((x - xs[0]) / pitch) + 1, 0, len(xs)).astype(numpy.int64)
+        counts = numpy.zeros((len(ys), len(xs) + 1), dtype=numpy.uint8)
+        numpy.add.at(counts, (row, column), 1)
+        inside = (numpy.cumsum(counts, axis=1, dtype=numpy.uint32)[:, :-1] & 1).astype(bool)
+        self.paint(window, inside, value)
+
+    # End def
+
+    def sample(self, x, y):
+        """Return the pixels at arrays of points (0 outside the bitmap)."""
+        (x0, y0) = self.origin
+        columns  = numpy.floor((numpy.asarray(x) - x0) / self.pitch).astype(numpy.int64)
+        rows     = numpy.floor((numpy.asarray(y) - y0) / self.pitch).astype(numpy.int64)
+        inside   = ((columns >= 0) & (columns < self.shape[1]) &
+                    (rows >= 0) & (rows < self.shape[0]))
+        values   = numpy.zeros(columns.shape, dtype=numpy.uint8)
+        values[inside] = self.pixels[rows[inside], columns[inside]]
+        return values
+
+    # End def
+
+    def area(self):
+        """Return the area drawn, in mm^2."""
+        return int(numpy.count_nonzero(self.pixels)) * self.pitch * self.pitch
+
+    # End def
+
+    def write_pgm(self, path):
+        """Write the bitmap as a PGM image (top of the board at the top)."""
+        with open(path, "wb") as image:
+            image.write("P5\n{0} {1}\n255\n".format(self.shape[1], self.shape[0]).encode("ascii"))
+            for start in range(self.shape[0], 0, -1024):
+                rows = self.pixels[max(0, start - 1024):start][::-1]
+                image.write((rows * 255).astype(numpy.uint8).tobytes())
+
+    # End def
+
+    def close(self):
+        """Write the bitmap out and unmap it."""
+        if self.pixels._mmap is not None:
+            self.pixels.flush()
+        self.pixels = None
+
+    # End def
+
+# End class
+
+
+# ------------------------------------------------------------------------
+# Apertures
+# ------------------------------------------------------------------------
+
+def regular_polygon(cx, cy, diameter, vertices, rotation):
+    """Return the points of a regular polygon."""
+    angles = numpy.radians(rotation + 360.0 * numpy.arange(int(vertices)) / int(vertices))
+    return numpy.column_stack([cx + diameter / 2.0 * numpy.cos(angles),
+                               cy + diameter / 2.0 * numpy.sin(angles)])
+
+# End def
+
+
+def rotate(points, rotation):
+    """Return points rotated by rotation degrees about the origin."""
+    if not rotation:
+        return points
+    angle  = math.radians(rotation)
+    (c, s) = (math.cos(angle), math.sin(angle))
+    return numpy.column_stack([points[:, 0] * c - points[:, 1] * s,
+                               points[:, 0] * s + points[:, 1] * c])
+
+# End def
+
+
+def evaluate(text, variables):
+    """Return the value of a macro expression ("x" is multiply)."""
+    text = VARIABLE.sub(lambda match: repr(variables.get(int(match.group(1)), 0.0)), text)
+    text = text.replace("x", "*").replace("X", "*")
+    if not EXPRESSION.match(text):
+        raise ValueError("Invalid macro expression '{0}'".format(text))
+    return float(eval(text, {"__builtins__" : {}}, {}))
+
+# End def
+
+
+def macro_shapes(aperture):
+    """Return the shapes of a macro aperture, about its center, in mm:
+    [(exposure, "circle", (cx, cy, diameter)) or (exposure, "polygon", points)].
+    Primitives other than circles, outlines, polygons and lines are skipped."""
+    variables = dict((index + 1, value) for (index, value) in enumerate(aperture.params))
+    scale     = aperture.scale
+    shapes    = []
+
+    for primitive in aperture.macro or []:
+        if primitive.startswith("0"):
+            continue                             # comment
+        if primitive.startswith("$"):
+            (name, text) = primitive.split("=", 1)
+            variables[int(name[1:])] = evaluate(text, variables)
+            continue
+
+        values = [evaluate(value, variables) for value in primitive.split(",")]
+        code   = int(values[0])
+
+        if code == 1:
+            rotation = values[5] if len(values) > 5 else 0.0
+            center   = rotate(numpy.array([[values[3], values[4]]]) * scale, rotation)[0]
+            shapes.append((values[1], "circle", (center[0], center[1], values[2] * scale)))
+        elif code == 4:
+            count  = int(values[2])
+            points = numpy.array(values[3:3 + 2 * (count + 1)]).reshape(-1, 2) * scale
+            shapes.append((values[1], "polygon", rotate(points, values[3 + 2 * (count + 1)])))
+        elif code == 5:
+            points = regular_polygon(values[3] * scale, values[4] * scale, values[5] * scale,
+                                     values[2], 0.0)
+            shapes.append((values[1], "polygon", rotate(points, values[6])))
+        elif code == 20:
+            (width, x1, y1, x2, y2) = [value * scale for value in values[2:7]]
+            (dx, dy) = (x2 - x1, y2 - y1)
+            length   = math.hypot(dx, dy) or 1.0
+            (nx, ny) = (-dy / length * width / 2.0, dx / length * width / 2.0)
+            points   = numpy.array([[x1 + nx, y1 + ny], [x2 + nx, y2 + ny],
+                                    [x2 - nx, y2 - ny], [x1 - nx, y1 - ny]])
+            shapes.append((values[1], "polygon", rotate(points, values[7])))
+        elif code == 21:
+            (width, height, cx, cy) = [value * scale for value in values[2:6]]
+            points = numpy.array([[cx - width / 2, cy - height / 2], [cx + width / 2, cy - height / 2],
+                                  [cx + width / 2, cy + height / 2], [cx - width / 2, cy + height / 2]])
+            shapes.append((values[1], "polygon", rotate(points, values[6])))
+
+    return shapes
+
+# End def
+
+
+def outline(aperture):
+    """Return the outline points of a standard aperture about its center
+    (for lines drawn with it)."""
+    shape  = aperture.shape
+    params = aperture.params
+
+    if shape == "R":
+        (w, h) = (params[0] / 2.0, params[1] / 2.0)
+        return numpy.array([[-w, -h], [w, -h], [w, h], [-w, h]])
+    if shape == "P":
+        return regular_polygon(0.0, 0.0, params[0], params[1], params[2] if len(params) > 2 else 0.0)
+    if shape == "O":
+        (w, h)  = (params[0], params[1])
+        radius  = min(w, h) / 2.0
+        angles  = numpy.linspace(0, 2 * math.pi, CIRCLE_POINTS, endpoint=False)
+        circle  = numpy.column_stack([radius * numpy.cos(angles), radius * numpy.sin(angles)])
+        offset  = numpy.array([(w - h) / 2.0, 0.0]) if w > h else numpy.array([0.0, (h - w) / 2.0])
+        return numpy.vstack([circle + offset, circle - offset])
+    return regular_polygon(0.0, 0.0, params[0] if params else 0.0, CIRCLE_POINTS, 0.0)
+
+# End def
+
+
+def convex_hull(points):
+    """Return the convex hull of points (monotone chain), counterclockwise."""
+    points = sorted(set(map(tuple, numpy.round(points, 9))))
+    if len(points) < 3:
+        return numpy.array(points)
+
+    def cross(o, a, b):
+        return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+    lower = []
+    for point in points:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], point) <= 0:
+            lower.pop()
+        lower.append(point)
+    upper = []
+    for point in reversed(points):
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], point) <= 0:
+            upper.pop()
+        upper.append(point)
+    return numpy.array(lower[:-1] + upper[:-1])
+
+# End def
+
+
+def flash(bitmap, aperture, x, y, value, cache):
+    """Draw aperture at (x, y).
+
+    :param cache: dict of macro shapes by aperture, filled as needed
+    """
+    shape  = aperture.shape
+    params = aperture.params
+
+    if shape == "C":
+        bitmap.circle(x, y, params[0], value)
+    elif shape == "R":
+        bitmap.rectangle(x, y, params[0], params[1], value)
+    elif shape == "O":
+        (w, h) = (params[0], params[1])
+        if w > h:
+            bitmap.rectangle(x, y, w - h, h, value)
+            bitmap.circle(x - (w - h) / 2.0, y, h, value)
+            bitmap.circle(x + (w - h) / 2.0, y, h, value)
+        else:
+            bitmap.rectangle(x, y, w, h - w, value)
+            bitmap.circle(x, y - (h - w) / 2.0, w, value)
+            bitmap.circle(x, y + (h - w) / 2.0, w, value)
+    elif shape == "P":
+        bitmap.polygon(outline(aperture) + (x, y), value)
+    else:
+        shapes = cache.get(id(aperture))
+        if shapes is None:
+            shapes = cache[id(aperture)] = macro_shapes(aperture)
+        for (exposure, kind, data) in shapes:
+            shape_value = value if exposure else 1 - value
+            if kind == "circle":
+                bitmap.circle(x + data[0], y + data[1], data[2], shape_value)
+            else:
+                bitmap.polygon(data + (x, y), shape_value)
+
+# End def
+
+
+def line(bitmap, aperture, x1, y1, x2, y2, value):
+    """Draw a line with aperture from (x1, y1) to (x2, y2)."""
+    if aperture.shape == "C":
+        bitmap.capsule(x1, y1, x2, y2, aperture.params[0], value)
+    elif aperture.shape in ("R", "O", "P"):
+        shape = outline(aperture)
+        bitmap.polygon(convex_hull(numpy.vstack([shape + (x1, y1), shape + (x2, y2)])), value)
+    else:
+        # Lines should not be drawn with macros; use the first shape's size
+        bitmap.capsule(x1, y1, x2, y2, aperture.params[0] * aperture.scale
+                       if aperture.params else 0.0, value)
+
+# End def
+
+
+# ------------------------------------------------------------------------
+# Layers
+# ------------------------------------------------------------------------
+
+def bounds(path):
+    """Return the (xmin, ymin, xmax, ymax) in mm of what a Gerber file
+    draws (None if nothing), from one pass over its events."""
+    box = [float("inf"), float("inf"), float("-inf"), float("-inf")]
+
+    def grow(x, y, margin):
+        box[0] = min(box[0], x - margin)
+        box[1] = min(box[1], y - margin)
+        box[2] = max(box[2], x + margin)
+        box[3] = max(box[3], y + margin)
+
+    for event in gerber.GerberReader(path).events():
+        if event[0] == gerber.REGION:
+            for (x, y) in event[1]:
+                grow(x, y, 0.0)
+            continue
+
+        params = event[1].params
+        margin = max(params[:2]) / 2.0 if params and event[1].macro is None else 0.0
+        grow(event[2], event[3], margin)
+        if event[0] == gerber.LINE:
+            grow(event[4], event[5], margin)
+
+    return tuple(box) if box[0] <= box[2] else None
+
+# End def
+
+
+def rasterize(reader, bitmap):
+    """Draw the events of reader (a gerber.GerberReader) into bitmap.
+
+    Returns (counts of the events by kind, (N, 2) array of the flash
+    centers), the flashes being the pads of a copper layer.
+    """
+    counts  = {gerber.FLASH : 0, gerber.LINE : 0, gerber.REGION : 0}
+    flashes = array.array("d")
+    cache   = {}
+
+    for event in reader.events():
+        kind = event[0]
+        counts[kind] += 1
+
+        if kind == gerber.FLASH:
+            flash(bitmap, event[1], event[2], event[3], event[4], cache)
+            flashes.append(event[2])
+            flashes.append(event[3])
+        elif kind == gerber.LINE:
+            line(bitmap, event[1], event[2], event[3], event[4], event[5], event[6])
+        else:
+            bitmap.polygon(event[1], event[2])
+
+    return (counts, numpy.frombuffer(flashes, dtype=numpy.float64).reshape(-1, 2))
+
+# End def
+
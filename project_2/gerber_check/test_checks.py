@@ -0,0 +1,125 @@
+"""
+--------------------------------------------------------------------------
+Board Check Tests
+--------------------------------------------------------------------------
+License:
+Copyright 2021 <Jessica Kies>
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors
+may be used to endorse or promote products derived from this software without
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+Board Check Tests
+    Overview: Tests of the checks on small bitmaps drawn here, so they do
+    not need the CAM outputs.
+
+    Usage:
+        python3 -m unittest gerber_check.test_checks
+
+--------------------------------------------------------------------------
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from . import assembly
+from . import checks
+from . import raster
+
+
+# ------------------------------------------------------------------------
+# Tests
+# ------------------------------------------------------------------------
+
+class TestCentroidsOnPads(unittest.TestCase):
+    """Every part is counted in exactly one of the Places arrays."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="gerber_check_")
+        self.bitmap    = raster.Bitmap.create(os.path.join(self.directory, "copper.bin"),
+                                              (0.0, 0.0, 30.0, 10.0))
+
+        # A two pad part around (5, 5), and a big pad at (20, 5) with
+        # a pad on either side of it
+        self.pads = numpy.array([[4.0, 5.0], [6.0, 5.0],
+                                 [18.0, 5.0], [20.0, 5.0], [22.0, 5.0]])
+        for (x, y) in self.pads[:2]:
+            self.bitmap.circle(x, y, 1.0, 1)
+        self.bitmap.circle(20.0, 5.0, 2.0, 1)
+
+    # End def
+
+    def tearDown(self):
+        self.bitmap.close()
+        shutil.rmtree(self.directory)
+
+    # End def
+
+    def places(self, points):
+        """Check parts at points, returning (Parts, Places)."""
+        points = numpy.array(points, dtype=float)
+        names  = ["U{0}".format(index) for index in range(len(points))]
+        parts  = assembly.Parts(names, points[:, 0], points[:, 1],
+                                numpy.zeros(len(points)), names, names)
+        return (parts, checks.centroids_on_pads(self.bitmap, self.pads, parts))
+
+    # End def
+
+    def test_counts_add_up(self):
+        """on copper + between pads + failed is the number of parts."""
+        (parts, places) = self.places([[5.0, 5.0], [20.0, 5.0], [4.0, 5.0], [28.0, 9.0]])
+
+        self.assertEqual(places.on_copper.tolist(), [False, True, True, False])
+        self.assertEqual(places.between.tolist(),   [True, False, False, False])
+        self.assertEqual(places.failed.tolist(),    [False, False, False, True])
+        self.assertEqual(int(places.on_copper.sum()) + int(places.between.sum()) +
+                         int(places.failed.sum()), len(parts.names))
+
+    # End def
+
+    def test_exclusive(self):
+        """No part is in two of the Places arrays."""
+        (x, y)          = numpy.meshgrid(numpy.linspace(0.5, 29.5, 59), numpy.linspace(0.5, 9.5, 19))
+        (parts, places) = self.places(numpy.column_stack([x.ravel(), y.ravel()]))
+
+        total = (places.on_copper.astype(int) + places.between.astype(int) +
+                 places.failed.astype(int))
+        self.assertTrue((total == 1).all())
+        self.assertEqual(int(total.sum()), len(parts.names))
+
+    # End def
+
+# End class
+
+
+# ------------------------------------------------------------------------
+# Main script
+# ------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    unittest.main()
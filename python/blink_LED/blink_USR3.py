@@ -33,19 +33,29 @@ THE POSSIBILITY OF SUCH DAMAGE.
 --------------------------------------------------------------------------
 
 Program that will:
-    Use Adafruit BBIO library to blink the USR3 LED of the pocketbeagle at 5Hz
+    Blink the USR3 LED of the pocketbeagle at 5Hz
+
+    The blinking is handed to the kernel's LED timer trigger (see
+    usr_leds.py), so no process has to stay awake for it and the LED keeps
+    blinking after this program exits. If the kernel has no timer trigger,
+    this program blinks the LED itself until it is stopped (Ctrl-C).
+
+    python blink_USR3.py           --> start blinking
+    python blink_USR3.py --stop    --> give USR3 back its boot trigger
+    python blink_USR3.py --stop --trigger NAME --> or trigger NAME
 
 --------------------------------------------------------------------------
 """
-#using code from On-Board LEDs section of README.md file at https://github.com/adafruit/adafruit-beaglebone-io-python
+import argparse
 
-import Adafruit_BBIO.GPIO as GPIO
-import time
+import usr_leds
 
 # ------------------------------------------------------------------------
 # Constants
 # ------------------------------------------------------------------------
-
+LED        = "USR3"
+ON_TIME    = 100                        # ms; 100 on + 100 off is 5Hz
+OFF_TIME   = 100
 
 # ------------------------------------------------------------------------
 # Global variables
@@ -62,11 +72,23 @@ import time
 # Main script
 # ------------------------------------------------------------------------
 
-    #switch between between high(on) and low(off) every 0.1 sec
-while True:
-        for i in range(1):
-            GPIO.output("USR3", GPIO.HIGH)
-            time.sleep(0.1)
-        for i in range(1):
-            GPIO.output("USR3", GPIO.LOW)
-            time.sleep(0.1) 
\ No newline at end of file
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Blink USR3 at 5Hz")
+    parser.add_argument("--stop", action="store_true", help="stop blinking")
+    parser.add_argument("--trigger", help="trigger to go back to when stopping "
+                                          "(default: the LED's boot trigger)")
+    args = parser.parse_args()
+
+    led = usr_leds.LED(LED)
+
+    if args.stop:
+        led.restore(args.trigger)
+    else:
+        pattern = led.blink(ON_TIME, OFF_TIME)
+
+        #Blinking in this process (no timer trigger): wait until stopped
+        try:
+            while not pattern.wait(1.0):
+                pass
+        except KeyboardInterrupt:
+            led.restore()
@@ -0,0 +1,387 @@
+# -*- coding: utf-8 -*-
+"""
+--------------------------------------------------------------------------
+Software PWM
+--------------------------------------------------------------------------
+License:   
+Copyright 2021 Jessica Kies
+
+Redistribution and use in source and binary forms, with or without 
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, 
+this list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice, 
+this list of conditions and the following disclaimer in the documentation 
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors 
+may be used to endorse or promote products derived from this software without 
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF 
+THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+Software PWM for pins without a PWM module (e.g. to dim a status LED, or
+to make a tone on a GPIO), with any number of pins run by one thread.
+
+  - Each pin is written through a file descriptor that stays open
+    (os.pwrite of "0" / "1"), not by opening its sysfs file every time,
+    and only when its level changes
+  - Edge times are worked out from the start of each period, so errors
+    never add up; a pin that falls more than a period behind skips ahead
+    (counted in overruns) instead of toggling as fast as it can to catch up
+  - The thread sleeps until SPIN_TIME before the next edge and then spins
+    on time.perf_counter() for the rest, since a sleep can wake up late
+    by a lot more than the spin costs
+
+    pwm     = SoftPWM()
+    channel = pwm.add(gpio_pin(60), 100, 0.25)      # 100 Hz, 25% duty
+    pwm.start()
+    pwm.set(channel, 440, 0.5)
+    pwm.stop()
+
+Running this file directly runs pins at 10 Hz, 100 Hz and 1 kHz and
+reports their real frequency, how far edges were from their schedule
+(jitter) and the CPU used. The pins are in memory (or regular files with
+--file):
+    python soft_pwm.py [--pins N] [--seconds S] [--spin S] [--file]
+
+--------------------------------------------------------------------------
+"""
+import heapq
+import os
+import threading
+import time
+
+# ------------------------------------------------------------------------
+# Constants
+# ------------------------------------------------------------------------
+GPIO_ROOT    = "/sys/class/gpio"
+SPIN_TIME    = 0.0002                   # seconds spun before each edge
+
+# ------------------------------------------------------------------------
+# Pins
+# ------------------------------------------------------------------------
+
+class FilePin(object):
+    """A pin set by writing to a file (a sysfs GPIO value or LED
+    brightness) that is kept open."""
+
+    def __init__(self, path, high=b"1", low=b"0"):
+        """Open path. Will throw an OSError if it cannot be opened."""
+        self.path   = path
+        self.levels = (low, high)
+        self.fd     = os.open(path, os.O_WRONLY)
+
+    #End def
+
+    def write(self, level):
+        os.pwrite(self.fd, self.levels[level], 0)
+
+    def close(self):
+        os.close(self.fd)
+
+    #End def
+
+#End class
+
+class MemoryPin(object):
+    """A pin that only remembers its level (for benchmarks)."""
+
+    def __init__(self):
+        self.level = 0
+
+    #End def
+
+    def write(self, level):
+        self.level = level
+
+    def close(self):
+        pass
+
+    #End def
+
+#End class
+
+def gpio_pin(gpio, root=GPIO_ROOT):
+    """Return the FilePin of an exported output gpioNN."""
+    return FilePin(os.path.join(root, "gpio{0}".format(gpio), "value"))
+
+#End def
+
+def led_pin(led):
+    """Return the FilePin of a usr_leds.LED (which should have no trigger)."""
+    return FilePin(os.path.join(led.path, "brightness"),
+                   high=led.read("max_brightness").encode("ascii"))
+
+#End def
+
+# ------------------------------------------------------------------------
+# PWM
+# ------------------------------------------------------------------------
+
+class Channel(object):
+    """One pin's PWM settings and state."""
+
+    def __init__(self, index, pin, frequency, duty):
+        self.index        = index
+        self.pin          = pin
+        self.frequency    = frequency
+        self.duty         = duty
+        self.level        = None
+        self.period_start = 0.0
+        self.version      = 0           # changes make queued edges stale
+
+    #End def
+
+#End class
+
+class SoftPWM(object):
+    """Runs the PWM of any number of pins from one thread."""
+
+    def __init__(self, spin=SPIN_TIME):
+        self.spin      = spin
+        self.channels  = []
+        self.queue     = []             # heap of (time, index, version)
+        self.condition = threading.Condition()
+        self.thread    = None
+        self.running   = False
+        self.overruns  = 0
+        self.record    = None           # list of (index, scheduled, written)
+
+    #End def
+
+    def add(self, pin, frequency, duty):
+        """Add a pin, running at frequency (Hz) with duty (0 - 1). Returns its
+        Channel."""
+        with self.condition:
+            channel = Channel(len(self.channels), pin, frequency, duty)
+            self.channels.append(channel)
+            self._schedule(channel)
+        return channel
+
+    #End def
+
+    def set(self, channel, frequency=None, duty=None):
+        """Change the frequency and / or duty of a channel (from the start of
+        a new period)."""
+        with self.condition:
+            if frequency is not None:
+                channel.frequency = frequency
+            if duty is not None:
+                channel.duty = duty
+            channel.version += 1
+            self._schedule(channel)
+
+    #End def
+
+    def _schedule(self, channel):
+        """Start a new period of channel now (the lock must be held)."""
+        channel.period_start = time.perf_counter()
+        heapq.heappush(self.queue, (channel.period_start, channel.index, channel.version))
+        self.condition.notify()
+
+    #End def
+
+    def _edge(self, channel, deadline, now):
+        """Write the edge of channel due at deadline (it is now now); return
+        the time of its next edge (None: no more edges)."""
+        if channel.duty <= 0.0 or channel.duty >= 1.0 or channel.frequency <= 0:
+            level = 1 if channel.duty >= 1.0 else 0
+            if level != channel.level:
+                channel.pin.write(level)
+                channel.level = level
+            return None
+
+        period = 1.0 / channel.frequency
+        fall   = channel.period_start + channel.duty * period
+
+        if deadline < fall:
+            level     = 1
+            next_edge = fall
+        else:
+            level     = 0
+            next_edge = channel.period_start + period
+
+        if level != channel.level:
+            channel.pin.write(level)
+            channel.level = level
+
+        if level == 0:
+            channel.period_start = next_edge
+            if now - next_edge > period:
+                # More than a period behind: start a new period now
+                self.overruns       += 1
+                channel.period_start = now
+                next_edge            = now
+
+        return next_edge
+
+    #End def
+
+    def run(self):
+        """Write edges until stop() (the body of the thread)."""
+        spin    = self.spin
+        clock   = time.perf_counter
+        queue   = self.queue
+        record  = self.record
+
+        with self.condition:
+            while self.running:
+                if not queue:
+                    self.condition.wait()
+                    continue
+
+                (deadline, index, version) = queue[0]
+                wait = deadline - clock() - spin
+                if wait > 0:
+                    # add() and set() wake this up to look at the queue again
+                    self.condition.wait(wait)
+                    continue
+
+                while clock() < deadline:
+                    pass
+
+                heapq.heappop(queue)
+                channel = self.channels[index]
+                if version != channel.version:
+                    continue
+
+                next_edge = self._edge(channel, deadline, clock())
+                if record is not None:
+                    record.append((index, deadline, clock()))
+                if next_edge is not None:
+                    heapq.heappush(queue, (next_edge, index, version))
+
+    #End def
+
+    def start(self):
+        """Start the thread."""
+        self.running = True
+        self.thread  = threading.Thread(target=self.run, name="soft-pwm")
+        self.thread.daemon = True
+        self.thread.start()
+
+    #End def
+
+    def stop(self):
+        """Stop the thread and set every pin low."""
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+        for channel in self.channels:
+            channel.pin.write(0)
+            channel.level = 0
+
+    #End def
+
+#End class
+
+# ------------------------------------------------------------------------
+# Benchmark
+# ------------------------------------------------------------------------
+
+def percentile(values, fraction):
+    """Return the value at fraction (0 - 1) of the sorted values."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+#End def
+
+def measure(pins, frequency, seconds, spin):
+    """Run pins at frequency (50% duty) for seconds.
+
+    Returns (real frequency, sorted edge errors in s, CPU fraction, overruns).
+    """
+    pwm        = SoftPWM(spin)
+    pwm.record = []
+    for pin in pins:
+        pwm.add(pin, frequency, 0.5)
+
+    cpu   = time.process_time()
+    start = time.perf_counter()
+    pwm.start()
+    time.sleep(seconds)
+    pwm.stop()
+    cpu   = (time.process_time() - cpu) / (time.perf_counter() - start)
+
+    # Every other edge of a channel is a rising one
+    rates  = []
+    errors = []
+    for index in range(len(pins)):
+        edges = [(scheduled, written) for (channel, scheduled, written) in pwm.record
+                 if channel == index]
+        errors.extend(written - scheduled for (scheduled, written) in edges)
+        rising = edges[::2]
+        if len(rising) > 1:
+            rates.append((len(rising) - 1) / (rising[-1][1] - rising[0][1]))
+
+    return (sum(rates) / max(1, len(rates)), sorted(errors), cpu, pwm.overruns)
+
+#End def
+
+# ------------------------------------------------------------------------
+# Main script
+# ------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    import argparse
+    import shutil
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Software PWM jitter benchmark")
+    parser.add_argument("--pins", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--spin", type=float, default=SPIN_TIME,
+                        help="seconds spun before each edge (0: sleep only)")
+    parser.add_argument("--file", action="store_true",
+                        help="write the pins to regular files instead of memory")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp() if args.file else None
+
+    print("{0} pins, spin {1:.0f} us, {2}".format(args.pins, args.spin * 1e6,
+                                                  "files" if args.file else "memory"))
+    print("{0:>8} {1:>12} {2:>10} {3:>10} {4:>10} {5:>8} {6:>9}".format(
+          "Hz", "real Hz", "p50 us", "p99 us", "max us", "CPU", "overruns"))
+
+    try:
+        for frequency in [10, 100, 1000]:
+            if args.file:
+                pins = []
+                for index in range(args.pins):
+                    path = os.path.join(root, "pin{0}".format(index))
+                    with open(path, "w") as pin_file:
+                        pin_file.write("0")
+                    pins.append(FilePin(path))
+            else:
+                pins = [MemoryPin() for index in range(args.pins)]
+
+            (real, errors, cpu, overruns) = measure(pins, frequency, args.seconds, args.spin)
+            print("{0:>8} {1:>12.2f} {2:>10.1f} {3:>10.1f} {4:>10.1f} {5:>7.0%} {6:>9}".format(
+                  frequency, real, percentile(errors, 0.5) * 1e6,
+                  percentile(errors, 0.99) * 1e6, errors[-1] * 1e6 if errors else 0.0,
+                  cpu, overruns))
+
+            for pin in pins:
+                pin.close()
+    finally:
+        if root is not None:
+            shutil.rmtree(root)
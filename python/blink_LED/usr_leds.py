@@ -0,0 +1,440 @@
+# -*- coding: utf-8 -*-
+"""
+--------------------------------------------------------------------------
+USR LEDs
+--------------------------------------------------------------------------
+License:   
+Copyright 2021 Jessica Kies
+
+Redistribution and use in source and binary forms, with or without 
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, 
+this list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice, 
+this list of conditions and the following disclaimer in the documentation 
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors 
+may be used to endorse or promote products derived from this software without 
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF 
+THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+Blink patterns for the PocketBeagle's four USR LEDs (USR0 - USR3) through
+the kernel LED class in /sys/class/leds.
+
+Simple patterns are handed to the kernel's LED triggers, so no process has
+to stay awake to run them (and they keep going after the program exits):
+  - blink(on_ms, off_ms)      --> "timer" trigger (delay_on / delay_off)
+  - heartbeat()               --> "heartbeat" trigger
+  - oneshot(on_ms, off_ms)    --> "oneshot" trigger (one flash)
+
+Any other sequence of on / off steps (e.g. Morse code from morse()) is
+played by play() in a thread, which sleeps until the absolute
+time.monotonic() deadline of each step, so timing errors never add up.
+The simple patterns fall back to play() too if the kernel does not have
+their trigger.
+
+    led     = LED("USR3")
+    pattern = led.blink(100, 100)           # 5 Hz, no CPU used
+    pattern = led.morse("SOS")              # in a thread
+    pattern.stop()
+    led.restore()                           # back to the boot trigger
+
+restore() goes back to the trigger the LED had the first time this process
+read it, unless that is one of the pattern triggers set here (then a
+pattern started by another process, e.g. blink_USR3.py, was still on): then
+it goes back to the PocketBeagle's default trigger in DEFAULT_TRIGGERS.
+
+The LED files can be read from any directory laid out like
+/sys/class/leds; make_fake_leds() makes one, to try the code without a
+board:
+    python usr_leds.py [--board] [--no-triggers]
+
+--------------------------------------------------------------------------
+"""
+import os
+import threading
+import time
+
+# ------------------------------------------------------------------------
+# Constants
+# ------------------------------------------------------------------------
+LEDS_ROOT    = "/sys/class/leds"
+
+LED_NAMES    = {
+    "USR0" : "beaglebone:green:usr0",
+    "USR1" : "beaglebone:green:usr1",
+    "USR2" : "beaglebone:green:usr2",
+    "USR3" : "beaglebone:green:usr3"
+}
+
+# Triggers the PocketBeagle boots with
+DEFAULT_TRIGGERS = {
+    "USR0" : "heartbeat",
+    "USR1" : "mmc0",
+    "USR2" : "cpu0",
+    "USR3" : "mmc1"
+}
+
+# Triggers set by the patterns here, never restored to
+PATTERN_TRIGGERS = ("timer", "oneshot", "heartbeat", "none")
+
+# Kernel heartbeat pattern (at a low load): two beats, then a pause
+HEARTBEAT    = [(1, 70), (0, 180), (1, 70), (0, 680)]
+
+# Morse code: dot is 1 unit on, dash is 3; 1 unit between the parts of a
+# letter, 3 between letters and 7 between words
+MORSE_CODE   = {
+    "A" : ".-",    "B" : "-...",  "C" : "-.-.",  "D" : "-..",   "E" : ".",
+    "F" : "..-.",  "G" : "--.",   "H" : "....",  "I" : "..",    "J" : ".---",
+    "K" : "-.-",   "L" : ".-..",  "M" : "--",    "N" : "-.",    "O" : "---",
+    "P" : ".--.",  "Q" : "--.-",  "R" : ".-.",   "S" : "...",   "T" : "-",
+    "U" : "..-",   "V" : "...-",  "W" : ".--",   "X" : "-..-",  "Y" : "-.--",
+    "Z" : "--..",
+    "0" : "-----", "1" : ".----", "2" : "..---", "3" : "...--", "4" : "....-",
+    "5" : ".....", "6" : "-....", "7" : "--...", "8" : "---..", "9" : "----."
+}
+
+# ------------------------------------------------------------------------
+# Functions
+# ------------------------------------------------------------------------
+
+def morse_steps(text, unit_ms=100):
+    """Return the (level, ms) steps that send text in Morse code.
+
+    Will throw a ValueError for characters that have no code.
+    """
+    steps = []
+
+    for word in text.upper().split():
+        if steps:
+            steps[-1] = (0, 7 * unit_ms)            # gap between words
+        for letter in word:
+            code = MORSE_CODE.get(letter)
+            if code is None:
+                raise ValueError("No Morse code for '{0}'".format(letter))
+            for symbol in code:
+                steps.append((1, unit_ms if symbol == "." else 3 * unit_ms))
+                steps.append((0, unit_ms))
+            steps[-1] = (0, 3 * unit_ms)            # gap between letters
+
+    if steps:
+        steps[-1] = (0, 7 * unit_ms)                # gap before repeating
+    return steps
+
+#End def
+
+def run_steps(path, on_value, steps, repeat, stop, lateness=None):
+    """Play steps on the brightness file at path until they end or stop is set.
+
+    Each step's deadline is worked out from the start time, not from when
+    the last step really ended, so the pattern does not drift.
+
+    :param lateness: list to add each step's wake up lateness (s) to
+    """
+    levels   = {0 : b"0", 1 : on_value}
+    fd       = os.open(path, os.O_WRONLY)
+    deadline = time.monotonic()
+
+    try:
+        while True:
+            for (level, duration) in steps:
+                os.pwrite(fd, levels[1 if level else 0], 0)
+                deadline += duration / 1000.0
+                if stop.wait(max(0.0, deadline - time.monotonic())):
+                    return
+                if lateness is not None:
+                    lateness.append(time.monotonic() - deadline)
+            if not repeat:
+                break
+    finally:
+        os.pwrite(fd, b"0", 0)
+        os.close(fd)
+
+#End def
+
+def make_fake_leds(root, names=None, triggers=("none", "timer", "oneshot", "heartbeat")):
+    """Make LED directories under root laid out like /sys/class/leds.
+    Returns root.
+
+    max_brightness is 1, so that every write to brightness is one byte (a
+    regular file is not cut short by a shorter write, as a sysfs file is).
+    """
+    if names is None:
+        names = LED_NAMES.values()
+
+    available = " ".join(["[{0}]".format(triggers[0])] + list(triggers[1:]))
+    for name in names:
+        directory = os.path.join(root, name)
+        os.makedirs(directory)
+        for (attribute, value) in [("brightness", "0"), ("max_brightness", "1"),
+                                   ("trigger", available), ("delay_on", "500"),
+                                   ("delay_off", "500"), ("shot", "0"), ("invert", "0")]:
+            with open(os.path.join(directory, attribute), "w") as attribute_file:
+                attribute_file.write(value + "\n")
+    return root
+
+#End def
+
+# ------------------------------------------------------------------------
+# Classes
+# ------------------------------------------------------------------------
+
+class Pattern(object):
+    """A pattern running on an LED, in the kernel (a trigger) or in a thread."""
+
+    def __init__(self, led, trigger=None, thread=None, stop_event=None):
+        self.led        = led
+        self.trigger    = trigger
+        self.thread     = thread
+        self.stop_event = stop_event
+
+    #End def
+
+    def running(self):
+        """Return whether the pattern is still playing."""
+        if self.thread is not None:
+            return self.thread.is_alive()
+        return self.led.pattern is self
+
+    #End def
+
+    def wait(self, timeout=None):
+        """Wait for a pattern played in a thread to end (returns at once for
+        a trigger). Returns whether it has ended."""
+        if self.thread is not None:
+            self.thread.join(timeout)
+            return not self.thread.is_alive()
+        return True
+
+    #End def
+
+    def stop(self):
+        """Stop the pattern and leave the LED off."""
+        if self.thread is not None:
+            self.stop_event.set()
+            self.thread.join()
+        else:
+            self.led.write("trigger", "none")
+            self.led.write("brightness", "0")
+
+        if self.led.pattern is self:
+            self.led.pattern = None
+
+    #End def
+
+#End class
+
+class LED(object):
+    """One LED of the kernel LED class."""
+
+    def __init__(self, name, root=LEDS_ROOT):
+        """Find the LED name ("USR0" - "USR3", or a directory in root)."""
+        self.name      = name
+        self.path      = os.path.join(root, LED_NAMES.get(name.upper(), name))
+        self.pattern   = None
+        self.available = None
+        self.original  = None
+
+        if not os.path.isdir(self.path):
+            raise ValueError("No LED at {0}".format(self.path))
+
+    #End def
+
+    def read(self, attribute):
+        """Return the value of one of the LED's files."""
+        with open(os.path.join(self.path, attribute)) as attribute_file:
+            return attribute_file.read().strip()
+
+    #End def
+
+    def write(self, attribute, value):
+        """Write value to one of the LED's files."""
+        with open(os.path.join(self.path, attribute), "w") as attribute_file:
+            attribute_file.write(str(value))
+
+    #End def
+
+    def triggers(self):
+        """Return the list of triggers the kernel has for the LED. The trigger
+        in use the first time is remembered for restore()."""
+        if self.available is None:
+            self.available = []
+            for trigger in self.read("trigger").split():
+                if trigger.startswith("["):
+                    trigger       = trigger.strip("[]")
+                    self.original = trigger
+                self.available.append(trigger)
+        return self.available
+
+    #End def
+
+    def start(self, trigger, settings=()):
+        """Stop the current pattern and start trigger with settings, a list of
+        (attribute, value). Returns the Pattern, or None if the kernel does
+        not have the trigger."""
+        if trigger not in self.triggers():
+            return None
+
+        self.stop()
+        self.write("trigger", trigger)
+        # The trigger's files (e.g. delay_on) appear when it is set
+        for (attribute, value) in settings:
+            self.write(attribute, value)
+
+        self.pattern = Pattern(self, trigger=trigger)
+        return self.pattern
+
+    #End def
+
+    def blink(self, on_ms, off_ms):
+        """Blink on for on_ms and off for off_ms, forever."""
+        pattern = self.start("timer", [("delay_on", int(on_ms)), ("delay_off", int(off_ms))])
+        if pattern is None:
+            pattern = self.play([(1, on_ms), (0, off_ms)], repeat=True)
+        return pattern
+
+    #End def
+
+    def heartbeat(self):
+        """Blink like a heartbeat, forever."""
+        pattern = self.start("heartbeat")
+        if pattern is None:
+            pattern = self.play(HEARTBEAT, repeat=True)
+        return pattern
+
+    #End def
+
+    def oneshot(self, on_ms, off_ms=0):
+        """Turn on for on_ms once (then stay off)."""
+        pattern = self.start("oneshot", [("invert", 0), ("delay_on", int(on_ms)),
+                                         ("delay_off", int(off_ms)), ("shot", 1)])
+        if pattern is None:
+            pattern = self.play([(1, on_ms), (0, off_ms)])
+        return pattern
+
+    #End def
+
+    def morse(self, text, unit_ms=100, repeat=False):
+        """Send text in Morse code."""
+        return self.play(morse_steps(text, unit_ms), repeat)
+
+    #End def
+
+    def play(self, steps, repeat=False, lateness=None):
+        """Play a list of (level, ms) steps in a thread.
+
+        :param lateness: list to add each step's wake up lateness (s) to
+        """
+        self.stop()
+        if "none" in self.triggers():
+            self.write("trigger", "none")
+
+        stop_event = threading.Event()
+        thread     = threading.Thread(target=run_steps, name="led-" + self.name,
+                                      args=(os.path.join(self.path, "brightness"),
+                                            self.read("max_brightness").encode("ascii"),
+                                            steps, repeat, stop_event, lateness))
+        thread.daemon = True
+        self.pattern  = Pattern(self, thread=thread, stop_event=stop_event)
+        thread.start()
+        return self.pattern
+
+    #End def
+
+    def on(self):
+        """Stop the current pattern and turn the LED on."""
+        self.stop()
+        self.write("brightness", self.read("max_brightness"))
+
+    #End def
+
+    def stop(self):
+        """Stop the current pattern (the LED is left off)."""
+        if self.pattern is not None:
+            self.pattern.stop()
+
+    #End def
+
+    def restore(self, trigger=None):
+        """Stop the current pattern and go back to trigger, or else to the
+        boot trigger of the LED (see the top of the file)."""
+        self.stop()
+        self.triggers()
+        if trigger is None:
+            trigger = self.original if self.original not in PATTERN_TRIGGERS else None
+        if trigger is None:
+            trigger = DEFAULT_TRIGGERS.get(self.name.upper())
+        if (trigger is not None) and (trigger in self.triggers()):
+            self.write("trigger", trigger)
+
+    #End def
+
+#End class
+
+# ------------------------------------------------------------------------
+# Main script
+# ------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    import argparse
+    import shutil
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="USR LED patterns")
+    parser.add_argument("--board", action="store_true", help="use /sys/class/leds")
+    parser.add_argument("--no-triggers", action="store_true",
+                        help="fake LEDs without triggers (everything in a thread)")
+    parser.add_argument("--seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    root = None
+    if args.board:
+        leds_root = LEDS_ROOT
+    else:
+        root      = tempfile.mkdtemp()
+        triggers  = ("none",) if args.no_triggers else ("none", "timer", "oneshot", "heartbeat")
+        leds_root = make_fake_leds(root, triggers=triggers)
+
+    try:
+        leds = [LED(name, leds_root) for name in sorted(LED_NAMES)]
+
+        start = time.process_time()
+        leds[0].heartbeat()
+        leds[1].oneshot(500)
+        leds[3].blink(100, 100)
+        lateness = []
+        leds[2].play(morse_steps("SOS", 50), repeat=True, lateness=lateness)
+        time.sleep(args.seconds)
+        cpu = time.process_time() - start
+
+        for led in leds:
+            pattern = led.pattern
+            print("{0}: {1}".format(led.name, "trigger " + pattern.trigger
+                                    if pattern.trigger else "thread"))
+        print("")
+        print("CPU time {0:.1f} ms in {1:.1f} s".format(cpu * 1e3, args.seconds))
+        if lateness:
+            lateness.sort()
+            print("Morse step lateness: median {0:.3f} ms, max {1:.3f} ms ({2} steps)".format(
+                  lateness[len(lateness) // 2] * 1e3, lateness[-1] * 1e3, len(lateness)))
+
+        for led in leds:
+            led.restore()
+    finally:
+        if root is not None:
+            shutil.rmtree(root)
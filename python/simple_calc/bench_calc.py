@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+"""
+--------------------------------------------------------------------------
+Calculator Benchmark
+--------------------------------------------------------------------------
+License:   
+Copyright 2021 Jessica Kies
+
+Redistribution and use in source and binary forms, with or without 
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, 
+this list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice, 
+this list of conditions and the following disclaimer in the documentation 
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors 
+may be used to endorse or promote products derived from this software without 
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF 
+THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+Times each step the calculator's interactive loop takes for an operation,
+on its own, for every operator and for operands of different types and
+sizes:
+  - parse     --> the two numbers from text
+  - dispatch  --> the operators lookup and the << / >> integer check
+  - evaluate  --> the operation (through limits.apply, as the loop does)
+  - output    --> the result as text, printed (to /dev/null)
+
+The operands are floats (as the interactive loop reads them) and integers
+of 64, 1024 and 16384 bits (as expressions can make with shifts). Times
+are in ns per operation, the best of REPEATS runs, less the cost of the
+call that runs the step.
+
+Each run is added as a line of JSON to the history file. A run can be
+saved as the baseline, and every later run is compared with it: a step
+more than --threshold slower (and more than MIN_CHANGE ns) is flagged as
+a regression. Both files are in $XDG_CACHE_HOME/simple_calc
+(~/.cache/simple_calc by default), so they stay out of the source tree.
+
+  python bench_calc.py [--save-baseline] [--threshold F] [--fail]
+                       [--operators OPS] [--history FILE] [--baseline FILE]
+
+profile() runs the interactive loop under cProfile or tracemalloc (see
+simple_calc.py --profile).
+
+--------------------------------------------------------------------------
+"""
+import json
+import os
+import sys
+import time
+
+import limits
+from simple_calc import operators
+
+# ------------------------------------------------------------------------
+# Constants
+# ------------------------------------------------------------------------
+CACHE         = os.path.join(os.environ.get("XDG_CACHE_HOME") or
+                             os.path.join(os.path.expanduser("~"), ".cache"), "simple_calc")
+HISTORY       = os.path.join(CACHE, "bench_calc_history.jsonl")
+BASELINE      = os.path.join(CACHE, "bench_calc_baseline.json")
+
+STAGES        = ("parse", "dispatch", "evaluate", "output")
+SIZES         = (None, 64, 1024, 16384)        # None: floats
+SHIFTS        = ("<<", ">>")
+
+TARGET_TIME   = 0.05                    # seconds per timed run
+REPEATS       = 3
+THRESHOLD     = 0.25                    # 25% slower is a regression
+MIN_CHANGE    = 50.0                    # ns; smaller changes are noise
+
+PROFILE_LINES = 25
+TRACE_FRAMES  = 10
+
+# ------------------------------------------------------------------------
+# Benchmark
+# ------------------------------------------------------------------------
+
+def operand_texts(symbol, bits):
+    """Return (text1, text2, parse function) of the operands for symbol
+    and a size (bits None: floats)."""
+    if bits is None:
+        return ("123.456", "7.89", float)
+
+    number1 = (1 << bits) - 12345
+    if symbol == "**":
+        number2 = 3
+    elif symbol == "<<":
+        number2 = bits
+    elif symbol == ">>":
+        number2 = bits // 2
+    else:
+        number2 = (1 << (bits - 8)) + 1  # keeps / in float range
+    return (str(number1), str(number2), int)
+
+#End def
+
+def time_call(function, target=TARGET_TIME, repeats=REPEATS):
+    """Return the best time (s) of one call of function."""
+    clock = time.perf_counter
+
+    # Find a number of calls that takes about target
+    count = 1
+    while True:
+        start = clock()
+        for i in range(count):
+            function()
+        elapsed = clock() - start
+        if elapsed >= target / 10:
+            break
+        count *= 10
+    count = max(1, int(count * target / max(elapsed, 1e-9) / 10))
+
+    best = None
+    for repeat in range(repeats):
+        start = clock()
+        for i in range(count):
+            function()
+        elapsed = (clock() - start) / count
+        best    = elapsed if best is None else min(best, elapsed)
+    return best
+
+#End def
+
+def stage_functions(symbol, bits, sink):
+    """Return {stage : function that runs it once} for an operation."""
+    (text1, text2, parse) = operand_texts(symbol, bits)
+
+    number1 = parse(text1)
+    number2 = parse(text2)
+    if symbol in SHIFTS:
+        number1 = int(number1)
+        number2 = int(number2)
+    value   = limits.apply(symbol, number1, number2)
+    text    = limits.evaluator.text
+
+    def parse_stage():
+        return (parse(text1), parse(text2))
+
+    def dispatch_stage():
+        (first, second) = (number1, number2)
+        if symbol == "<<" or symbol == ">>":
+            first  = int(first)
+            second = int(second)
+        return operators.get(symbol, None)
+
+    def evaluate_stage():
+        return limits.apply(symbol, number1, number2)
+
+    def output_stage():
+        print(text(value), file=sink)
+
+    return {"parse"    : parse_stage,
+            "dispatch" : dispatch_stage,
+            "evaluate" : evaluate_stage,
+            "output"   : output_stage}
+
+#End def
+
+def case_name(symbol, bits):
+    return "{0} {1}".format(symbol, "float" if bits is None else "int{0}".format(bits))
+
+#End def
+
+def run(symbols, target=TARGET_TIME):
+    """Time every stage of every case. Returns {"op type stage" : ns}."""
+    if hasattr(sys, "set_int_max_str_digits"):
+        sys.set_int_max_str_digits(0)
+
+    overhead = time_call(lambda: None, target)
+    results  = {}
+
+    with open(os.devnull, "w") as sink:
+        for symbol in symbols:
+            for bits in SIZES:
+                try:
+                    functions = stage_functions(symbol, bits, sink)
+                except (ArithmeticError, ValueError):
+                    continue            # e.g. a float ** that overflows
+
+                for stage in STAGES:
+                    elapsed = time_call(functions[stage], target) - overhead
+                    results["{0} {1}".format(case_name(symbol, bits), stage)] = \
+                        max(0.0, elapsed) * 1e9
+
+    limits.evaluator.close()
+    return results
+
+#End def
+
+# ------------------------------------------------------------------------
+# History
+# ------------------------------------------------------------------------
+
+def make_record(results):
+    """Return the history record of a run."""
+    import platform
+
+    return {"time"    : time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python"  : platform.python_version(),
+            "machine" : platform.machine(),
+            "host"    : platform.node(),
+            "results" : results}
+
+#End def
+
+def make_directory(path):
+    """Make the directory a file at path goes in, if it is not there."""
+    directory = os.path.dirname(os.path.abspath(path))
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+#End def
+
+def append_history(path, record):
+    """Add record to the history file (one JSON object per line)."""
+    make_directory(path)
+    with open(path, "a") as history:
+        history.write(json.dumps(record, sort_keys=True) + "\n")
+
+#End def
+
+def load_baseline(path):
+    """Return the baseline record, or None if there is none."""
+    try:
+        with open(path) as baseline:
+            return json.load(baseline)
+    except (IOError, OSError, ValueError):
+        return None
+
+#End def
+
+def save_baseline(path, record):
+    """Make record the baseline."""
+    make_directory(path)
+    with open(path + ".tmp", "w") as baseline:
+        json.dump(record, baseline, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+#End def
+
+def regressions(results, baseline, threshold=THRESHOLD, min_change=MIN_CHANGE):
+    """Return {key : (baseline ns, ns)} of the steps that got slower."""
+    slower = {}
+    for (key, value) in results.items():
+        before = baseline.get(key)
+        if before is None:
+            continue
+        if (value > before * (1 + threshold)) and (value - before > min_change):
+            slower[key] = (before, value)
+    return slower
+
+#End def
+
+def report(symbols, results, slower):
+    """Print a table of the results (a ! marks a regression)."""
+    print("{0:<12} {1:>12} {2:>12} {3:>12} {4:>12}  {5}".format(
+          "ns/op", *(STAGES + ("slowest",))))
+
+    for symbol in symbols:
+        for bits in SIZES:
+            name  = case_name(symbol, bits)
+            times = [results.get("{0} {1}".format(name, stage)) for stage in STAGES]
+            if None in times:
+                continue
+
+            cells = []
+            for (stage, value) in zip(STAGES, times):
+                mark = "!" if "{0} {1}".format(name, stage) in slower else " "
+                cells.append("{0:>11.0f}{1}".format(value, mark))
+            print("{0:<12} {1}  {2}".format(name, " ".join(cells),
+                                            STAGES[times.index(max(times))]))
+
+#End def
+
+# ------------------------------------------------------------------------
+# Profiling
+# ------------------------------------------------------------------------
+
+def profile(function, kind, output=None):
+    """Run function (e.g. the interactive loop) under a profiler and report
+    on stderr when it returns.
+
+    :param kind:   "cprofile" (time per function) or "tracemalloc" (memory
+                   per line)
+    :param output: file to save the pstats data or the snapshot to
+    """
+    if kind == "cprofile":
+        import cProfile
+        import pstats
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            function()
+        finally:
+            profiler.disable()
+            stats = pstats.Stats(profiler, stream=sys.stderr)
+            stats.sort_stats("cumulative").print_stats(PROFILE_LINES)
+            if output is not None:
+                profiler.dump_stats(output)
+
+    elif kind == "tracemalloc":
+        import tracemalloc
+
+        tracemalloc.start(TRACE_FRAMES)
+        try:
+            function()
+        finally:
+            snapshot        = tracemalloc.take_snapshot()
+            (current, peak) = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            sys.stderr.write("memory: {0} bytes now, {1} bytes at peak\n".format(current, peak))
+            for statistic in snapshot.statistics("lineno")[:PROFILE_LINES]:
+                sys.stderr.write("{0}\n".format(statistic))
+            if output is not None:
+                snapshot.dump(output)
+
+    else:
+        raise ValueError("Unknown profiler '{0}'".format(kind))
+
+#End def
+
+# ------------------------------------------------------------------------
+# Main script
+# ------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Calculator step benchmark")
+    parser.add_argument("--operators", default=" ".join(operators),
+                        help="operators to time, separated by spaces")
+    parser.add_argument("--target", type=float, default=TARGET_TIME,
+                        help="seconds per timed run")
+    parser.add_argument("--history", default=HISTORY)
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="make this run the baseline")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="fraction slower than the baseline that is a regression")
+    parser.add_argument("--fail", action="store_true",
+                        help="exit with status 1 if there is a regression")
+    args = parser.parse_args()
+
+    symbols = [symbol for symbol in args.operators.split() if symbol in operators]
+    results = run(symbols, args.target)
+    record  = make_record(results)
+    append_history(args.history, record)
+
+    baseline = load_baseline(args.baseline)
+    slower   = {}
+    if baseline is not None:
+        slower = regressions(results, baseline["results"], args.threshold)
+
+    report(symbols, results, slower)
+    print("")
+
+    if baseline is None:
+        print("No baseline to compare with ({0})".format(args.baseline))
+    else:
+        print("Compared with the baseline of {0}: {1} regression(s)".format(
+              baseline["time"], len(slower)))
+        for key in sorted(slower):
+            print("    {0:<24} {1:>10.0f} -> {2:>10.0f} ns".format(key, *slower[key]))
+
+    if args.save_baseline:
+        save_baseline(args.baseline, record)
+        print("Saved as the baseline")
+
+    if slower and args.fail:
+        sys.exit(1)
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+--------------------------------------------------------------------------
+Calculator Server Benchmark
+--------------------------------------------------------------------------
+License:   
+Copyright 2021 Jessica Kies
+
+Redistribution and use in source and binary forms, with or without 
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, 
+this list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice, 
+this list of conditions and the following disclaimer in the documentation 
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors 
+may be used to endorse or promote products derived from this software without 
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF 
+THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+Load generator for server.py. Runs a number of clients at once, each
+sending its requests in pipelined windows (a window of requests is sent,
+then its responses are read), and reports the requests per second and the
+latency of the requests (from sending the window to reading the response).
+
+  python bench_server.py [--clients N] [--requests N] [--depth N] [--framed]
+                         [--unix PATH | --port N] [--baseline N]
+
+Without --unix or --port, a server is started on a temporary Unix socket
+for the run. --baseline N also times N requests made the old way, by
+starting simple_calc.py for each one.
+
+--------------------------------------------------------------------------
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+
+import server
+
+# ------------------------------------------------------------------------
+# Constants
+# ------------------------------------------------------------------------
+FRAME      = server.FRAME
+
+# ------------------------------------------------------------------------
+# Functions
+# ------------------------------------------------------------------------
+
+def make_requests(count, seed):
+    """Return count request lines (bytes, without newlines)."""
+    generator = random.Random(seed)
+    symbols   = list(server.operators)
+    requests  = []
+
+    for i in range(count):
+        symbol = generator.choice(symbols)
+        if symbol == "**":
+            number2 = generator.randint(0, 8)
+        elif symbol in server.SHIFTS:
+            number2 = generator.randint(0, 30)
+        else:
+            number2 = generator.randint(1, 1000)
+        requests.append("{0} {1} {2}".format(generator.randint(-1000, 1000),
+                                             symbol, number2).encode("ascii"))
+    return requests
+
+#End def
+
+def percentile(values, fraction):
+    """Return the value at fraction (0 - 1) of the sorted values."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+#End def
+
+async def connect(address):
+    """Open a connection to address (a Unix socket path or (host, port))."""
+    if isinstance(address, str):
+        return await asyncio.open_unix_connection(address)
+    return await asyncio.open_connection(*address)
+
+#End def
+
+async def run_client(address, requests, depth, framed, latencies, counts):
+    """Send requests in windows of depth and time their responses."""
+    (reader, writer) = await connect(address)
+
+    for start in range(0, len(requests), depth):
+        window = requests[start:start + depth]
+        sent   = time.perf_counter()
+
+        if framed:
+            body = b"\n".join(window)
+            writer.write(FRAME.pack(len(body)) + body)
+            (length,) = FRAME.unpack(await reader.readexactly(FRAME.size))
+            lines     = (await reader.readexactly(length)).split(b"\n")
+            latencies.extend([time.perf_counter() - sent] * len(lines))
+            counts["invalid"] += lines.count(server.INVALID)
+            continue
+
+        writer.write(b"\n".join(window) + b"\n")
+        received = 0
+        while received < len(window):
+            data = await reader.read(server.READ_SIZE)
+            if not data:
+                raise ConnectionError("server closed the connection")
+            lines     = data.count(b"\n")
+            received += lines
+            latencies.extend([time.perf_counter() - sent] * lines)
+            counts["invalid"] += data.count(server.INVALID)
+
+    writer.close()
+    await writer.wait_closed()
+
+#End def
+
+async def run_load(address, clients, requests, depth, framed):
+    """Run the clients at once. Returns (seconds, latencies, counts)."""
+    latencies = []
+    counts    = {"invalid" : 0}
+    start     = time.perf_counter()
+
+    await asyncio.gather(*[run_client(address, requests[index::clients], depth,
+                                      framed, latencies, counts)
+                           for index in range(clients)])
+
+    return (time.perf_counter() - start, sorted(latencies), counts)
+
+#End def
+
+def run_baseline(count, requests):
+    """Return the seconds per request of starting simple_calc.py for each."""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "simple_calc.py")
+    start  = time.perf_counter()
+
+    for request in requests[:count]:
+        (number1, symbol, number2) = request.split()
+        subprocess.run([sys.executable, script], input=b"\n".join([number1, number2, symbol]),
+                       stdout=subprocess.DEVNULL, check=True)
+
+    return (time.perf_counter() - start) / count
+
+#End def
+
+def wait_for_socket(path, process, timeout=10.0):
+    """Wait until the server has made its socket."""
+    end = time.perf_counter() + timeout
+    while not os.path.exists(path):
+        if (process.poll() is not None) or (time.perf_counter() > end):
+            raise RuntimeError("The server did not start")
+        time.sleep(0.01)
+
+#End def
+
+# ------------------------------------------------------------------------
+# Main script
+# ------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calculator server load generator")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200000, help="in all")
+    parser.add_argument("--depth", type=int, default=64,
+                        help="requests a client sends before reading the responses")
+    parser.add_argument("--framed", action="store_true", help="send length prefixed frames")
+    parser.add_argument("--unix", metavar="PATH", help="server's Unix socket")
+    parser.add_argument("--host", default=server.HOST)
+    parser.add_argument("--port", type=int, default=None, help="server's TCP port")
+    parser.add_argument("--baseline", type=int, default=0,
+                        help="also time N requests that start simple_calc.py each")
+    parser.add_argument("--seed", type=int, default=301)
+    args = parser.parse_args()
+
+    requests = make_requests(args.requests, args.seed)
+    process  = None
+    root     = None
+
+    if args.port is not None:
+        address = (args.host, args.port)
+    elif args.unix is not None:
+        address = args.unix
+    else:
+        import tempfile
+
+        root    = tempfile.mkdtemp()
+        address = os.path.join(root, "calc.sock")
+        script  = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py")
+        process = subprocess.Popen([sys.executable, script, "--unix", address],
+                                   stdout=subprocess.DEVNULL)
+        wait_for_socket(address, process)
+
+    try:
+        (elapsed, latencies, counts) = asyncio.run(run_load(
+            address, args.clients, requests, args.depth, args.framed))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+            os.rmdir(root)              # the server removes its socket
+
+    print("{0} requests, {1} clients, {2} deep{3}".format(
+          args.requests, args.clients, args.depth, ", framed" if args.framed else ""))
+    print("    {0:>10.0f} requests/s".format(len(latencies) / elapsed))
+    print("    {0:>10.3f} ms p50 latency".format(percentile(latencies, 0.5) * 1e3))
+    print("    {0:>10.3f} ms p99 latency".format(percentile(latencies, 0.99) * 1e3))
+    print("    {0:>10} invalid responses".format(counts["invalid"]))
+
+    if args.baseline:
+        per_request = run_baseline(args.baseline, requests)
+        print("")
+        print("starting simple_calc.py per request:")
+        print("    {0:>10.0f} requests/s".format(1.0 / per_request))
+        print("    {0:>10.3f} ms per request".format(per_request * 1e3))
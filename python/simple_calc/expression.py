@@ -0,0 +1,490 @@
+# -*- coding: utf-8 -*-
+"""
+--------------------------------------------------------------------------
+Expressions
+--------------------------------------------------------------------------
+License:   
+Copyright 2021 Jessica Kies
+
+Redistribution and use in source and binary forms, with or without 
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, 
+this list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice, 
+this list of conditions and the following disclaimer in the documentation 
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors 
+may be used to endorse or promote products derived from this software without 
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF 
+THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+Infix expressions over the simple calculator's operators, with variables.
+
+  - Operators: + - * / % ** << >> (from the operators table), unary + and -,
+    and parentheses, with Python's precedence and associativity
+  - Numbers are floats, as they are in the calculator; the numbers for <<
+    and >> are made integers first
+  - Variables are names (letters, digits and _), given in a dict when the
+    expression is evaluated
+
+An expression is parsed once and compiled into closures, one per operator:
+numbers and variables are read inside the closure of the operator that
+uses them instead of by closures of their own, and operators on numbers
+only are worked out when compiling. Compiled expressions are kept in a
+bounded least recently used cache keyed by the expression text, so
+applying the same formula to many sets of variables never parses it again.
+
+    expression = compile_expression("(a + b) * c")
+    expression.evaluate({"a" : 1.0, "b" : 2.0, "c" : 3.0})   --> 9.0
+
+Error conditions:
+  - Invalid expression --> ValueError when compiling
+  - Missing variable   --> KeyError when evaluating
+  - Result too large   --> limits.LimitError when evaluating (** and <<
+                           on integers go through limits.apply)
+
+Running this file directly compares evaluating a formula with a compiled
+expression, with one operation at a time from the operators table, and
+with Python's eval:
+  python expression.py [--count N] [--expression TEXT]
+
+--------------------------------------------------------------------------
+"""
+import collections
+import operator
+import re
+
+import limits
+from simple_calc import operators
+
+# ------------------------------------------------------------------------
+# Constants
+# ------------------------------------------------------------------------
+CACHE_SIZE = 256                        # compiled expressions kept
+
+TOKEN      = re.compile(r"\s*(?:(\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?)"
+                        r"|([A-Za-z_]\w*)|(\*\*|<<|>>|[-+*/%()]))")
+
+SUMS       = ("+", "-")
+TERMS      = ("*", "/", "%")
+SHIFTS     = ("<<", ">>")
+
+# Kinds of compiled node
+NUMBER     = 0
+VARIABLE   = 1
+CLOSURE    = 2
+
+# ------------------------------------------------------------------------
+# Functions
+# ------------------------------------------------------------------------
+
+def tokenize(text):
+    """Return the list of tokens in text (numbers as floats)."""
+    tokens   = []
+    position = 0
+    end      = len(text.rstrip())
+
+    while position < end:
+        match = TOKEN.match(text, position)
+        if match is None:
+            raise ValueError("Invalid expression at '{0}'".format(text[position:].strip()))
+
+        (number, name, symbol) = match.groups()
+        if number is not None:
+            tokens.append((NUMBER, float(number)))
+        elif name is not None:
+            tokens.append((VARIABLE, name))
+        else:
+            tokens.append((None, symbol))
+        position = match.end()
+
+    return tokens
+
+#End def
+
+class Parser(object):
+    """Recursive descent parser, giving a tree of tuples:
+         (NUMBER, value), (VARIABLE, name) or (operator, left, right);
+       unary minus is ("neg", operand) and unary plus is left out.
+    """
+
+    def __init__(self, text):
+        self.tokens = tokenize(text)
+        self.index  = 0
+
+    #End def
+
+    def peek(self):
+        """Return the symbol of the next token (None if it is not a symbol)."""
+        if (self.index < len(self.tokens)) and (self.tokens[self.index][0] is None):
+            return self.tokens[self.index][1]
+        return None
+
+    #End def
+
+    def parse(self):
+        """Return the tree of the whole expression."""
+        node = self.shift()
+        if self.index != len(self.tokens):
+            raise ValueError("Invalid expression: unexpected '{0}'".format(
+                             self.tokens[self.index][1]))
+        return node
+
+    #End def
+
+    def binary(self, symbols, operand):
+        """Parse left associative operators in symbols, between operand()s."""
+        node = operand()
+        while self.peek() in symbols:
+            symbol      = self.tokens[self.index][1]
+            self.index += 1
+            node        = (symbol, node, operand())
+        return node
+
+    #End def
+
+    def shift(self):
+        return self.binary(SHIFTS, self.sum)
+
+    def sum(self):
+        return self.binary(SUMS, self.term)
+
+    def term(self):
+        return self.binary(TERMS, self.unary)
+
+    #End def
+
+    def unary(self):
+        """Unary + and - bind less tightly than ** on their right (-2**2 is -4)."""
+        symbol = self.peek()
+        if symbol in SUMS:
+            self.index += 1
+            operand     = self.unary()
+            return ("neg", operand) if symbol == "-" else operand
+        return self.power()
+
+    #End def
+
+    def power(self):
+        """** is right associative and takes a signed exponent (2**-1)."""
+        node = self.atom()
+        if self.peek() == "**":
+            self.index += 1
+            node        = ("**", node, self.unary())
+        return node
+
+    #End def
+
+    def atom(self):
+        if self.index == len(self.tokens):
+            raise ValueError("Invalid expression: missing operand")
+
+        (kind, value) = self.tokens[self.index]
+        self.index   += 1
+
+        if kind is not None:
+            return (kind, value)
+
+        if value == "(":
+            node = self.shift()
+            if self.peek() != ")":
+                raise ValueError("Invalid expression: missing ')'")
+            self.index += 1
+            return node
+
+        raise ValueError("Invalid expression: unexpected '{0}'".format(value))
+
+    #End def
+
+#End class
+
+def shift_function(symbol):
+    """Return the shift for symbol, with its numbers made integers first."""
+    def shift(number1, number2):
+        return limits.apply(symbol, int(number1), int(number2))
+    return shift
+
+#End def
+
+def power_function(function):
+    """Return function (**), checked by limits.apply when both numbers are
+    integers (results of shifts)."""
+    def power(number1, number2):
+        if (type(number1) is int) and (type(number2) is int):
+            return limits.apply("**", number1, number2)
+        return function(number1, number2)
+    return power
+
+#End def
+
+def compile_unary(function, operand):
+    """Return the compiled (kind, value) of function applied to operand."""
+    (kind, value) = operand
+
+    if kind == NUMBER:
+        return (NUMBER, function(value))
+    if kind == VARIABLE:
+        return (CLOSURE, lambda variables: function(variables[value]))
+    return (CLOSURE, lambda variables: function(value(variables)))
+
+#End def
+
+def compile_binary(function, left, right):
+    """Return the compiled (kind, value) of function applied to left and right.
+
+    There is one closure for each pair of operand kinds, so reading a
+    number or a variable never costs a call of its own.
+    """
+    (kind1, a) = left
+    (kind2, b) = right
+
+    if kind1 == NUMBER:
+        if kind2 == NUMBER:
+            try:
+                return (NUMBER, function(a, b))
+            except (ArithmeticError, ValueError):
+                pass                    # raise it when evaluated instead
+            return (CLOSURE, lambda variables: function(a, b))
+        if kind2 == VARIABLE:
+            return (CLOSURE, lambda variables: function(a, variables[b]))
+        return (CLOSURE, lambda variables: function(a, b(variables)))
+
+    if kind1 == VARIABLE:
+        if kind2 == NUMBER:
+            return (CLOSURE, lambda variables: function(variables[a], b))
+        if kind2 == VARIABLE:
+            return (CLOSURE, lambda variables: function(variables[a], variables[b]))
+        return (CLOSURE, lambda variables: function(variables[a], b(variables)))
+
+    if kind2 == NUMBER:
+        return (CLOSURE, lambda variables: function(a(variables), b))
+    if kind2 == VARIABLE:
+        return (CLOSURE, lambda variables: function(a(variables), variables[b]))
+    return (CLOSURE, lambda variables: function(a(variables), b(variables)))
+
+#End def
+
+def is_float(compiled):
+    """Return whether a compiled node is a float number (numbers in the
+    text are floats; worked out shifts of them are integers)."""
+    return (compiled[0] == NUMBER) and (type(compiled[1]) is float)
+
+#End def
+
+def compile_node(node):
+    """Return the compiled (kind, value) of a parse tree node."""
+    if node[0] in (NUMBER, VARIABLE):
+        return node
+
+    if node[0] == "neg":
+        return compile_unary(operator.neg, compile_node(node[1]))
+
+    left     = compile_node(node[1])
+    right    = compile_node(node[2])
+    function = operators[node[0]]
+
+    if node[0] in SHIFTS:
+        function = shift_function(node[0])
+    elif (node[0] == "**") and not (is_float(left) or is_float(right)):
+        function = power_function(function)
+
+    return compile_binary(function, left, right)
+
+#End def
+
+class Expression(object):
+    """A compiled expression.
+
+    evaluate(variables) returns its value for a dict of variable values.
+    """
+
+    def __init__(self, text):
+        """Compile text. Will throw a ValueError if it is not a valid expression."""
+        self.text      = text
+        self.variables = []
+        parser         = Parser(text)
+
+        for (kind, value) in parser.tokens:
+            if (kind == VARIABLE) and (value not in self.variables):
+                self.variables.append(value)
+
+        (kind, value) = compile_node(parser.parse())
+
+        if kind == NUMBER:
+            self.evaluate = lambda variables: value
+        elif kind == VARIABLE:
+            self.evaluate = lambda variables: variables[value]
+        else:
+            self.evaluate = value
+
+    #End def
+
+#End class
+
+class ExpressionCache(object):
+    """Compiled expressions keyed by their text, dropping the least
+    recently used once there are more than size of them."""
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size    = size
+        self.entries = collections.OrderedDict()
+        self.hits    = 0
+        self.misses  = 0
+
+    #End def
+
+    def get(self, text):
+        """Return the compiled expression for text, compiling it if needed."""
+        expression = self.entries.pop(text, None)
+
+        if expression is None:
+            expression   = Expression(text)
+            self.misses += 1
+            if len(self.entries) >= self.size:
+                self.entries.popitem(last=False)
+        else:
+            self.hits   += 1
+
+        # (Re)inserting puts the expression at the most recently used end
+        self.entries[text] = expression
+        return expression
+
+    #End def
+
+#End class
+
+cache = ExpressionCache()
+
+def compile_expression(text):
+    """Return the compiled expression for text, from the cache if it is there."""
+    return cache.get(text)
+
+#End def
+
+def one_op_steps(text):
+    """Return text as a list of single operations for the one op at a time
+    loop: (operator, operand, operand), where an operand is a number, a
+    variable name or the index of an earlier step."""
+    steps = []
+
+    def walk(node):
+        if node[0] == NUMBER:
+            return (NUMBER, node[1])
+        if node[0] == VARIABLE:
+            return (VARIABLE, node[1])
+        if node[0] == "neg":
+            steps.append(("*", (NUMBER, -1.0), walk(node[1])))
+        else:
+            steps.append((node[0], walk(node[1]), walk(node[2])))
+        return (CLOSURE, len(steps) - 1)
+
+    walk(Parser(text).parse())
+    return steps
+
+#End def
+
+def one_op_evaluate(steps, variables):
+    """Work out steps one operation at a time, as the calculator loop does."""
+    results = []
+    for (symbol, left, right) in steps:
+        numbers = []
+        for (kind, value) in (left, right):
+            if kind == NUMBER:
+                numbers.append(value)
+            elif kind == VARIABLE:
+                numbers.append(variables[value])
+            else:
+                numbers.append(results[value])
+
+        (number1, number2) = numbers
+        if symbol in SHIFTS:
+            number1 = int(number1)
+            number2 = int(number2)
+        results.append(operators[symbol](number1, number2))
+
+    return results[-1]
+
+#End def
+
+# ------------------------------------------------------------------------
+# Main script
+# ------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    import argparse
+    import random
+    import time
+
+    parser = argparse.ArgumentParser(description="Expression evaluation benchmark")
+    parser.add_argument("--count", type=int, default=200000,
+                        help="sets of variables to evaluate the expression for")
+    parser.add_argument("--expression", default="(a + b) * c - a / 2 + (b % 7) ** 2",
+                        help="expression (variables must be named a, b and c)")
+    args = parser.parse_args()
+
+    generator = random.Random(301)
+    bindings  = [{"a" : generator.uniform(1, 100),
+                  "b" : generator.uniform(1, 100),
+                  "c" : generator.uniform(1, 100)} for i in range(args.count)]
+    text      = args.expression
+
+    def run_compiled():
+        evaluate = compile_expression(text).evaluate
+        return [evaluate(variables) for variables in bindings]
+
+    def run_cached():
+        return [compile_expression(text).evaluate(variables) for variables in bindings]
+
+    def run_uncached():
+        return [Expression(text).evaluate(variables) for variables in bindings]
+
+    def run_one_op():
+        steps = one_op_steps(text)
+        return [one_op_evaluate(steps, variables) for variables in bindings]
+
+    def run_eval():
+        return [eval(text, {}, variables) for variables in bindings]
+
+    def run_eval_code():
+        code = compile(text, "<expression>", "eval")
+        return [eval(code, {}, variables) for variables in bindings]
+
+    runs = [("compiled, looked up once", run_compiled),
+            ("compiled, looked up per set", run_cached),
+            ("parsed per set (no cache)", run_uncached),
+            ("one op at a time", run_one_op),
+            ("eval(text)", run_eval),
+            ("eval(code object)", run_eval_code)]
+
+    expected = run_eval()
+    print("{0}: {1} sets of variables".format(text, args.count))
+    print("")
+    for (name, run) in runs:
+        start   = time.perf_counter()
+        results = run()
+        elapsed = time.perf_counter() - start
+
+        # Same results as Python, apart from the last bit of a float
+        same = all(abs(result - value) <= 1e-12 * max(1.0, abs(value))
+                   for (result, value) in zip(results, expected))
+        print("{0:<28} {1:>12.0f}/s {2:>8.3f} us/set  {3}".format(
+              name, args.count / elapsed, elapsed / args.count * 1e6,
+              "" if same else "(results differ)"))
+
+    print("")
+    print("cache: {0} hits, {1} misses".format(cache.hits, cache.misses))
@@ -0,0 +1,392 @@
+# -*- coding: utf-8 -*-
+"""
+--------------------------------------------------------------------------
+Result Limits
+--------------------------------------------------------------------------
+License:   
+Copyright 2021 Jessica Kies
+
+Redistribution and use in source and binary forms, with or without 
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, 
+this list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice, 
+this list of conditions and the following disclaimer in the documentation 
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors 
+may be used to endorse or promote products derived from this software without 
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF 
+THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+Keeps the operations that can make huge integers (** and << on integers)
+from stalling the calculator.
+
+Before one of them is worked out, the size of its result is estimated from
+the sizes of its numbers:
+  - a << b   --> bits(a) + b
+  - a ** b   --> bits(a) * b
+  - a * b    --> bits(a) + bits(b)
+
+  - Up to INLINE_BITS  --> worked out in the calculator's process, as before
+  - Up to MAX_BITS     --> worked out in a pool of worker processes
+  - More than MAX_BITS --> rejected with ResultTooLarge, without trying
+
+Each worker has a limit on its memory (RLIMIT_AS) and on the CPU time of
+each task (RLIMIT_CPU); the calculator also stops waiting for a task after
+a timeout, and then replaces the pool. Floats never need any of this: they
+overflow (or give inf) straight away. Turning a large integer into text
+is also slow (and refused by Python 3.11+ past 4300 digits), so text()
+does that in the pool too.
+
+A batch can submit() its heavy operations, carry on with the cheap ones,
+and get() the results at the end. Results can be waited for from other
+threads than the one that submitted them (as the server does).
+
+Error conditions:
+  - Result over MAX_BITS, or out of memory --> ResultTooLarge
+  - Over the CPU time or the timeout      --> ResultTimeout
+  (both are OverflowErrors, so code that handles a float overflow already
+   handles them)
+
+Running this file directly times some cheap, heavy and rejected
+operations:
+  python limits.py [--max-bits N] [--timeout S]
+
+--------------------------------------------------------------------------
+"""
+import os
+import sys
+import threading
+
+from simple_calc import operators
+
+# ------------------------------------------------------------------------
+# Constants
+# ------------------------------------------------------------------------
+INLINE_BITS = 8192                      # worked out in process up to this
+MAX_BITS    = 1 << 18                   # rejected over this (~79000 digits)
+TEXT_BITS   = 8192                      # integers longer than this are turned
+                                        #   into text in the pool
+TIMEOUT     = 5.0                       # seconds to wait for a worker
+CPU_TIME    = 2                         # CPU seconds a task can use
+MEMORY      = 256 * 1024 * 1024         # bytes a worker can add
+WORKERS     = (os.cpu_count() or 1) if hasattr(os, "cpu_count") else 1
+
+# ------------------------------------------------------------------------
+# Errors
+# ------------------------------------------------------------------------
+
+class LimitError(OverflowError):
+    """An operation was stopped by a limit."""
+
+#End class
+
+class ResultTooLarge(LimitError):
+    """The result would be (or turned out to be) too large."""
+
+#End class
+
+class ResultTimeout(LimitError):
+    """The operation took too long."""
+
+#End class
+
+# ------------------------------------------------------------------------
+# Functions
+# ------------------------------------------------------------------------
+
+def estimate_bits(symbol, number1, number2):
+    """Return an upper bound on the bits of the result of an operation,
+    or 0 if the result is never much bigger than its numbers. Whole floats
+    (as the interactive calculator reads) count as the integers they are."""
+    if (type(number1) is float) and number1.is_integer():
+        number1 = int(number1)
+    if (type(number2) is float) and number2.is_integer():
+        number2 = int(number2)
+    if (type(number1) is not int) or (type(number2) is not int):
+        return 0
+
+    if symbol == "<<":
+        if (number1 == 0) or (number2 < 0):
+            return 0
+        return number1.bit_length() + number2
+
+    if symbol == "**":
+        if (abs(number1) <= 1) or (number2 < 0):
+            return 0
+        return number1.bit_length() * number2
+
+    if symbol == "*":
+        return number1.bit_length() + number2.bit_length()
+
+    return 0
+
+#End def
+
+def start_worker(memory):
+    """Set up a worker process: limit the memory it can add."""
+    import resource
+
+    if hasattr(sys, "set_int_max_str_digits"):
+        sys.set_int_max_str_digits(0)
+
+    # The worker is forked from the calculator, so it starts out using what
+    # the calculator uses; it can only add memory to that
+    try:
+        with open("/proc/self/statm") as statm:
+            used = int(statm.read().split()[0]) * resource.getpagesize()
+    except (IOError, OSError, ValueError):
+        used = 0
+
+    (soft, hard) = resource.getrlimit(resource.RLIMIT_AS)
+    soft         = used + memory
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
+
+#End def
+
+def run_task(symbol, number1, number2, cpu_time):
+    """Work out an operation in a worker (symbol None: the text of number1).
+
+    The process is killed (SIGXCPU) if the task uses more than cpu_time
+    seconds of CPU.
+    """
+    import resource
+
+    usage        = resource.getrusage(resource.RUSAGE_SELF)
+    (soft, hard) = resource.getrlimit(resource.RLIMIT_CPU)
+    soft         = int(usage.ru_utime + usage.ru_stime + cpu_time) + 1
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+    if symbol is None:
+        return str(number1)
+    return operators[symbol](number1, number2)
+
+#End def
+
+# ------------------------------------------------------------------------
+# Results
+# ------------------------------------------------------------------------
+
+class Result(object):
+    """The result of an operation worked out in process."""
+
+    def __init__(self, value=None, error=None):
+        self.value = value
+        self.error = error
+
+    #End def
+
+    def get(self):
+        """Return the value (or raise the error) of the operation."""
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+    #End def
+
+#End class
+
+class Deferred(object):
+    """The result of an operation sent to the pool."""
+
+    def __init__(self, evaluator, task, pending, generation):
+        self.evaluator  = evaluator
+        self.task       = task
+        self.pending    = pending
+        self.generation = generation
+
+    #End def
+
+    def get(self):
+        """Wait for the value of the operation (or raise its error)."""
+        return self.evaluator.wait(self)
+
+    #End def
+
+#End class
+
+# ------------------------------------------------------------------------
+# Evaluator
+# ------------------------------------------------------------------------
+
+class Evaluator(object):
+    """Works out operations, in process or in the pool depending on the
+    estimated size of their results. The pool is started when it is first
+    needed."""
+
+    def __init__(self, inline_bits=INLINE_BITS, max_bits=MAX_BITS, timeout=TIMEOUT,
+                 cpu_time=CPU_TIME, memory=MEMORY, workers=WORKERS):
+        self.inline_bits = inline_bits
+        self.max_bits    = max_bits
+        self.timeout     = timeout
+        self.cpu_time    = cpu_time
+        self.memory      = memory
+        self.workers     = workers
+        self.pool        = None
+        self.generation  = 0
+        self.lock        = threading.Lock()
+
+    #End def
+
+    def apply(self, symbol, number1, number2):
+        """Return the result of an operation."""
+        if estimate_bits(symbol, number1, number2) <= self.inline_bits:
+            return operators[symbol](number1, number2)
+        return self.submit(symbol, number1, number2).get()
+
+    #End def
+
+    def submit(self, symbol, number1, number2):
+        """Start an operation. Returns a Result or a Deferred, whose get()
+        returns its value."""
+        bits = estimate_bits(symbol, number1, number2)
+
+        if bits > self.max_bits:
+            return Result(error=ResultTooLarge(
+                "Result too large (about {0} bits, the limit is {1})".format(bits, self.max_bits)))
+
+        # A float result is never large; it overflows at once instead
+        if (bits > self.inline_bits) and (type(number1) is int) and (type(number2) is int):
+            return self.defer((symbol, number1, number2))
+
+        try:
+            return Result(operators[symbol](number1, number2))
+        except (ArithmeticError, ValueError) as error:
+            return Result(error=error)
+
+    #End def
+
+    def defer(self, task):
+        """Send task (symbol, number1, number2) to the pool."""
+        with self.lock:
+            if self.pool is None:
+                import multiprocessing
+                self.pool = multiprocessing.Pool(self.workers, start_worker, (self.memory,))
+
+            pending = self.pool.apply_async(run_task, task + (self.cpu_time,))
+            return Deferred(self, task, pending, self.generation)
+
+    #End def
+
+    def wait(self, deferred):
+        """Return the value of a Deferred."""
+        import multiprocessing
+
+        if deferred.generation != self.generation:
+            # The pool it was sent to has been replaced: send it again
+            return self.defer(deferred.task).get()
+
+        try:
+            return deferred.pending.get(self.timeout)
+        except multiprocessing.TimeoutError:
+            # The worker is stuck or was killed for its CPU time (the pool
+            # then replaces it, but the task is lost)
+            self.restart()
+            raise ResultTimeout("Took longer than {0} s".format(self.timeout))
+        except MemoryError:
+            raise ResultTooLarge("Result too large (out of memory)")
+
+    #End def
+
+    def text(self, value):
+        """Return value as text, as print() would show it."""
+        if (type(value) is int) and (value.bit_length() > TEXT_BITS):
+            return self.defer((None, value, None)).get()
+        return str(value)
+
+    #End def
+
+    def restart(self):
+        """Stop the pool (and its tasks); a new one starts when needed."""
+        with self.lock:
+            if self.pool is not None:
+                try:
+                    self.pool.terminate()
+                    self.pool.join()
+                except (EOFError, OSError):
+                    pass                # a worker died with a task half read
+                self.pool        = None
+                self.generation += 1
+
+    #End def
+
+    def close(self):
+        """Stop the pool."""
+        self.restart()
+
+    #End def
+
+#End class
+
+evaluator = Evaluator()
+
+def configure(**options):
+    """Replace the evaluator used by apply() with one with other limits
+    (the Evaluator arguments)."""
+    global evaluator
+
+    evaluator.close()
+    evaluator = Evaluator(**options)
+
+#End def
+
+def apply(symbol, number1, number2):
+    """Return the result of an operation, within the limits."""
+    return evaluator.apply(symbol, number1, number2)
+
+#End def
+
+# ------------------------------------------------------------------------
+# Main script
+# ------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Result limits demonstration")
+    parser.add_argument("--max-bits", type=int, default=MAX_BITS)
+    parser.add_argument("--timeout", type=float, default=TIMEOUT)
+    args = parser.parse_args()
+
+    configure(max_bits=args.max_bits, timeout=args.timeout)
+
+    cases = [("<<", 1, 20),
+             ("**", 3, 40),
+             ("**", 3, 100000),
+             ("<<", 12345, 200000),
+             ("**", 9, 99999999),
+             ("<<", 1, 10 ** 10)]
+
+    for (symbol, number1, number2) in cases:
+        start = time.perf_counter()
+        try:
+            value   = apply(symbol, number1, number2)
+            outcome = "{0} bits".format(value.bit_length())
+        except LimitError as error:
+            outcome = str(error)
+        elapsed = time.perf_counter() - start
+
+        print("{0:>6} {1:<2} {2:<11} {3:>10.3f} ms  {4}".format(
+              number1, symbol, number2, elapsed * 1e3, outcome))
+
+    evaluator.close()
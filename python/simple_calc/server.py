@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+"""
+--------------------------------------------------------------------------
+Calculator Server
+--------------------------------------------------------------------------
+License:   
+Copyright 2021 Jessica Kies
+
+Redistribution and use in source and binary forms, with or without 
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, 
+this list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice, 
+this list of conditions and the following disclaimer in the documentation 
+and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors 
+may be used to endorse or promote products derived from this software without 
+specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF 
+THE POSSIBILITY OF SUCH DAMAGE.
+--------------------------------------------------------------------------
+
+Long running calculator service, so that other programs on the board do
+not have to start Python (and simple_calc.py) for every operation.
+
+  python server.py [--unix PATH | --host HOST --port N]
+  python simple_calc.py --serve [--unix PATH | --port N]
+
+Listens on a Unix socket, or on a TCP port (localhost by default), and
+serves any number of clients at once with asyncio. A request is "a op b",
+separated by commas and/or whitespace, and is checked as get_user_input
+checks the numbers and operator the user types: the numbers must be
+numbers and the operator must be in the operators table, else the
+response is "Invalid Input". The numbers for << and >> are made integers
+first, and large integer results are worked out within the limits of
+limits.py. An operation that fails (e.g. division by zero) gets a response
+of "Error: " and the reason.
+
+Two framings are accepted, chosen by the first byte a client sends:
+  - Lines: one request per line, one response line per request
+  - Length prefixed: a 4 byte big endian length, then that many bytes of
+    requests separated by newlines; the response is one frame with one
+    line per request. Frames are at most MAX_FRAME (1 MiB), so the first
+    byte of a length prefixed client is always 0. A longer frame gets an
+    "Error: " frame back and the connection is closed.
+
+Clients can pipeline: send many requests without waiting for responses.
+Responses always come back in request order, and all the requests that
+arrive in one read are answered with one write.
+
+bench_server.py is a load generator for this server.
+
+--------------------------------------------------------------------------
+"""
+import asyncio
+import os
+import signal
+import struct
+
+import limits
+from simple_calc import operators
+
+# ------------------------------------------------------------------------
+# Constants
+# ------------------------------------------------------------------------
+HOST       = "127.0.0.1"
+PORT       = 5301
+BACKLOG    = 1024
+
+READ_SIZE  = 65536
+MAX_LINE   = 4096                       # bytes in a request line
+MAX_FRAME  = 1024 * 1024                # bytes in a length prefixed frame
+FRAME      = struct.Struct(">I")
+
+INVALID    = b"Invalid Input"
+SHIFTS     = ("<<", ">>")
+SYMBOLS    = dict((symbol.encode("ascii"), symbol) for symbol in operators)
+
+# ------------------------------------------------------------------------
+# Requests
+# ------------------------------------------------------------------------
+
+def error_text(error):
+    """Return the response for an operation that failed."""
+    return "Error: {0}".format(error).encode("ascii", "replace")
+
+#End def
+
+def evaluate(line):
+    """Return the response (bytes) to one request, or a limits.Deferred if
+    its result is being worked out in the pool."""
+    fields = line.replace(b",", b" ").split()
+    if len(fields) != 3:
+        return INVALID
+
+    symbol = SYMBOLS.get(fields[1])
+    if symbol is None:
+        return INVALID
+
+    try:
+        number1 = float(fields[0])
+        number2 = float(fields[2])
+        if symbol in SHIFTS:
+            number1 = int(number1)
+            number2 = int(number2)
+    except (ValueError, OverflowError):
+        return INVALID
+
+    result = limits.evaluator.submit(symbol, number1, number2)
+    if isinstance(result, limits.Deferred):
+        return result
+
+    try:
+        return str(result.get()).encode("ascii")
+    except (ArithmeticError, ValueError) as error:
+        return error_text(error)
+
+#End def
+
+def finish(deferred):
+    """Wait for a deferred result and return its response (in a thread)."""
+    try:
+        return limits.evaluator.text(deferred.get()).encode("ascii")
+    except (ArithmeticError, ValueError) as error:
+        return error_text(error)
+
+#End def
+
+async def respond(requests):
+    """Return the responses to a list of requests, in order."""
+    responses = [evaluate(line) for line in requests]
+
+    waiting = [index for (index, response) in enumerate(responses)
+               if type(response) is not bytes]
+    if waiting:
+        loop = asyncio.get_running_loop()
+        for index in waiting:
+            responses[index] = await loop.run_in_executor(None, finish, responses[index])
+
+    return responses
+
+#End def
+
+# ------------------------------------------------------------------------
+# Connections
+# ------------------------------------------------------------------------
+
+async def serve_lines(reader, writer, data):
+    """Answer newline delimited requests until the client closes."""
+    buffer = b""
+
+    while data:
+        buffer += data
+        end     = buffer.rfind(b"\n")
+
+        if end >= 0:
+            requests  = buffer[:end].split(b"\n")
+            buffer    = buffer[end + 1:]
+            responses = await respond(requests)
+            responses.append(b"")
+            writer.write(b"\n".join(responses))
+            await writer.drain()
+
+        if len(buffer) > MAX_LINE:
+            writer.write(INVALID + b"\n")
+            break
+
+        data = await reader.read(READ_SIZE)
+
+#End def
+
+async def serve_frames(reader, writer, data):
+    """Answer length prefixed requests until the client closes."""
+    buffer = b""
+
+    while data:
+        buffer  += data
+        offset   = 0
+        frames   = []
+
+        while len(buffer) - offset >= FRAME.size:
+            (length,) = FRAME.unpack_from(buffer, offset)
+            if length > MAX_FRAME:
+                body = error_text("frame of {0} bytes is over the limit of {1}".format(
+                                  length, MAX_FRAME))
+                frames.append(FRAME.pack(len(body)))
+                frames.append(body)
+                writer.write(b"".join(frames))
+                await writer.drain()
+                return
+
+            start = offset + FRAME.size
+            if len(buffer) - start < length:
+                break
+
+            payload = buffer[start:start + length]
+            offset  = start + length
+            if payload.endswith(b"\n"):
+                payload = payload[:-1]
+
+            body = b"\n".join(await respond(payload.split(b"\n")))
+            frames.append(FRAME.pack(len(body)))
+            frames.append(body)
+
+        buffer = buffer[offset:]
+        if frames:
+            writer.write(b"".join(frames))
+            await writer.drain()
+
+        data = await reader.read(READ_SIZE)
+
+#End def
+
+async def handle(reader, writer):
+    """Serve one client."""
+    try:
+        data = await reader.read(READ_SIZE)
+        if data[:1] == b"\x00":
+            await serve_frames(reader, writer, data)
+        else:
+            await serve_lines(reader, writer, data)
+    except (ConnectionError, OSError):
+        pass
+    except asyncio.CancelledError:
+        pass                            # the server is stopping
+    finally:
+        writer.close()
+
+#End def
+
+# ------------------------------------------------------------------------
+# Server
+# ------------------------------------------------------------------------
+
+async def run_server(host=HOST, port=PORT, unix=None, on_ready=None):
+    """Serve until cancelled.
+
+    :param unix:     path of a Unix socket to listen on instead of TCP
+    :param on_ready: called with the server once it is listening
+    """
+    if unix is not None:
+        if os.path.exists(unix):
+            os.unlink(unix)             # left by a server that was killed
+        server = await asyncio.start_unix_server(handle, unix, backlog=BACKLOG)
+    else:
+        server = await asyncio.start_server(handle, host, port, backlog=BACKLOG)
+
+    # Stop the same way for SIGTERM (e.g. from systemd) as for Ctrl-C
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, server.close)
+
+    if on_ready is not None:
+        on_ready(server)
+
+    async with server:
+        await server.serve_forever()
+
+#End def
+
+def serve(host=HOST, port=PORT, unix=None):
+    """Run the server until interrupted."""
+    def ready(server):
+        print("Listening on {0}".format(unix if unix is not None else
+                                        "{0}:{1}".format(host, port)), flush=True)
+
+    try:
+        asyncio.run(run_server(host, port, unix, ready))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    finally:
+        limits.evaluator.close()
+        if (unix is not None) and os.path.exists(unix):
+            os.unlink(unix)
+
+#End def
+
+# ------------------------------------------------------------------------
+# Main script
+# ------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Calculator server")
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+
+    serve(args.host, args.port, args.unix)
@@ -49,6 +49,57 @@ Error conditions:
   - Invalid operator --> Program should exit
   - Invalid number   --> Program should exit
 
+Batch mode:
+  python simple_calc.py --batch [FILE] [--chunk ROWS]
+
+  Reads rows of "a op b" (separated by commas and/or whitespace) from FILE,
+  or from stdin if FILE is missing or "-", and writes one result per row,
+  in input order. Rows are read and written a chunk at a time, so memory
+  use does not grow with the size of the input. Within a chunk the rows
+  are grouped by operator and each group is worked out as one NumPy array
+  operation with the function from the operators table.
+
+  A row that cannot be read (wrong number of fields, invalid number or
+  operator) gives "Invalid Input" in its place instead of ending the run.
+  Like NumPy, division or modulo by zero gives inf / nan instead of an
+  error, and so does a negative number to a fractional power (instead of
+  a complex number). The numbers for << and >> are made integers first, as they are
+  interactively; shifts that do not fit in 64 bits are worked out one at
+  a time with Python integers, and a negative shift gives "Invalid Input",
+  as does a shift whose result is over the size limit (see below).
+
+Expression mode:
+  python simple_calc.py --expr
+
+  Takes in an infix expression (e.g. "(a + b) * c << 2") and a number for
+  each of its variables, and provides the result. Expressions are compiled
+  once and kept in a cache (see expression.py), so entering the same
+  expression again does not parse it again.
+
+Server mode:
+  python simple_calc.py --serve [--unix PATH | --port N]
+
+  Serves requests of "a op b" over a Unix socket or a localhost TCP port
+  (see server.py), for programs that would otherwise start this script
+  for every operation.
+
+Profiling:
+  python simple_calc.py [--expr] --profile cprofile|tracemalloc
+                        [--profile-output FILE]
+
+  Runs the interactive loop under cProfile or tracemalloc and reports on
+  stderr when it exits (see bench_calc.py, which also times each step of
+  the loop on its own).
+
+Result size limits:
+  python simple_calc.py [--max-bits N] [--timeout S] ...
+
+  Shifts and powers of integers can make results of any size (1 << 10**10
+  would need over a gigabyte). Their result size is estimated first: small
+  results are worked out here, larger ones in a pool of worker processes
+  with CPU time and memory limits, and ones over the limit are rejected
+  (see limits.py).
+
 --------------------------------------------------------------------------
 """
 import operator
@@ -57,6 +108,9 @@ import sys
 # ------------------------------------------------------------------------
 # Constants
 # ------------------------------------------------------------------------
+CHUNK_ROWS = 65536                      # rows read and written at a time
+INVALID    = "Invalid Input"
+SHIFTS     = ("<<", ">>")
 
 
 # ------------------------------------------------------------------------
@@ -79,6 +133,8 @@ operators = {
 # ------------------------------------------------------------------------
 #Found how to determine Python version from https://stackoverflow.com/questions/52359805/is-sys-version-info-reliable-for-python-version-checking
 if(sys.version_info[0] == 2):
+    prompt = raw_input
+
     def get_user_input():
         """Get input from the user, 2 numbers and operator."""
         
@@ -93,6 +149,8 @@ if(sys.version_info[0] == 2):
             return (None, None, None)
             
 if(sys.version_info[0] == 3):
+    prompt = input
+
     def get_user_input():
         """Get input from the user, 2 numbers and operator."""
         
@@ -108,12 +166,195 @@ if(sys.version_info[0] == 3):
 
 #End def
 
-# ------------------------------------------------------------------------
-# Main script
-# ------------------------------------------------------------------------
+def get_expression_input():
+    """Get an expression from the user and a number for each of its variables."""
+    import expression
+
+    try:
+        compiled  = expression.compile_expression(prompt("Enter an expression: "))
+        variables = {}
+        for name in compiled.variables:
+            variables[name] = float(prompt("Enter {0}: ".format(name)))
+
+        return (compiled, variables)
+    except:
+        print("Invalid Input")
+        return (None, None)
+
+#End def
+
+def read_chunks(stream, rows=CHUNK_ROWS):
+    """Yield lists of up to rows lines from stream."""
+    import itertools
+
+    while True:
+        lines = list(itertools.islice(stream, rows))
+        if not lines:
+            break
+        yield lines
+
+#End def
+
+def group_rows(lines):
+    """Split lines into {operator : (row numbers, first numbers, second numbers)}.
+
+    The numbers are left as strings. Lines that do not have three fields
+    or have an unknown operator are left out.
+    """
+    groups = {}
+    for row, line in enumerate(lines):
+        fields = line.replace(",", " ").split()
+        if (len(fields) != 3) or (fields[1] not in operators):
+            continue
+
+        group = groups.get(fields[1])
+        if group is None:
+            group = groups[fields[1]] = ([], [], [])
+        group[0].append(row)
+        group[1].append(fields[0])
+        group[2].append(fields[2])
+
+    return groups
+
+#End def
+
+def to_floats(numpy, fields):
+    """Return (float array, mask of invalid numbers or None) for number strings."""
+    try:
+        return (numpy.array(fields, dtype=float), None)
+    except ValueError:
+        pass
+
+    # At least one is not a number: convert them one at a time
+    values  = numpy.zeros(len(fields))
+    invalid = numpy.zeros(len(fields), dtype=bool)
+    for index, field in enumerate(fields):
+        try:
+            values[index] = float(field)
+        except ValueError:
+            invalid[index] = True
+
+    return (values, invalid)
+
+#End def
+
+def shift(numpy, symbol, number1, number2, deferred):
+    """Apply a shift to float arrays, making the numbers integers first.
+
+    Returns a list of results (None where the shift is invalid). Shifts
+    that do not fit in 64 bits are left as None and added to deferred, as
+    (index, limits.Result or limits.Deferred).
+    """
+    import limits
+
+    function = operators[symbol]
+    number1 = numpy.trunc(number1)
+    number2 = numpy.trunc(number2)
+
+    # Shifts that fit in a 64 bit integer are done on the whole array
+    fits    = numpy.isfinite(number1) & (number2 >= 0) & (number2 < 62)
+    limit   = numpy.exp2(62 - numpy.where(fits, number2, 0))
+    fits   &= numpy.abs(number1) < limit
+
+    results = numpy.zeros(len(number1), dtype=numpy.int64)
+    results[fits] = function(number1[fits].astype(numpy.int64),
+                             number2[fits].astype(numpy.int64))
+    results = results.tolist()
+
+    # The rest are done one at a time with Python integers, within the
+    # result size limits
+    for index in numpy.flatnonzero(~fits).tolist():
+        results[index] = None
+        try:
+            deferred.append((index, limits.evaluator.submit(
+                             symbol, int(number1[index]), int(number2[index]))))
+        except (ValueError, OverflowError):
+            pass
+
+    return results
+
+#End def
+
+def evaluate_lines(numpy, lines):
+    """Return the result (or INVALID) of each line of a chunk, in order."""
+    results  = [INVALID] * len(lines)
+    deferred = []
+
+    for (operator, (rows, fields1, fields2)) in group_rows(lines).items():
+        (number1, invalid1) = to_floats(numpy, fields1)
+        (number2, invalid2) = to_floats(numpy, fields2)
+
+        if operator in SHIFTS:
+            heavy  = []
+            values = shift(numpy, operator, number1, number2, heavy)
+            deferred.extend((rows[index], result) for (index, result) in heavy)
+        else:
+            values = operators[operator](number1, number2).tolist()
+
+        for (row, value) in zip(rows, values):
+            if value is not None:
+                results[row] = value
+
+        for invalid in (invalid1, invalid2):
+            if invalid is not None:
+                for index in numpy.flatnonzero(invalid).tolist():
+                    results[rows[index]] = INVALID
+
+    # The large shifts have been working in the pool meanwhile
+    for (row, result) in deferred:
+        try:
+            results[row] = result.get()
+        except (ValueError, OverflowError):
+            pass
+
+    return results
+
+#End def
+
+def run_batch(source, output, rows=CHUNK_ROWS):
+    """Evaluate every row of source (a file) and write the results to output."""
+    import limits
+    import numpy
+
+    text = limits.evaluator.text
+
+    with numpy.errstate(all="ignore"):
+        for lines in read_chunks(source, rows):
+            results = evaluate_lines(numpy, lines)
+            output.write("\n".join(map(text, results)))
+            output.write("\n")
+
+    output.flush()
+
+#End def
+
+def run_expressions():
+    """Take in expressions and print their results until the input is invalid."""
+    import limits
+
+    while True:
+        #Get an expression and its variables
+        (compiled, variables) = get_expression_input()
+
+        if compiled is None:
+            print("Exiting")
+            break
+
+        try:
+            print(limits.evaluator.text(compiled.evaluate(variables)))
+        except limits.LimitError as error:
+            print(error)
+        except (ArithmeticError, ValueError):
+            print("Invalid Input")
+            print("Exiting")
+            break
+
+#End def
+
+def run_interactive():
+    """Take in operations and print their results until the input is invalid."""
+    import limits
 
-if __name__ == "__main__":
-    
     while True:
         #Get user input
         (number1, number2, operator) = get_user_input()
@@ -130,7 +371,70 @@ if __name__ == "__main__":
             print("Exiting")
             break
             
-        #Calculate results and print result
-        print(function(number1,number2))
-   
-    
+        #Calculate results and print result (large integer results are
+        #worked out within the limits)
+        try:
+            print(limits.evaluator.text(limits.apply(operator, number1, number2)))
+        except (limits.LimitError, ArithmeticError, ValueError) as error:
+            print(error.args[-1] if error.args else error)
+
+#End def
+
+# ------------------------------------------------------------------------
+# Main script
+# ------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Simple calculator")
+    parser.add_argument("--batch", nargs="?", const="-", metavar="FILE",
+                        help="evaluate rows of 'a op b' from FILE (default: stdin)")
+    parser.add_argument("--chunk", type=int, default=CHUNK_ROWS,
+                        help="rows read and written at a time in batch mode")
+    parser.add_argument("--expr", action="store_true",
+                        help="take in expressions with variables instead of one operation")
+    parser.add_argument("--serve", action="store_true",
+                        help="serve requests over a socket (see server.py)")
+    parser.add_argument("--unix", metavar="PATH", help="Unix socket to serve on")
+    parser.add_argument("--port", type=int, default=None, help="TCP port to serve on")
+    parser.add_argument("--max-bits", type=int, default=None,
+                        help="largest integer result allowed, in bits")
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="seconds to wait for a large result")
+    parser.add_argument("--profile", choices=["cprofile", "tracemalloc"],
+                        help="profile the interactive loop (report on stderr)")
+    parser.add_argument("--profile-output", metavar="FILE",
+                        help="also save the profile (pstats or snapshot) to FILE")
+    args = parser.parse_args()
+
+    import limits
+
+    options = {}
+    if args.max_bits is not None:
+        options["max_bits"] = args.max_bits
+    if args.timeout is not None:
+        options["timeout"] = args.timeout
+    if options:
+        limits.configure(**options)
+
+    if args.serve:
+        import server
+        server.serve(port=args.port or server.PORT, unix=args.unix)
+        sys.exit(0)
+
+    if args.batch is not None:
+        if args.batch == "-":
+            run_batch(sys.stdin, sys.stdout, args.chunk)
+        else:
+            with open(args.batch) as source:
+                run_batch(source, sys.stdout, args.chunk)
+        sys.exit(0)
+
+    loop = run_expressions if args.expr else run_interactive
+
+    if args.profile is not None:
+        import bench_calc
+        bench_calc.profile(loop, args.profile, args.profile_output)
+    else:
+        loop()